@@ -9,6 +9,7 @@ from app.models import User
 from app.services.auth import hash_password
 from app.services.email import build_confirm_email, send_email
 from app.services.anatel_loader import import_anatel_xml, import_aerodromes_json
+from app.services.interactions import sync_anatel_index, sync_v4_index
 
 
 @click.group(name="engspec")
@@ -105,13 +106,26 @@ def send_confirmation(email: str) -> None:
 @engspec_cli.command("import-anatel")
 @click.option("--source", multiple=True, required=True, help="Arquivo XML de plano básico (pode repetir)")
 @click.option("--truncate/--no-truncate", default=False, help="Limpar tabela antes de importar")
+@click.option("--reindex/--no-reindex", default=False, help="Reavaliar as interações das estações alteradas")
 @with_appcontext
-def import_anatel(source: tuple[str, ...], truncate: bool) -> None:
+def import_anatel(source: tuple[str, ...], truncate: bool, reindex: bool) -> None:
     total = 0
     for path in source:
         total += import_anatel_xml(path, truncate=truncate)
         truncate = False
     click.echo(f"Imported {total} records")
+    if reindex:
+        result = sync_anatel_index()
+        click.echo(f"Reindexed {result.changed} stations ({result.removed} removed, {result.pairs} pairs)")
+
+
+@engspec_cli.command("reindex-interactions")
+@with_appcontext
+def reindex_interactions() -> None:
+    """Reavalia o índice de interações das estações alteradas (Anatel e V4)."""
+    for name, sync in (("anatel", sync_anatel_index), ("v4", sync_v4_index)):
+        result = sync()
+        click.echo(f"{name}: {result.changed} stations reindexed, {result.removed} removed, {result.pairs} pairs")
 
 
 @engspec_cli.command("import-aerodromes")
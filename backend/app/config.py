@@ -40,3 +40,9 @@ class Config:
 
     APP_BASE_URL = os.getenv("APP_BASE_URL", "http://localhost:8000")
     ANATEL_DATA_DIR = os.getenv("ANATEL_DATA_DIR", "/home/atx/eng_spectrum/anatel")
+    DEM_DIR = os.getenv("DEM_DIR", os.path.join(ANATEL_DATA_DIR, "DEM"))
+    DEM_TILE_CACHE_SIZE = int(os.getenv("DEM_TILE_CACHE_SIZE", "64"))
+    P1546_TABLES_PATH = os.getenv(
+        "P1546_TABLES_PATH",
+        os.path.join(ANATEL_DATA_DIR, "Tabulated field strength values.xls"),
+    )
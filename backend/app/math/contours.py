@@ -0,0 +1,449 @@
+import numpy as np
+from numba import njit, prange
+
+
+@njit(cache=True)
+def _edge_fraction(va, vb, level):
+    # Linear crossing between two pixel values; a crossing next to a nodata
+    # pixel sits half way, on the edge of the valid pixel's footprint.
+    if np.isnan(va) or np.isnan(vb) or va == vb:
+        return 0.5
+    t = (level - va) / (vb - va)
+    return min(max(t, 0.0), 1.0)
+
+
+@njit(cache=True)
+def _edge_point(values, r, c, edge, level, row0, col0):
+    """
+    Global (row, col) of the crossing on one cell edge (0 top, 1 right,
+    2 bottom, 3 left) and its key. Points are computed from the edge's
+    pixels in a fixed order, so both cells sharing an edge, possibly in
+    different tiles, produce the same point.
+    """
+    if edge == 0:
+        t = _edge_fraction(values[r, c], values[r, c + 1], level)
+        return float(row0 + r), col0 + c + t, 0, r, c
+    if edge == 1:
+        t = _edge_fraction(values[r, c + 1], values[r + 1, c + 1], level)
+        return row0 + r + t, col0 + c + 1.0, 1, r, c + 1
+    if edge == 2:
+        t = _edge_fraction(values[r + 1, c], values[r + 1, c + 1], level)
+        return row0 + r + 1.0, col0 + c + t, 0, r + 1, c
+    t = _edge_fraction(values[r, c], values[r + 1, c], level)
+    return row0 + r + t, float(col0 + c), 1, r, c
+
+
+@njit(cache=True)
+def marching_squares(values, levels, row0, col0, n_cols_global):
+    """
+    Segments of the boundaries of {values >= level} for every level in one
+    pass over the cells of values (n_rows + 1, n_cols + 1): the tile plus
+    one row/column borrowed from its south/east neighbours. NaN is outside.
+    row0/col0 place the tile on the global pixel grid; edge keys are
+    2 * (global_row * n_cols_global + global_col) + (0 horizontal, 1 vertical),
+    so segments from different tiles link by key.
+
+    Segments are oriented with the inside on their left (x = col, y = -row),
+    so outer rings come out counter-clockwise and holes clockwise. Saddles
+    are resolved with the cell-centre mean.
+
+    Returns (level_idx, key_from, key_to, row_from, col_from).
+    """
+    n_rows = values.shape[0] - 1
+    n_cols = values.shape[1] - 1
+    n_levels = levels.shape[0]
+    cap = 2 * n_rows * n_cols * n_levels
+    out_level = np.empty(cap, dtype=np.int64)
+    out_from = np.empty(cap, dtype=np.int64)
+    out_to = np.empty(cap, dtype=np.int64)
+    out_row = np.empty(cap, dtype=np.float64)
+    out_col = np.empty(cap, dtype=np.float64)
+    n_out = 0
+
+    corner = np.empty(4, dtype=np.float64)
+    inside = np.empty(4, dtype=np.bool_)
+    pairs = np.empty((2, 2), dtype=np.int64)
+
+    for r in range(n_rows):
+        for c in range(n_cols):
+            corner[0] = values[r, c]
+            corner[1] = values[r, c + 1]
+            corner[2] = values[r + 1, c + 1]
+            corner[3] = values[r + 1, c]
+            if np.isnan(corner[0]) and np.isnan(corner[1]) and np.isnan(corner[2]) and np.isnan(corner[3]):
+                continue
+            for li in range(n_levels):
+                level = levels[li]
+                n_in = 0
+                for k in range(4):
+                    inside[k] = corner[k] >= level
+                    if inside[k]:
+                        n_in += 1
+                if n_in == 0 or n_in == 4:
+                    continue
+
+                # Edge k joins corner k to corner k + 1 (clockwise from the
+                # top-left); it is an entry (ic) when it goes outside -> inside.
+                n_pairs = 0
+                if n_in == 2 and inside[0] == inside[2]:
+                    centre = 0.25 * (corner[0] + corner[1] + corner[2] + corner[3])
+                    centre_in = not np.isnan(centre) and centre >= level
+                    for k in range(4):
+                        if inside[k] != centre_in:
+                            # Cut off corner k, between edges k - 1 and k.
+                            if inside[k]:
+                                pairs[n_pairs, 0] = (k + 3) % 4
+                                pairs[n_pairs, 1] = k
+                            else:
+                                pairs[n_pairs, 0] = k
+                                pairs[n_pairs, 1] = (k + 3) % 4
+                            n_pairs += 1
+                else:
+                    entry = -1
+                    exit_ = -1
+                    for k in range(4):
+                        if not inside[k] and inside[(k + 1) % 4]:
+                            entry = k
+                        elif inside[k] and not inside[(k + 1) % 4]:
+                            exit_ = k
+                    pairs[0, 0] = entry
+                    pairs[0, 1] = exit_
+                    n_pairs = 1
+
+                for p in range(n_pairs):
+                    row_a, col_a, orient_a, kr_a, kc_a = _edge_point(values, r, c, pairs[p, 0], level, row0, col0)
+                    _, _, orient_b, kr_b, kc_b = _edge_point(values, r, c, pairs[p, 1], level, row0, col0)
+                    out_level[n_out] = li
+                    out_from[n_out] = 2 * ((row0 + kr_a) * n_cols_global + col0 + kc_a) + orient_a
+                    out_to[n_out] = 2 * ((row0 + kr_b) * n_cols_global + col0 + kc_b) + orient_b
+                    out_row[n_out] = row_a
+                    out_col[n_out] = col_a
+                    n_out += 1
+
+    return out_level[:n_out], out_from[:n_out], out_to[:n_out], out_row[:n_out], out_col[:n_out]
+
+
+@njit(cache=True)
+def link_rings(key_from, key_to):
+    """
+    Chains segments into closed rings by matching each segment's key_to to
+    the next segment's key_from. Returns (order, ring_offsets): segment
+    indices ring after ring (ring k is order[ring_offsets[k]:ring_offsets[k + 1]]).
+    Chains that do not close are dropped.
+    """
+    n = key_from.shape[0]
+    by_key = np.argsort(key_from)
+    sorted_keys = key_from[by_key]
+    nxt = np.full(n, -1, dtype=np.int64)
+    for i in range(n):
+        j = np.searchsorted(sorted_keys, key_to[i])
+        if j < n and sorted_keys[j] == key_to[i]:
+            nxt[i] = by_key[j]
+
+    visited = np.zeros(n, dtype=np.bool_)
+    order = np.empty(n, dtype=np.int64)
+    offsets = np.empty(n + 1, dtype=np.int64)
+    offsets[0] = 0
+    n_order = 0
+    n_rings = 0
+    for i in range(n):
+        if visited[i]:
+            continue
+        start = n_order
+        j = i
+        closed = False
+        while j >= 0 and not visited[j]:
+            visited[j] = True
+            order[n_order] = j
+            n_order += 1
+            j = nxt[j]
+            if j == i:
+                closed = True
+                break
+        if closed and n_order - start >= 3:
+            n_rings += 1
+            offsets[n_rings] = n_order
+        else:
+            n_order = start
+    return order[:n_order], offsets[: n_rings + 1]
+
+
+@njit(cache=True)
+def _ring_area(xs, ys, start, end, keep, use_keep):
+    area = 0.0
+    first = -1
+    prev = -1
+    for i in range(start, end):
+        if use_keep and not keep[i]:
+            continue
+        if first < 0:
+            first = i
+        else:
+            area += xs[prev] * ys[i] - xs[i] * ys[prev]
+        prev = i
+    area += xs[prev] * ys[first] - xs[first] * ys[prev]
+    return 0.5 * area
+
+
+@njit(cache=True)
+def _douglas_peucker(xs, ys, start, end, tolerance, keep):
+    # Iterative Douglas-Peucker over xs[start:end + 1], end inclusive.
+    stack = np.empty((end - start + 1, 2), dtype=np.int64)
+    stack[0, 0] = start
+    stack[0, 1] = end
+    n_stack = 1
+    tol2 = tolerance * tolerance
+    while n_stack:
+        n_stack -= 1
+        a = stack[n_stack, 0]
+        b = stack[n_stack, 1]
+        if b - a < 2:
+            continue
+        dx = xs[b] - xs[a]
+        dy = ys[b] - ys[a]
+        norm2 = dx * dx + dy * dy
+        worst = -1.0
+        worst_i = -1
+        for i in range(a + 1, b):
+            px = xs[i] - xs[a]
+            py = ys[i] - ys[a]
+            if norm2 > 0.0:
+                cross = px * dy - py * dx
+                d2 = cross * cross / norm2
+            else:
+                d2 = px * px + py * py
+            if d2 > worst:
+                worst = d2
+                worst_i = i
+        if worst > tol2:
+            keep[worst_i] = True
+            stack[n_stack, 0] = a
+            stack[n_stack, 1] = worst_i
+            stack[n_stack + 1, 0] = worst_i
+            stack[n_stack + 1, 1] = b
+            n_stack += 2
+
+
+@njit(cache=True)
+def _segments_cross(ax, ay, bx, by, cx, cy, dx, dy):
+    # Proper crossing only: segments sharing an end point or merely
+    # touching do not count.
+    d1 = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+    d2 = (bx - ax) * (dy - ay) - (by - ay) * (dx - ax)
+    d3 = (dx - cx) * (ay - cy) - (dy - cy) * (ax - cx)
+    d4 = (dx - cx) * (by - cy) - (dy - cy) * (bx - cx)
+    return d1 * d2 < 0.0 and d3 * d4 < 0.0
+
+
+@njit(cache=True)
+def crossing_rings(xs, ys, ring_offsets, keep, changed):
+    """
+    Rings flagged in `changed` whose kept edges cross a kept edge of any
+    ring (themselves included). Edges are swept in order of their minimum
+    x, so only edges with overlapping x extents are compared, and pairs of
+    two unchanged rings are skipped.
+    """
+    n_rings = ring_offsets.shape[0] - 1
+    n_kept = 0
+    for i in range(keep.shape[0]):
+        if keep[i]:
+            n_kept += 1
+    edge_a = np.empty(n_kept, dtype=np.int64)
+    edge_b = np.empty(n_kept, dtype=np.int64)
+    edge_ring = np.empty(n_kept, dtype=np.int64)
+    n_edges = 0
+    for k in range(n_rings):
+        first = -1
+        prev = -1
+        for i in range(ring_offsets[k], ring_offsets[k + 1]):
+            if not keep[i]:
+                continue
+            if first < 0:
+                first = i
+            else:
+                edge_a[n_edges] = prev
+                edge_b[n_edges] = i
+                edge_ring[n_edges] = k
+                n_edges += 1
+            prev = i
+        if prev >= 0 and prev != first:
+            edge_a[n_edges] = prev
+            edge_b[n_edges] = first
+            edge_ring[n_edges] = k
+            n_edges += 1
+
+    x_min = np.empty(n_edges, dtype=np.float64)
+    for e in range(n_edges):
+        x_min[e] = min(xs[edge_a[e]], xs[edge_b[e]])
+    order = np.argsort(x_min)
+
+    bad = np.zeros(n_rings, dtype=np.bool_)
+    for p in range(n_edges):
+        e = order[p]
+        a, b = edge_a[e], edge_b[e]
+        x_max = max(xs[a], xs[b])
+        y_lo = min(ys[a], ys[b])
+        y_hi = max(ys[a], ys[b])
+        for q in range(p + 1, n_edges):
+            f = order[q]
+            if x_min[f] > x_max:
+                break
+            rk, rf = edge_ring[e], edge_ring[f]
+            if not (changed[rk] or changed[rf]) or (bad[rk] and bad[rf]):
+                continue
+            c, d = edge_a[f], edge_b[f]
+            if max(ys[c], ys[d]) < y_lo or min(ys[c], ys[d]) > y_hi:
+                continue
+            if _segments_cross(xs[a], ys[a], xs[b], ys[b], xs[c], ys[c], xs[d], ys[d]):
+                if changed[rk]:
+                    bad[rk] = True
+                if changed[rf]:
+                    bad[rf] = True
+    return bad
+
+
+@njit(cache=True)
+def _in_ring(px, py, xs, ys, start, end, keep, use_keep):
+    # Even-odd ray casting against one ring (its kept vertices only with
+    # use_keep), as app.math.raster.point_in_rings.
+    inside = False
+    first = -1
+    prev = -1
+    for i in range(start, end + 1):
+        if i == end:
+            if first < 0 or prev == first:
+                break
+            j = first
+        elif use_keep and not keep[i]:
+            continue
+        else:
+            j = i
+        if prev >= 0 and (ys[j] > py) != (ys[prev] > py):
+            x_cross = xs[j] + (py - ys[j]) * (xs[prev] - xs[j]) / (ys[prev] - ys[j])
+            if px < x_cross:
+                inside = not inside
+        if i == end:
+            break
+        if first < 0:
+            first = i
+        prev = i
+    return inside
+
+
+@njit(cache=True)
+def moved_rings(xs, ys, ring_offsets, keep, changed):
+    """
+    Rings flagged in `changed` whose simplified outline puts another ring
+    on the other side of it (e.g. a hole left outside its shell). Without
+    crossings, a ring's first vertex, which simplification always keeps,
+    tells which side the whole ring is on.
+    """
+    n_rings = ring_offsets.shape[0] - 1
+    x_lo = np.empty(n_rings, dtype=np.float64)
+    x_hi = np.empty(n_rings, dtype=np.float64)
+    y_lo = np.empty(n_rings, dtype=np.float64)
+    y_hi = np.empty(n_rings, dtype=np.float64)
+    for k in range(n_rings):
+        start = ring_offsets[k]
+        end = ring_offsets[k + 1]
+        x_lo[k] = xs[start:end].min()
+        x_hi[k] = xs[start:end].max()
+        y_lo[k] = ys[start:end].min()
+        y_hi[k] = ys[start:end].max()
+
+    bad = np.zeros(n_rings, dtype=np.bool_)
+    for k in range(n_rings):
+        if not changed[k]:
+            continue
+        start = ring_offsets[k]
+        end = ring_offsets[k + 1]
+        for other in range(n_rings):
+            if other == k:
+                continue
+            px = xs[ring_offsets[other]]
+            py = ys[ring_offsets[other]]
+            if px < x_lo[k] or px > x_hi[k] or py < y_lo[k] or py > y_hi[k]:
+                continue
+            if _in_ring(px, py, xs, ys, start, end, keep, False) != _in_ring(px, py, xs, ys, start, end, keep, True):
+                bad[k] = True
+                break
+    return bad
+
+
+@njit(parallel=True, cache=True)
+def simplify_rings(xs, ys, ring_offsets, tolerance):
+    """
+    Douglas-Peucker keep-mask for open rings stored back to back (the
+    closing point is implied). Each ring is split at its first vertex and
+    the vertex farthest from it. A ring is left intact when simplification
+    would leave fewer than 3 vertices or flip or zero its signed area, so
+    no ring collapses or changes orientation (outer/hole role). Rings are
+    then checked against each other: a simplified ring whose edges cross
+    its own or another ring's edges (crossing_rings), or that moves another
+    ring to its other side (moved_rings), goes back to its full vertex set,
+    until neither happens. The traced rings never cross, so the result
+    keeps their topology.
+    """
+    keep = np.zeros(xs.shape[0], dtype=np.bool_)
+    for k in prange(ring_offsets.shape[0] - 1):
+        start = ring_offsets[k]
+        end = ring_offsets[k + 1]
+        n = end - start
+        if n <= 4 or tolerance <= 0.0:
+            for i in range(start, end):
+                keep[i] = True
+            continue
+        far = start
+        far_d = -1.0
+        for i in range(start + 1, end):
+            d = (xs[i] - xs[start]) ** 2 + (ys[i] - ys[start]) ** 2
+            if d > far_d:
+                far_d = d
+                far = i
+        keep[start] = True
+        keep[far] = True
+        _douglas_peucker(xs, ys, start, far, tolerance, keep)
+        # Second half closes back onto the first vertex: run it on
+        # [far, end - 1] plus the implied closing point via a copy.
+        m = end - far + 1
+        hx = np.empty(m, dtype=np.float64)
+        hy = np.empty(m, dtype=np.float64)
+        hx[: m - 1] = xs[far:end]
+        hy[: m - 1] = ys[far:end]
+        hx[m - 1] = xs[start]
+        hy[m - 1] = ys[start]
+        hkeep = np.zeros(m, dtype=np.bool_)
+        _douglas_peucker(hx, hy, 0, m - 1, tolerance, hkeep)
+        for i in range(1, m - 1):
+            if hkeep[i]:
+                keep[far + i] = True
+
+        n_kept = 0
+        for i in range(start, end):
+            if keep[i]:
+                n_kept += 1
+        before = _ring_area(xs, ys, start, end, keep, False)
+        after = _ring_area(xs, ys, start, end, keep, True) if n_kept >= 3 else 0.0
+        if n_kept < 3 or after == 0.0 or (after > 0.0) != (before > 0.0):
+            for i in range(start, end):
+                keep[i] = True
+
+    n_rings = ring_offsets.shape[0] - 1
+    changed = np.zeros(n_rings, dtype=np.bool_)
+    for k in range(n_rings):
+        for i in range(ring_offsets[k], ring_offsets[k + 1]):
+            if not keep[i]:
+                changed[k] = True
+                break
+    while True:
+        bad = crossing_rings(xs, ys, ring_offsets, keep, changed) | moved_rings(xs, ys, ring_offsets, keep, changed)
+        restored = 0
+        for k in range(n_rings):
+            if bad[k]:
+                restored += 1
+                changed[k] = False
+                for i in range(ring_offsets[k], ring_offsets[k + 1]):
+                    keep[i] = True
+        if restored == 0:
+            break
+    return keep
@@ -1,6 +1,6 @@
 
 import numpy as np
-from numba import njit
+from numba import get_num_threads, njit, prange
 import math
 
 # Constants
@@ -31,10 +31,12 @@ def diffraction_loss_db(nu):
         return 0.0
     elif nu <= 0:
         return 6.0 + 9.0 * nu + 1.27 * (nu**2) # Approximate curve near grazing
+    elif nu <= 0.1:
+        # Lee's 6.9 + 13 * log10(nu - 0.1) is undefined for nu <= 0.1, use
+        # J(v) = 6.9 + 20 * log10(sqrt((v-0.1)^2 + 1) + v - 0.1) there.
+        return 6.9 + 20 * np.log10(np.sqrt((nu - 0.1)**2 + 1) + nu - 0.1)
     elif nu <= 1:
-        return 6.9 + 13.0 * np.log10(nu - 0.1) # Lee's approx, requires nu > 0.1 usually. 
-        # Better approx for nu > -0.7:
-        # J(v) = 6.9 + 20 * log10(sqrt((v-0.1)^2 + 1) + v - 0.1)
+        return 6.9 + 13.0 * np.log10(nu - 0.1) # Lee's approx
     
     # Standard ITU-R P.526 approx for v > -0.7
     v = nu
@@ -120,6 +122,130 @@ def deygout_recursive(dist_m, elev_m_w_earth, start_idx, end_idx, lam, h_tx_abs,
     else:
         return 0.0
 
+@njit(cache=True, fastmath=True)
+def max_nu_obstacle(dist_m, elev_m_w_earth, start_idx, end_idx, lam, h_start, h_end):
+    """
+    Single scan of a sub-path for its dominant obstacle.
+    Returns (index, nu), or (-1, -inf) when the sub-path has no interior point.
+
+    The LOS slope and 2*D/lam are computed once per sub-path, and candidates are
+    ranked by sign(nu)*nu^2 (proportional to h*|h|/(d1*d2)), so the sqrt is
+    only taken for the winner.
+    """
+    if end_idx - start_idx < 2:
+        return -1, -np.inf
+
+    d_start = dist_m[start_idx]
+    d_total = dist_m[end_idx] - d_start
+    if d_total <= 1e-3:
+        return -1, -np.inf
+
+    slope = (h_end - h_start) / d_total
+    best_key = -np.inf
+    best_idx = -1
+    for i in range(start_idx + 1, end_idx):
+        d1 = dist_m[i] - d_start
+        d2 = d_total - d1
+        if d1 <= 0 or d2 <= 0:
+            key = 0.0
+        else:
+            h_obs = elev_m_w_earth[i] - (h_start + slope * d1)
+            key = h_obs * abs(h_obs) / (d1 * d2)
+        if key > best_key:
+            best_key = key
+            best_idx = i
+
+    nu_sq = abs(best_key) * 2.0 * d_total / lam
+    if best_key < 0:
+        return best_idx, -np.sqrt(nu_sq)
+    return best_idx, np.sqrt(nu_sq)
+
+@njit(cache=True, fastmath=True)
+def edge_budget(max_edges, n_points):
+    """
+    Knife edges allowed on an n_points profile: a negative max_edges means
+    unbounded, which can never exceed the number of samples.
+    """
+    if max_edges < 0:
+        return n_points
+    return max_edges
+
+@njit(cache=True, fastmath=True)
+def deygout_iterative_buffers(max_edges, n_points):
+    """
+    Scratch queue for deygout_iterative_into (start, end, h_start, h_end)
+    on profiles of up to n_points samples. Every accepted edge pops one
+    sub-path and pushes two.
+    """
+    cap = 2 * edge_budget(max_edges, n_points) + 1
+    return (
+        np.empty(cap, dtype=np.int64),
+        np.empty(cap, dtype=np.int64),
+        np.empty(cap, dtype=np.float64),
+        np.empty(cap, dtype=np.float64),
+    )
+
+@njit(cache=True, fastmath=True)
+def deygout_iterative_into(dist_m, elev_m_w_earth, n_points, lam, h_tx_abs, h_rx_abs, max_edges,
+                           q_start, q_end, q_h_start, q_h_end):
+    """
+    deygout_iterative over the first n_points samples, using caller-owned
+    queue buffers (see deygout_iterative_buffers).
+    """
+    max_edges = edge_budget(max_edges, n_points)
+    if n_points < 3 or max_edges == 0:
+        return 0.0
+
+    q_start[0] = 0
+    q_end[0] = n_points - 1
+    q_h_start[0] = h_tx_abs
+    q_h_end[0] = h_rx_abs
+    head = 0
+    tail = 1
+
+    loss = 0.0
+    edges = 0
+    while head < tail and edges < max_edges:
+        start_idx = q_start[head]
+        end_idx = q_end[head]
+        h_start = q_h_start[head]
+        h_end = q_h_end[head]
+        head += 1
+
+        max_idx, max_nu = max_nu_obstacle(dist_m, elev_m_w_earth, start_idx, end_idx, lam, h_start, h_end)
+        if max_idx < 0 or max_nu <= -0.78:
+            continue
+
+        loss += diffraction_loss_db(max_nu)
+        edges += 1
+
+        h_peak = elev_m_w_earth[max_idx]
+        q_start[tail] = start_idx
+        q_end[tail] = max_idx
+        q_h_start[tail] = h_start
+        q_h_end[tail] = h_peak
+        tail += 1
+        q_start[tail] = max_idx
+        q_end[tail] = end_idx
+        q_h_start[tail] = h_peak
+        q_h_end[tail] = h_end
+        tail += 1
+
+    return loss
+
+@njit(cache=True, fastmath=True)
+def deygout_iterative(dist_m, elev_m_w_earth, lam, h_tx_abs, h_rx_abs, max_edges=3):
+    """
+    Deygout diffraction with an explicit FIFO of sub-paths instead of recursion.
+    Sub-paths are expanded breadth-first, so the edge budget goes to the
+    main obstacle first, then to the secondary ones on each side
+    (max_edges=3 is the classic 3-edge Deygout). With an unbounded budget
+    (negative max_edges) the result matches deygout_recursive.
+    """
+    q_start, q_end, q_h_start, q_h_end = deygout_iterative_buffers(max_edges, len(dist_m))
+    return deygout_iterative_into(dist_m, elev_m_w_earth, len(dist_m), lam, h_tx_abs, h_rx_abs, max_edges,
+                                  q_start, q_end, q_h_start, q_h_end)
+
 @njit(cache=True, fastmath=True)
 def get_earth_curvature_bias(d, k_factor, R_e=EARTH_RADIUS):
     # h = d^2 / (2 * k * Re) approx parabolic
@@ -133,11 +259,13 @@ def get_earth_curvature_bias(d, k_factor, R_e=EARTH_RADIUS):
     pass
 
 @njit(cache=True, fastmath=True)
-def calc_deygout_loss(dist_m, elev_m, freq_mhz, tx_h_agl, rx_h_agl, k_factor=1.333):
+def calc_deygout_loss(dist_m, elev_m, freq_mhz, tx_h_agl, rx_h_agl, k_factor=1.333, max_edges=-1):
     """
     Main entry point for Deygout Loss.
     dist_m: array of distances from TX (0..D)
     elev_m: array of terrain altitudes (AMSL)
+    max_edges: maximum number of knife edges (3 = classic Deygout); negative
+               (the default) leaves the recursion unbounded, as deygout_recursive
     """
     lam = 300.0 / freq_mhz # wavelength in meters
     R_eff = k_factor * EARTH_RADIUS
@@ -165,8 +293,323 @@ def calc_deygout_loss(dist_m, elev_m, freq_mhz, tx_h_agl, rx_h_agl, k_factor=1.3
     h_tx_abs = elev_curved[0] + tx_h_agl
     h_rx_abs = elev_curved[-1] + rx_h_agl
     
-    # Recursive calculation
-    loss = deygout_recursive(dist_m, elev_curved, 0, n_points - 1, lam, h_tx_abs, h_rx_abs)
+    loss = deygout_iterative(dist_m, elev_curved, lam, h_tx_abs, h_rx_abs, max_edges)
     
     # Clutter loss could be added here
     return loss
+
+@njit(parallel=True, cache=True, fastmath=True)
+def deygout_loss_batch_kernel(elev_m, n_valid, dist_total_m, rx_h_agl, freq_mhz, tx_h_agl, k_factor, max_edges,
+                              n_chunks):
+    """
+    Row-parallel calc_deygout_loss. Row r is the profile elev_m[r, :n_valid[r]]
+    sampled uniformly from 0 to dist_total_m[r]. Rows are split into n_chunks
+    (one per thread); each chunk owns one set of scratch buffers (distances,
+    curved terrain, Deygout queue) for all of its rows.
+    """
+    n_prof, n_samp = elev_m.shape
+    out = np.zeros(n_prof, dtype=np.float64)
+    if n_prof == 0:
+        return out
+
+    lam = 300.0 / freq_mhz
+    R_eff = k_factor * EARTH_RADIUS
+    n_chunks = max(min(n_chunks, n_prof), 1)
+    rows_per_chunk = (n_prof + n_chunks - 1) // n_chunks
+
+    for chunk in prange(n_chunks):
+        dist = np.empty(n_samp, dtype=np.float64)
+        elev_curved = np.empty(n_samp, dtype=np.float64)
+        q_start, q_end, q_h_start, q_h_end = deygout_iterative_buffers(max_edges, n_samp)
+
+        row_end = min((chunk + 1) * rows_per_chunk, n_prof)
+        for r in range(chunk * rows_per_chunk, row_end):
+            n_points = min(n_valid[r], n_samp)
+            if n_points < 2:
+                continue
+            D_total = dist_total_m[r]
+            step = D_total / (n_points - 1)
+            for i in range(n_points):
+                d = i * step
+                dist[i] = d
+                elev_curved[i] = elev_m[r, i] + (d * (D_total - d)) / (2.0 * R_eff)
+
+            h_tx_abs = elev_curved[0] + tx_h_agl
+            h_rx_abs = elev_curved[n_points - 1] + rx_h_agl[r]
+            out[r] = deygout_iterative_into(dist, elev_curved, n_points, lam, h_tx_abs, h_rx_abs, max_edges,
+                                            q_start, q_end, q_h_start, q_h_end)
+    return out
+
+def calc_deygout_loss_batch(elev_m, dist_total_m, rx_h_agl, freq_mhz, tx_h_agl,
+                            k_factor=1.333, max_edges=-1, n_valid=None):
+    """
+    Batched calc_deygout_loss over many profiles from the same transmitter.
+    elev_m: (n_profiles, n_samples) terrain altitudes (AMSL), row r sampled
+            uniformly from TX (0) to RX (dist_total_m[r])
+    dist_total_m: (n_profiles,) TX-RX distance per row (meters)
+    rx_h_agl: (n_profiles,) or scalar RX antenna height per row
+    n_valid: optional (n_profiles,) number of leading samples used per row,
+             for ragged profiles padded to a common width
+    max_edges: as in calc_deygout_loss (negative, the default, is unbounded)
+    Returns the loss vector (dB), one value per row.
+    """
+    elev_m = np.ascontiguousarray(elev_m, dtype=np.float64)
+    if elev_m.ndim != 2:
+        raise ValueError("elev_m must be a 2-D (n_profiles, n_samples) matrix")
+    n_prof, n_samp = elev_m.shape
+
+    dist_total_m = np.broadcast_to(np.asarray(dist_total_m, dtype=np.float64), (n_prof,)).copy()
+    rx_h_agl = np.broadcast_to(np.asarray(rx_h_agl, dtype=np.float64), (n_prof,)).copy()
+    if n_valid is None:
+        n_valid = np.full(n_prof, n_samp, dtype=np.int64)
+    else:
+        n_valid = np.broadcast_to(np.asarray(n_valid, dtype=np.int64), (n_prof,)).copy()
+
+    return deygout_loss_batch_kernel(elev_m, n_valid, dist_total_m, rx_h_agl,
+                                     float(freq_mhz), float(tx_h_agl), float(k_factor), int(max_edges),
+                                     get_num_threads())
+
+# No fastmath: rows without interior samples are +inf.
+@njit(parallel=True, cache=True)
+def profile_clearance_batch_kernel(elev_m, n_valid, dist_total_m, rx_h_agl, freq_mhz, tx_h_agl, k_factor):
+    """
+    Row-parallel line-of-sight clearance over profiles laid out as in
+    deygout_loss_batch_kernel. For every row: the smallest height (m) of the
+    TX-RX ray above the curved terrain and the smallest ratio of that height
+    to the first Fresnel zone radius over the interior samples (negative
+    when the terrain obstructs the ray, below 0.6 when the zone is blocked).
+    """
+    n_prof, n_samp = elev_m.shape
+    clearance = np.zeros(n_prof, dtype=np.float64)
+    fresnel = np.zeros(n_prof, dtype=np.float64)
+    lam = 300.0 / freq_mhz
+    R_eff = k_factor * EARTH_RADIUS
+
+    for r in prange(n_prof):
+        n_points = min(n_valid[r], n_samp)
+        D_total = dist_total_m[r]
+        if n_points < 3 or D_total <= 0.0:
+            clearance[r] = np.inf
+            fresnel[r] = np.inf
+            continue
+        step = D_total / (n_points - 1)
+        h_tx_abs = elev_m[r, 0] + tx_h_agl
+        h_rx_abs = elev_m[r, n_points - 1] + rx_h_agl[r]
+        worst_h = np.inf
+        worst_ratio = np.inf
+        for i in range(1, n_points - 1):
+            d1 = i * step
+            d2 = D_total - d1
+            terrain = elev_m[r, i] + (d1 * d2) / (2.0 * R_eff)
+            h = h_tx_abs + (h_rx_abs - h_tx_abs) * d1 / D_total - terrain
+            ratio = h / math.sqrt(lam * d1 * d2 / D_total)
+            if h < worst_h:
+                worst_h = h
+            if ratio < worst_ratio:
+                worst_ratio = ratio
+        clearance[r] = worst_h
+        fresnel[r] = worst_ratio
+    return clearance, fresnel
+
+def calc_profile_clearance_batch(elev_m, dist_total_m, rx_h_agl, freq_mhz, tx_h_agl,
+                                 k_factor=1.333, n_valid=None):
+    """
+    Batched line-of-sight clearance, same profile layout as
+    calc_deygout_loss_batch. Returns (clearance_m, fresnel_ratio), one value
+    per row; rows with no interior sample are +inf.
+    """
+    elev_m = np.ascontiguousarray(elev_m, dtype=np.float64)
+    if elev_m.ndim != 2:
+        raise ValueError("elev_m must be a 2-D (n_profiles, n_samples) matrix")
+    n_prof, n_samp = elev_m.shape
+
+    dist_total_m = np.broadcast_to(np.asarray(dist_total_m, dtype=np.float64), (n_prof,)).copy()
+    rx_h_agl = np.broadcast_to(np.asarray(rx_h_agl, dtype=np.float64), (n_prof,)).copy()
+    if n_valid is None:
+        n_valid = np.full(n_prof, n_samp, dtype=np.int64)
+    else:
+        n_valid = np.broadcast_to(np.asarray(n_valid, dtype=np.int64), (n_prof,)).copy()
+
+    return profile_clearance_batch_kernel(elev_m, n_valid, dist_total_m, rx_h_agl,
+                                          float(freq_mhz), float(tx_h_agl), float(k_factor))
+
+@njit(cache=True, fastmath=True)
+def max_nu_candidate(dist_m, elev_m, cand, lo, hi, start_idx, end_idx, lam, h_start, h_end):
+    """
+    max_nu_obstacle over the candidate samples cand[lo:hi] only (all strictly
+    inside the sub-path). Returns (position in cand, nu), or (-1, -inf).
+    """
+    if hi <= lo:
+        return -1, -np.inf
+
+    d_start = dist_m[start_idx]
+    d_total = dist_m[end_idx] - d_start
+    if d_total <= 1e-3:
+        return -1, -np.inf
+
+    slope = (h_end - h_start) / d_total
+    best_key = -np.inf
+    best_pos = -1
+    for k in range(lo, hi):
+        i = cand[k]
+        d1 = dist_m[i] - d_start
+        d2 = d_total - d1
+        h_obs = elev_m[i] - (h_start + slope * d1)
+        key = h_obs * abs(h_obs) / (d1 * d2)
+        if key > best_key:
+            best_key = key
+            best_pos = k
+
+    nu_sq = abs(best_key) * 2.0 * d_total / lam
+    if best_key < 0:
+        return best_pos, -np.sqrt(nu_sq)
+    return best_pos, np.sqrt(nu_sq)
+
+@njit(cache=True, fastmath=True)
+def deygout_hull_into(dist_m, elev_m, hull, n_hull, end_idx, lam, h_tx_abs, h_rx_abs, max_edges,
+                      q_start, q_end, q_lo, q_hi, q_h_start, q_h_end):
+    """
+    deygout_iterative_into from sample 0 to end_idx, given the upper convex
+    hull hull[:n_hull] of samples 1 .. end_idx - 1 (sorted). h * |h| / (d1 * d2)
+    is quasi-convex along a hull edge, so whenever a sub-path bounded by
+    terminals or hull vertices has an obstacle above its LOS, the worst one
+    is a hull vertex and only those are scanned. Sub-paths clear of the
+    hull (negative nu) and the sub-paths around a non-hull peak are
+    scanned in full (q_lo = -1), which keeps the result exact.
+    """
+    max_edges = edge_budget(max_edges, end_idx + 1)
+    if end_idx < 2 or max_edges == 0:
+        return 0.0
+
+    q_start[0] = 0
+    q_end[0] = end_idx
+    q_lo[0] = 0
+    q_hi[0] = n_hull
+    q_h_start[0] = h_tx_abs
+    q_h_end[0] = h_rx_abs
+    head = 0
+    tail = 1
+
+    loss = 0.0
+    edges = 0
+    while head < tail and edges < max_edges:
+        start_idx = q_start[head]
+        sub_end = q_end[head]
+        lo = q_lo[head]
+        hi = q_hi[head]
+        h_start = q_h_start[head]
+        h_end = q_h_end[head]
+        head += 1
+
+        pos = -1
+        max_nu = -np.inf
+        if lo >= 0:
+            pos, max_nu = max_nu_candidate(dist_m, elev_m, hull, lo, hi, start_idx, sub_end, lam, h_start, h_end)
+        if pos >= 0 and max_nu > 0.0:
+            peak = hull[pos]
+            left_lo, left_hi, right_lo, right_hi = lo, pos, pos + 1, hi
+        else:
+            peak, max_nu = max_nu_obstacle(dist_m, elev_m, start_idx, sub_end, lam, h_start, h_end)
+            left_lo, left_hi, right_lo, right_hi = -1, -1, -1, -1
+        if peak < 0 or max_nu <= -0.78:
+            continue
+
+        loss += diffraction_loss_db(max_nu)
+        edges += 1
+
+        h_peak = elev_m[peak]
+        q_start[tail] = start_idx
+        q_end[tail] = peak
+        q_lo[tail] = left_lo
+        q_hi[tail] = left_hi
+        q_h_start[tail] = h_start
+        q_h_end[tail] = h_peak
+        tail += 1
+        q_start[tail] = peak
+        q_end[tail] = sub_end
+        q_lo[tail] = right_lo
+        q_hi[tail] = right_hi
+        q_h_start[tail] = h_peak
+        q_h_end[tail] = h_end
+        tail += 1
+
+    return loss
+
+@njit(parallel=True, cache=True, fastmath=True)
+def deygout_loss_radials_kernel(elev_m, step_m, rx_h_agl, freq_mhz, tx_h_agl, k_factor, max_edges, n_chunks):
+    """
+    Deygout loss from the TX to every sample of a fan of radials: out[r, j]
+    is calc_deygout_loss over elev_m[r, :j + 1] (samples step_m apart), with
+    the receiver at sample j.
+
+    Subtracting the straight line d * D / (2 * R_eff) from the curved
+    profile leaves heights above any chord (hence nu) unchanged and turns
+    the bulge d * (D - d) / (2 * R_eff) into -d^2 / (2 * R_eff), which does
+    not depend on the receiver, so the curvature is applied once per
+    radial. The upper hull of the prefix is extended by one sample per
+    receiver and reused by deygout_hull_into for the obstacle search. Over
+    smooth ground (e.g. sea) every sample stays on the hull and a receiver
+    costs a full scan again.
+    """
+    n_rad, n_samp = elev_m.shape
+    out = np.zeros((n_rad, n_samp), dtype=np.float64)
+    if n_rad == 0:
+        return out
+
+    lam = 300.0 / freq_mhz
+    R_eff = k_factor * EARTH_RADIUS
+    n_chunks = max(min(n_chunks, n_rad), 1)
+    rows_per_chunk = (n_rad + n_chunks - 1) // n_chunks
+    cap = 2 * edge_budget(max_edges, n_samp) + 1
+
+    dist = np.empty(n_samp, dtype=np.float64)
+    for i in range(n_samp):
+        dist[i] = i * step_m
+
+    for chunk in prange(n_chunks):
+        elev_flat = np.empty(n_samp, dtype=np.float64)
+        hull = np.empty(n_samp, dtype=np.int64)
+        q_start = np.empty(cap, dtype=np.int64)
+        q_end = np.empty(cap, dtype=np.int64)
+        q_lo = np.empty(cap, dtype=np.int64)
+        q_hi = np.empty(cap, dtype=np.int64)
+        q_h_start = np.empty(cap, dtype=np.float64)
+        q_h_end = np.empty(cap, dtype=np.float64)
+
+        row_end = min((chunk + 1) * rows_per_chunk, n_rad)
+        for r in range(chunk * rows_per_chunk, row_end):
+            for i in range(n_samp):
+                elev_flat[i] = elev_m[r, i] - dist[i] * dist[i] / (2.0 * R_eff)
+            h_tx_abs = elev_flat[0] + tx_h_agl
+
+            n_hull = 0
+            for j in range(2, n_samp):
+                # Upper hull of samples 1 .. j - 1.
+                p = j - 1
+                while n_hull >= 2:
+                    a = hull[n_hull - 2]
+                    b = hull[n_hull - 1]
+                    chord = elev_flat[a] + (elev_flat[p] - elev_flat[a]) * (dist[b] - dist[a]) / (dist[p] - dist[a])
+                    if elev_flat[b] > chord:
+                        break
+                    n_hull -= 1
+                hull[n_hull] = p
+                n_hull += 1
+
+                out[r, j] = deygout_hull_into(dist, elev_flat, hull, n_hull, j, lam, h_tx_abs,
+                                              elev_flat[j] + rx_h_agl, max_edges,
+                                              q_start, q_end, q_lo, q_hi, q_h_start, q_h_end)
+    return out
+
+def calc_deygout_loss_radials(elev_m, step_m, rx_h_agl, freq_mhz, tx_h_agl, k_factor=1.333, max_edges=-1):
+    """
+    Deygout loss (dB) at every sample of a radial fan, e.g. from
+    TerrainService.radials with samples step_m apart starting at the TX.
+    max_edges as in calc_deygout_loss (negative, the default, is unbounded).
+    Returns a matrix shaped like elev_m.
+    """
+    elev_m = np.ascontiguousarray(elev_m, dtype=np.float64)
+    if elev_m.ndim != 2:
+        raise ValueError("elev_m must be a 2-D (n_radials, n_samples) matrix")
+    return deygout_loss_radials_kernel(elev_m, float(step_m), float(rx_h_agl), float(freq_mhz),
+                                       float(tx_h_agl), float(k_factor), int(max_edges), get_num_threads())
@@ -11,6 +11,11 @@ try:
 except ImportError:
     bt_loss = None
 
+# Averaging window for effective height (HAAT/HNMT): 3-15 km from TX, 100 m step.
+TERRAIN_AVG_START_M = 3000.0
+TERRAIN_AVG_END_M = 15000.0
+TERRAIN_AVG_STEP_M = 100.0
+
 @njit(cache=True, fastmath=True)
 def bilinear_sample(dem, r, c):
     h, w = dem.shape
@@ -42,9 +47,9 @@ def get_terrain_avg_3_15(dem, dem_ul_x, dem_ul_y, cell_size_x, cell_size_y, tx_x
     sin_a = np.sin(rad)
     cos_a = np.cos(rad)
     
-    dist_start = 3000.0
-    dist_end = 15000.0
-    step = 100.0 # 100m step
+    dist_start = TERRAIN_AVG_START_M
+    dist_end = TERRAIN_AVG_END_M
+    step = TERRAIN_AVG_STEP_M
     
     sum_h = 0.0
     count = 0
@@ -74,6 +79,20 @@ def get_terrain_avg_3_15(dem, dem_ul_x, dem_ul_y, cell_size_x, cell_size_y, tx_x
         
     return sum_h / count
 
+def terrain_avg_3_15_distances():
+    """
+    Sample distances (m) used by get_terrain_avg_3_15, for radial fans.
+    """
+    n = int(round((TERRAIN_AVG_END_M - TERRAIN_AVG_START_M) / TERRAIN_AVG_STEP_M)) + 1
+    return TERRAIN_AVG_START_M + TERRAIN_AVG_STEP_M * np.arange(n, dtype=np.float64)
+
+def get_terrain_avg_3_15_radials(elev_fan):
+    """
+    Vectorized get_terrain_avg_3_15 over a fan of radials: elev_fan is the
+    (n_azimuth, n_samples) matrix sampled at terrain_avg_3_15_distances().
+    """
+    return np.asarray(elev_fan, dtype=np.float64).mean(axis=1)
+
 def calc_p1546_point(freq_mhz, time_pct, tx_h_eff, rx_h, distance_km, env_type='Rural', 
                     path_type='Land', location_pct=50, tx_erp_kw=1.0):
     """
@@ -0,0 +1,376 @@
+"""
+Vectorized ITU-R P.1546 field strength from the tabulated curves.
+
+The 24 figures shipped in `Tabulated field strength values.xls` are loaded
+once per process into a dense array indexed by
+(nominal frequency, nominal time %, path, nominal h1, distance). Every
+interpolation step below (Annex 5 of the Recommendation) then runs over
+whole numpy arrays, so a coverage grid or a fan of radials is evaluated in
+a single call. `calc_p1546_point` (Py1546) remains the reference used to
+validate this engine.
+
+Not modelled here: mixed land/sea paths, the terrain clearance angle
+correction, and the < 10 m transmitting height procedure on sea paths
+(h1 is floored at 10 m there).
+"""
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
+
+from app.config import Config
+
+NOMINAL_FREQS_MHZ = np.array([100.0, 600.0, 2000.0])
+NOMINAL_TIMES_PCT = np.array([50.0, 10.0, 1.0])
+NOMINAL_HEIGHTS_M = np.array([10.0, 20.0, 37.5, 75.0, 150.0, 300.0, 600.0, 1200.0])
+
+# Path index in the table: land, cold sea, warm sea ("Sea" figures at 50 % fill both).
+PATH_INDEX = {"Land": 0, "Sea": 1, "Cold": 1, "Cold Sea": 1, "Warm": 2, "Warm Sea": 2}
+
+# K_nu per nominal frequency for the negative-h1 clearance correction (Annex 5, 4.3).
+K_NU = np.array([1.35, 3.31, 6.00])
+
+# Representative clutter height R (m) per environment, as in calc_p1546_point.
+CLUTTER_HEIGHT_M = {"Rural": 10.0, "Suburban": 10.0, "Urban": 20.0, "Dense Urban": 30.0}
+
+# K for the location variability standard deviation sigma_L = K + 1.3 log(f).
+LOCATION_K = {"Rural": 0.5}
+DEFAULT_LOCATION_K = 1.0
+
+_FREQ_LABELS = {"100 MHz": 0, "600 MHz": 1, "2 GHz": 2, "2000 MHz": 2}
+_SHEET_PATHS = {"Land": (0,), "Sea": (1, 2), "Cold Sea": (1,), "Warm Sea": (2,)}
+
+
+@dataclass(frozen=True)
+class P1546Tables:
+    distances_km: np.ndarray
+    # (freq, time, path, height, distance), dBuV/m for 1 kW ERP
+    field: np.ndarray
+
+
+def default_tables_path() -> str:
+    return os.getenv("P1546_TABLES_PATH") or Config.P1546_TABLES_PATH
+
+
+@lru_cache(maxsize=4)
+def load_p1546_tables(path: str | None = None) -> P1546Tables:
+    """
+    Parses the tabulated P.1546 figures into dense arrays (cached per path).
+    """
+    import xlrd
+
+    book = xlrd.open_workbook(path or default_tables_path())
+    distances = None
+    field = np.full((3, 3, 3, NOMINAL_HEIGHTS_M.size, 0), np.nan)
+
+    for sheet in book.sheets():
+        f_idx = _FREQ_LABELS[str(sheet.cell_value(1, 1)).strip()]
+        t_idx = int(np.flatnonzero(NOMINAL_TIMES_PCT == float(sheet.cell_value(2, 1)))[0])
+        path_idxs = _SHEET_PATHS[str(sheet.cell_value(3, 1)).strip()]
+        heights = np.array(sheet.row_values(5)[2:2 + NOMINAL_HEIGHTS_M.size], dtype=np.float64)
+        if not np.array_equal(heights, NOMINAL_HEIGHTS_M):
+            raise ValueError(f"Unexpected nominal heights in sheet {sheet.name}")
+
+        rows = [sheet.row_values(r) for r in range(6, sheet.nrows)]
+        rows = [row for row in rows if row[1] not in ("", None)]
+        sheet_dist = np.array([row[1] for row in rows], dtype=np.float64)
+        values = np.array([row[2:2 + NOMINAL_HEIGHTS_M.size] for row in rows], dtype=np.float64).T
+
+        if distances is None:
+            distances = sheet_dist
+            field = np.full((3, 3, 3, NOMINAL_HEIGHTS_M.size, distances.size), np.nan)
+        elif not np.array_equal(distances, sheet_dist):
+            raise ValueError(f"Unexpected distances in sheet {sheet.name}")
+
+        for p_idx in path_idxs:
+            field[f_idx, t_idx, p_idx] = values
+
+    if distances is None or np.isnan(field).any():
+        raise ValueError("Incomplete P.1546 tables")
+    return P1546Tables(distances_km=distances, field=field)
+
+
+def inverse_q(x):
+    """
+    Inverse complementary cumulative normal distribution Qi(x)
+    (P.1546 Annex 5 approximation, |error| < 0.00054).
+    """
+    x = np.asarray(x, dtype=np.float64)
+    upper = x > 0.5
+    p = np.clip(np.where(upper, 1.0 - x, x), 1e-12, 0.5)
+    t = np.sqrt(-2.0 * np.log(p))
+    xi = ((0.010328 * t + 0.802853) * t + 2.515516698) / (((0.001308 * t + 0.189269) * t + 1.432788) * t + 1.0)
+    q = t - xi
+    return np.where(upper, -q, q)
+
+
+def diffraction_j(nu):
+    """
+    Knife-edge loss J(nu) (dB) as used by P.1546, 0 for nu <= -0.78.
+    """
+    nu = np.asarray(nu, dtype=np.float64)
+    j = 6.9 + 20.0 * np.log10(np.sqrt((nu - 0.1) ** 2 + 1.0) + nu - 0.1)
+    return np.where(nu > -0.78, j, 0.0)
+
+
+def free_space_field(distance_km):
+    """
+    Free-space field strength for 1 kW ERP (dBuV/m).
+    """
+    return 106.9 - 20.0 * np.log10(distance_km)
+
+
+def _table_at_distance(tables, f_idx, t_idx, p_idx, h_idx, distance_km):
+    dist = tables.distances_km
+    d = np.clip(distance_km, dist[0], dist[-1])
+    i = np.clip(np.searchsorted(dist, d, side="right") - 1, 0, dist.size - 2)
+    d0 = dist[i]
+    d1 = dist[i + 1]
+    e0 = tables.field[f_idx, t_idx, p_idx, h_idx, i]
+    e1 = tables.field[f_idx, t_idx, p_idx, h_idx, i + 1]
+    return e0 + (e1 - e0) * np.log10(d / d0) / np.log10(d1 / d0)
+
+
+def _negative_h1_correction(h1, f_idx):
+    theta_eff2 = np.degrees(np.arctan(-h1 / 9000.0))
+    return 6.03 - diffraction_j(K_NU[f_idx] * theta_eff2)
+
+
+def _field_nominal(tables, f_idx, t_idx, p_idx, h1, distance_km, is_sea):
+    """
+    Field strength (1 kW) at a nominal frequency/time for arbitrary h1 and d.
+    """
+    heights = NOMINAL_HEIGHTS_M
+    h = np.maximum(h1, heights[0])
+    h_idx = np.clip(np.searchsorted(heights, h, side="right") - 1, 0, heights.size - 2)
+    e_inf = _table_at_distance(tables, f_idx, t_idx, p_idx, h_idx, distance_km)
+    e_sup = _table_at_distance(tables, f_idx, t_idx, p_idx, h_idx + 1, distance_km)
+    # Log-height interpolation, extrapolated from 600/1200 m above 1200 m.
+    e_h = e_inf + (e_sup - e_inf) * np.log10(h / heights[h_idx]) / np.log10(heights[h_idx + 1] / heights[h_idx])
+
+    low = (h1 < heights[0]) & ~is_sea
+    if not np.any(low):
+        return e_h
+
+    # Land, h1 < 10 m (Annex 5, 4.2 and 4.3).
+    zero = np.zeros_like(h1)
+    e10 = _table_at_distance(tables, f_idx, t_idx, p_idx, zero.astype(np.intp), distance_km)
+    e20 = _table_at_distance(tables, f_idx, t_idx, p_idx, (zero + 1).astype(np.intp), distance_km)
+    c1020 = e10 - e20
+    c_neg10 = _negative_h1_correction(np.full_like(h1, -10.0), f_idx)
+    e_zero = e10 + 0.5 * (c1020 + c_neg10)
+    e_low = np.where(
+        h1 >= 0.0,
+        e_zero + 0.1 * h1 * (e10 - e_zero),
+        e_zero + _negative_h1_correction(np.minimum(h1, 0.0), f_idx),
+    )
+    return np.where(low, e_low, e_h)
+
+
+def _h1(heff_m, ha_m, distance_km):
+    """
+    Transmitting height used with the curves (Annex 5, 3): ha up to 3 km,
+    blended towards heff up to 15 km, heff beyond.
+    """
+    blend = np.clip((distance_km - 3.0) / 12.0, 0.0, 1.0)
+    return ha_m + (heff_m - ha_m) * blend
+
+
+def _rx_height_correction(freq_mhz, h1, rx_h_m, distance_km, clutter_m, is_sea, is_urban):
+    """
+    Receiving antenna height correction (Annex 5, 9).
+    """
+    log_f = np.log10(freq_mhz)
+    k_h2 = 3.2 + 6.2 * log_f
+
+    d_m = np.maximum(distance_km, 0.016) * 1000.0
+    r_prime = (d_m * clutter_m - 15.0 * h1) / (d_m - 15.0)
+    r_prime = np.maximum(r_prime, 1.0)
+    h2 = np.maximum(rx_h_m, 1.0)
+
+    land = k_h2 * np.log10(h2 / r_prime)
+    h_dif = np.maximum(r_prime - h2, 0.0)
+    theta_clut = np.degrees(np.arctan(h_dif / 27.0))
+    nu = 0.0108 * np.sqrt(freq_mhz) * np.sqrt(h_dif * theta_clut)
+    urban_below = 6.03 - diffraction_j(nu)
+    land = np.where((h2 < r_prime) & is_urban, urban_below, land)
+
+    sea = k_h2 * np.log10(h2 / 10.0)
+    return np.where(is_sea, sea, land)
+
+
+def field_strength(
+    freq_mhz,
+    time_pct,
+    heff_m,
+    distance_km,
+    rx_h_m=10.0,
+    erp_kw=1.0,
+    path_type="Land",
+    env_type="Rural",
+    location_pct=50.0,
+    ha_m=None,
+    tables: P1546Tables | None = None,
+) -> np.ndarray:
+    """
+    P.1546 field strength (dBuV/m) for arrays of inputs.
+    All numeric arguments broadcast against each other; path_type and
+    env_type apply to the whole call. ha_m (antenna height above ground)
+    defaults to heff_m, as in calc_p1546_point.
+    """
+    tables = tables or load_p1546_tables()
+    freq, time, heff, dist, rx_h, erp, loc = np.broadcast_arrays(
+        np.asarray(freq_mhz, dtype=np.float64),
+        np.clip(np.asarray(time_pct, dtype=np.float64), 1.0, 50.0),
+        np.asarray(heff_m, dtype=np.float64),
+        np.asarray(distance_km, dtype=np.float64),
+        np.asarray(rx_h_m, dtype=np.float64),
+        np.asarray(erp_kw, dtype=np.float64),
+        np.asarray(location_pct, dtype=np.float64),
+    )
+    ha = heff if ha_m is None else np.broadcast_to(np.asarray(ha_m, dtype=np.float64), heff.shape)
+
+    p_idx = PATH_INDEX[path_type]
+    is_sea = np.full(freq.shape, p_idx != 0)
+    is_urban = np.full(freq.shape, env_type in ("Urban", "Dense Urban"))
+    clutter_m = CLUTTER_HEIGHT_M.get(env_type, 10.0)
+
+    # Distances below 1 km follow the free-space slope from the 1 km value.
+    d_curve = np.maximum(dist, 1.0)
+    h1 = _h1(heff, ha, d_curve)
+
+    # Bracketing nominal frequencies (extrapolating outside 100-2000 MHz).
+    f_hi = np.where(freq > NOMINAL_FREQS_MHZ[1], 2, 1)
+    f_lo = f_hi - 1
+    # Bracketing nominal times: (50 %, 10 %) or (10 %, 1 %).
+    t_a = np.where(time >= NOMINAL_TIMES_PCT[1], 0, 1)
+    t_b = t_a + 1
+
+    def at_time(t_idx):
+        e_lo = _field_nominal(tables, f_lo, t_idx, p_idx, h1, d_curve, is_sea)
+        e_hi = _field_nominal(tables, f_hi, t_idx, p_idx, h1, d_curve, is_sea)
+        f0 = NOMINAL_FREQS_MHZ[f_lo]
+        f1 = NOMINAL_FREQS_MHZ[f_hi]
+        return e_lo + (e_hi - e_lo) * np.log10(freq / f0) / np.log10(f1 / f0)
+
+    e_a = at_time(t_a)
+    e_b = at_time(t_b)
+    q_t = inverse_q(time / 100.0)
+    q_a = inverse_q(NOMINAL_TIMES_PCT[t_a] / 100.0)
+    q_b = inverse_q(NOMINAL_TIMES_PCT[t_b] / 100.0)
+    e = e_a * (q_b - q_t) / (q_b - q_a) + e_b * (q_t - q_a) / (q_b - q_a)
+
+    e = e + _rx_height_correction(freq, h1, rx_h, d_curve, clutter_m, is_sea, is_urban)
+    e = e + 20.0 * np.log10(d_curve / np.maximum(dist, 1e-3))
+
+    e_max = free_space_field(np.maximum(dist, 1e-3))
+    if p_idx != 0:
+        e_max = e_max + 2.38 * (1.0 - np.exp(-dist / 8.94)) * np.log10(50.0 / time)
+    e = np.minimum(e, e_max)
+
+    sigma_l = LOCATION_K.get(env_type, DEFAULT_LOCATION_K) + 1.3 * np.log10(freq)
+    e = e + inverse_q(loc / 100.0) * sigma_l
+
+    return e + 10.0 * np.log10(erp)
+
+
+def distance_for_field(
+    target_dbuvm,
+    freq_mhz,
+    time_pct,
+    heff_m,
+    erp_kw=1.0,
+    rx_h_m=10.0,
+    path_type="Land",
+    env_type="Rural",
+    location_pct=50.0,
+    ha_m=None,
+    min_distance_km=0.1,
+    max_distance_km=1000.0,
+    tol_km=0.001,
+    tables: P1546Tables | None = None,
+) -> np.ndarray:
+    """
+    Inverse of field_strength: farthest distance (km) at which the field
+    still reaches target_dbuvm, for arrays of inputs (broadcast like
+    field_strength). The field is evaluated once on the tabulated distance
+    grid to bracket the crossing, then refined by bisection on log(d).
+    Returns 0 where the target is not reached at min_distance_km and
+    max_distance_km where it is still exceeded there.
+    """
+    tables = tables or load_p1546_tables()
+    target, freq, time, heff, erp, rx_h, loc = np.broadcast_arrays(
+        np.asarray(target_dbuvm, dtype=np.float64),
+        np.asarray(freq_mhz, dtype=np.float64),
+        np.asarray(time_pct, dtype=np.float64),
+        np.asarray(heff_m, dtype=np.float64),
+        np.asarray(erp_kw, dtype=np.float64),
+        np.asarray(rx_h_m, dtype=np.float64),
+        np.asarray(location_pct, dtype=np.float64),
+    )
+    ha = heff if ha_m is None else np.broadcast_to(np.asarray(ha_m, dtype=np.float64), heff.shape)
+
+    def field_at(d, expand=False):
+        args = (freq, time, heff, erp, rx_h, loc, ha)
+        if expand:
+            args = tuple(a[..., None] for a in args)
+        f, t, h, p, r, q, a = args
+        return field_strength(f, t, h, d, rx_h_m=r, erp_kw=p, path_type=path_type,
+                              env_type=env_type, location_pct=q, ha_m=a, tables=tables)
+
+    grid = tables.distances_km
+    grid = np.concatenate(([min_distance_km], grid[(grid > min_distance_km) & (grid < max_distance_km)],
+                           [max_distance_km]))
+    e_grid = field_at(grid, expand=True)
+
+    # Last grid node still at or above the target (the curves are monotone
+    # in practice, taking the farthest one keeps the result conservative).
+    above = e_grid >= target[..., None]
+    last = grid.size - 1 - np.argmax(above[..., ::-1], axis=-1)
+    any_above = above.any(axis=-1)
+    at_max = above[..., -1]
+
+    idx = np.minimum(last, grid.size - 2)
+    lo = np.log10(grid[idx])
+    hi = np.log10(grid[idx + 1])
+    # tol_km at max_distance_km expressed as a step in log10(d).
+    log_tol = tol_km / (max_distance_km * np.log(10.0))
+    width = float(np.max(hi - lo)) if hi.size else 0.0
+    n_iter = int(np.ceil(np.log2(max(width / log_tol, 1.0))))
+    for _ in range(n_iter):
+        mid = 0.5 * (lo + hi)
+        ok = field_at(10.0 ** mid) >= target
+        lo = np.where(ok, mid, lo)
+        hi = np.where(ok, hi, mid)
+
+    dist = 10.0 ** lo
+    dist = np.where(at_max, max_distance_km, dist)
+    return np.where(any_above, dist, 0.0)
+
+
+def basic_transmission_loss(field_dbuvm, freq_mhz, erp_kw=1.0):
+    """
+    Basic transmission loss (dB) equivalent to a field strength (Annex 5, 17).
+    """
+    e_1kw = np.asarray(field_dbuvm, dtype=np.float64) - 10.0 * np.log10(erp_kw)
+    return 139.3 - e_1kw + 20.0 * np.log10(freq_mhz)
+
+
+def calc_p1546_native(freq_mhz, time_pct, tx_h_eff, rx_h, distance_km, env_type="Rural",
+                      path_type="Land", location_pct=50, tx_erp_kw=1.0):
+    """
+    Array counterpart of calc_p1546_point: returns (Field Strength dBuV/m, Loss dB).
+    """
+    es = field_strength(
+        freq_mhz,
+        time_pct,
+        tx_h_eff,
+        distance_km,
+        rx_h_m=rx_h,
+        erp_kw=tx_erp_kw,
+        path_type=path_type,
+        env_type=env_type,
+        location_pct=location_pct,
+    )
+    return es, basic_transmission_loss(es, freq_mhz, tx_erp_kw)
@@ -0,0 +1,65 @@
+import numpy as np
+from numba import njit, prange
+
+
+@njit(cache=True)
+def point_in_rings(lat, lon, ring_offsets, ring_lat, ring_lon):
+    """
+    Even-odd ray casting of one point against a set of closed rings stored
+    back to back (ring k spans ring_offsets[k]:ring_offsets[k + 1]).
+    Holes and disjoint polygons of a MultiPolygon are handled by the
+    even-odd rule over all rings.
+    """
+    inside = False
+    for k in range(ring_offsets.shape[0] - 1):
+        start = ring_offsets[k]
+        end = ring_offsets[k + 1]
+        j = end - 1
+        for i in range(start, end):
+            lat_i = ring_lat[i]
+            lat_j = ring_lat[j]
+            if (lat_i > lat) != (lat_j > lat):
+                lon_cross = ring_lon[i] + (lat - lat_i) * (ring_lon[j] - ring_lon[i]) / (lat_j - lat_i)
+                if lon < lon_cross:
+                    inside = not inside
+            j = i
+    return inside
+
+
+@njit(parallel=True, cache=True)
+def grid_mask(lats, lons, ring_offsets, ring_lat, ring_lon):
+    """
+    Mask (n_rows, n_cols) of the grid points (lats[row], lons[col]) inside
+    the rings (same even-odd rule as point_in_rings). Scanline: the edge
+    crossings of each row are collected and sorted once, then every column
+    is classified by the parity of the crossings east of it. lons must be
+    ascending.
+    """
+    n_rows = lats.shape[0]
+    n_cols = lons.shape[0]
+    n_vertices = ring_lat.shape[0]
+    out = np.zeros((n_rows, n_cols), dtype=np.bool_)
+    for r in prange(n_rows):
+        lat = lats[r]
+        crossings = np.empty(n_vertices, dtype=np.float64)
+        n_cross = 0
+        for k in range(ring_offsets.shape[0] - 1):
+            start = ring_offsets[k]
+            end = ring_offsets[k + 1]
+            j = end - 1
+            for i in range(start, end):
+                lat_i = ring_lat[i]
+                lat_j = ring_lat[j]
+                if (lat_i > lat) != (lat_j > lat):
+                    crossings[n_cross] = ring_lon[i] + (lat - lat_i) * (ring_lon[j] - ring_lon[i]) / (lat_j - lat_i)
+                    n_cross += 1
+                j = i
+        if n_cross == 0:
+            continue
+        xs = np.sort(crossings[:n_cross])
+        # lon < crossing toggles, so a point is inside when the number of
+        # crossings strictly east of it is odd.
+        idx = np.searchsorted(xs, lons, side="right")
+        for c in range(n_cols):
+            out[r, c] = (n_cross - idx[c]) % 2 == 1
+    return out
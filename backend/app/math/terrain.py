@@ -0,0 +1,121 @@
+import numpy as np
+from numba import njit, prange, types, typed
+
+from app.math.geodesy import direct_setup, vincenty_direct_from_setup
+
+EARTH_RADIUS = 6371000.0  # meters
+
+# SRTM void marker. Voids (and missing tiles) are sampled as sea level (0 m).
+HGT_VOID = -32768
+
+# Tiles are handed to the kernels as native uint16 views over the big-endian
+# memory map, so pages are only faulted in for the samples actually touched.
+HGT_TILE_TYPE = types.Array(types.uint16, 2, "C", readonly=True)
+
+
+def empty_tile_list():
+    return typed.List.empty_list(HGT_TILE_TYPE)
+
+
+@njit(cache=True)
+def hgt_value(tile, r, c):
+    """
+    Reads one big-endian int16 sample from a uint16 view of an .hgt tile.
+    """
+    raw = np.int32(tile[r, c])
+    val = ((raw >> 8) | (raw << 8)) & 0xFFFF
+    if val >= 32768:
+        val -= 65536
+    if val == HGT_VOID:
+        return 0.0
+    return float(val)
+
+
+@njit(cache=True, fastmath=True)
+def sample_bilinear(tiles, tile_index, lat0, lon0, lat, lon):
+    """
+    Bilinear elevation (m) at (lat, lon) from a set of 1x1 degree .hgt tiles.
+    tile_index[i, j] is the position in `tiles` of the tile whose lower-left
+    corner is (lat0 + i, lon0 + j), or -1 when no tile is available.
+    """
+    lat_floor = np.floor(lat)
+    lon_floor = np.floor(lon)
+    i = int(lat_floor) - lat0
+    j = int(lon_floor) - lon0
+    if i < 0 or j < 0 or i >= tile_index.shape[0] or j >= tile_index.shape[1]:
+        return 0.0
+    k = tile_index[i, j]
+    if k < 0:
+        return 0.0
+
+    tile = tiles[k]
+    n = tile.shape[0]
+    # Row 0 is the northern edge of the tile, column 0 the western edge.
+    r = (lat_floor + 1.0 - lat) * (n - 1)
+    c = (lon - lon_floor) * (n - 1)
+    r0 = min(max(int(r), 0), n - 2)
+    c0 = min(max(int(c), 0), n - 2)
+    delta_r = r - r0
+    delta_c = c - c0
+
+    val00 = hgt_value(tile, r0, c0)
+    val01 = hgt_value(tile, r0, c0 + 1)
+    val10 = hgt_value(tile, r0 + 1, c0)
+    val11 = hgt_value(tile, r0 + 1, c0 + 1)
+
+    top = val00 * (1 - delta_c) + val01 * delta_c
+    bot = val10 * (1 - delta_c) + val11 * delta_c
+
+    return top * (1 - delta_r) + bot * delta_r
+
+
+@njit(parallel=True, cache=True, fastmath=True)
+def sample_points(tiles, tile_index, lat0, lon0, lats, lons):
+    """
+    Elevations for flat arrays of coordinates (degrees).
+    """
+    n = lats.shape[0]
+    out = np.empty(n, dtype=np.float64)
+    for i in prange(n):
+        out[i] = sample_bilinear(tiles, tile_index, lat0, lon0, lats[i], lons[i])
+    return out
+
+
+@njit(parallel=True, cache=True, fastmath=True)
+def sample_radials(tiles, tile_index, lat0, lon0, tx_lat, tx_lon, azimuths_deg, dist_m):
+    """
+    Elevation matrix (n_azimuth, n_samples) for a fan of radials leaving
+    (tx_lat, tx_lon), one row per azimuth, sampled at the distances dist_m
+    along the WGS84 geodesic (Vincenty, azimuth terms solved once per row).
+    """
+    n_az = azimuths_deg.shape[0]
+    n_s = dist_m.shape[0]
+    out = np.empty((n_az, n_s), dtype=np.float64)
+
+    for a in prange(n_az):
+        setup = direct_setup(tx_lat, azimuths_deg[a])
+        for s in range(n_s):
+            lat, lon = vincenty_direct_from_setup(setup, tx_lon, dist_m[s])
+            out[a, s] = sample_bilinear(tiles, tile_index, lat0, lon0, lat, lon)
+    return out
+
+
+@njit(parallel=True, cache=True, fastmath=True)
+def sample_profiles(tiles, tile_index, lat0, lon0, tx_lat, tx_lon, azimuths_deg, dist_total_m, n_valid, n_samples):
+    """
+    Elevation matrix (n_profiles, n_samples) for profiles leaving
+    (tx_lat, tx_lon), each with its own azimuth and length: row r holds
+    n_valid[r] samples spaced uniformly from 0 to dist_total_m[r]; the
+    remaining columns are padding (0).
+    """
+    n_prof = azimuths_deg.shape[0]
+    out = np.zeros((n_prof, n_samples), dtype=np.float64)
+
+    for r in prange(n_prof):
+        setup = direct_setup(tx_lat, azimuths_deg[r])
+        n = min(n_valid[r], n_samples)
+        step = dist_total_m[r] / max(n - 1, 1)
+        for s in range(n):
+            lat, lon = vincenty_direct_from_setup(setup, tx_lon, s * step)
+            out[r, s] = sample_bilinear(tiles, tile_index, lat0, lon0, lat, lon)
+    return out
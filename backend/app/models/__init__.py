@@ -15,11 +15,13 @@ from app.models.gis import (
     GISContour,
     ContourPoint,
     InterferenceTestPoint,
+    PathLossMatrix,
     RNICriticalArea,
     RNIZone,
+    TerrainAverage,
 )
 from app.models.grid import FieldTile
-from app.models.anatel import Aerodrome, AnatelStation, ViabilityStudy
+from app.models.anatel import Aerodrome, AnatelStation, IndexedStation, StationInteraction, ViabilityStudy
 from app.models.v4 import Network, V4Station, V4Antenna, Raster, Job, Contour
 
 __all__ = [
@@ -41,11 +43,15 @@ __all__ = [
     "InterferenceTestPoint",
     "RNIZone",
     "RNICriticalArea",
+    "TerrainAverage",
+    "PathLossMatrix",
     "FileAsset",
     "FieldTile",
     "AnatelStation",
     "Aerodrome",
     "ViabilityStudy",
+    "IndexedStation",
+    "StationInteraction",
     "Network",
     "V4Station",
     "V4Antenna",
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import uuid
 
-from sqlalchemy import DateTime, Float, ForeignKey, Text
+from sqlalchemy import DateTime, Float, ForeignKey, Integer, Text, text
 from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.sql import func
 from geoalchemy2 import Geometry
@@ -12,7 +12,12 @@ from app.extensions import db
 
 class AnatelStation(db.Model):
     __tablename__ = "anatel_stations"
-    __table_args__ = {"schema": "anatel"}
+    __table_args__ = (
+        # Interference screening: ST_DWithin on geography and frequency ranges.
+        db.Index("idx_anatel_stations_geog", text("(geom::geography)"), postgresql_using="gist"),
+        db.Index("idx_anatel_stations_frequencia", "frequencia_mhz"),
+        {"schema": "anatel"},
+    )
 
     id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
     source = db.Column(Text, nullable=False)
@@ -79,3 +84,43 @@ class ViabilityStudy(db.Model):
     updated_at = db.Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
     user = db.relationship("User", backref="viability_studies")
+
+
+class IndexedStation(db.Model):
+    """
+    Station known to the interaction index (key "anatel:<source>:<source id>" or
+    "v4:<uuid>") with the fingerprint of the parameters it was screened
+    with; a different fingerprint means its pairs are stale.
+    """
+
+    __tablename__ = "station_index"
+    __table_args__ = {"schema": "anatel"}
+
+    station_key = db.Column(Text, primary_key=True)
+    fingerprint = db.Column(Text, nullable=False)
+    pair_count = db.Column(Integer, nullable=False, default=0)
+    indexed_at = db.Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class StationInteraction(db.Model):
+    """
+    Station pair found mutually relevant by screening, with the worst D/U
+    margin of interferer_key on victim_key's protected contour.
+    """
+
+    __tablename__ = "station_interactions"
+    __table_args__ = (
+        db.Index("idx_station_interactions_interferer", "interferer_key"),
+        db.Index("idx_station_interactions_victim", "victim_key"),
+        {"schema": "anatel"},
+    )
+
+    id = db.Column(db.BigInteger, primary_key=True, autoincrement=True)
+    interferer_key = db.Column(Text, nullable=False)
+    victim_key = db.Column(Text, nullable=False)
+    relation = db.Column(Text, nullable=False)
+    pr_db = db.Column(Float, nullable=False)
+    distance_km = db.Column(Float, nullable=False)
+    worst_margin_db = db.Column(Float, nullable=False)
+    worst_azimuth_deg = db.Column(Float, nullable=False)
+    created_at = db.Column(DateTime(timezone=True), server_default=func.now())
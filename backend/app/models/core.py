@@ -33,6 +33,8 @@ class ProjectRevision(db.Model):
     label = db.Column(Text, nullable=False)
     created_at = db.Column(DateTime(timezone=True), server_default=func.now())
     inputs_snapshot = db.Column(JSONB, nullable=False, default=dict)
+    # Per-stage input fingerprints and results of the last run (see app.services.recompute).
+    run_state = db.Column(JSONB, nullable=False, default=dict, server_default="{}")
 
     project = db.relationship("Project", backref="revisions")
 
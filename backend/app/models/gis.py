@@ -3,8 +3,9 @@ from __future__ import annotations
 import os
 import uuid
 
-from sqlalchemy import Boolean, Float, ForeignKey, Integer, Text
+from sqlalchemy import Boolean, DateTime, Float, ForeignKey, Integer, Text
 from sqlalchemy.dialects.postgresql import JSONB, UUID
+from sqlalchemy.sql import func
 from geoalchemy2 import Geometry
 
 from app.extensions import db
@@ -81,3 +82,50 @@ class RNICriticalArea(db.Model):
     within_50m = db.Column(Boolean, nullable=False, default=False)
 
     rni = db.relationship("RNIAssessment", backref="critical_areas")
+
+
+class TerrainAverage(db.Model):
+    """
+    Per-azimuth 3-15 km average terrain around a site, reused to derive
+    effective heights (HAAT/HNMT) for any antenna height at that location.
+    """
+    __tablename__ = "terrain_averages"
+    __table_args__ = (
+        db.UniqueConstraint("lat", "lon", "dem_version", "step_deg", name="uq_terrain_averages_key"),
+        {"schema": "gis"},
+    )
+
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    lat = db.Column(Float, nullable=False)
+    lon = db.Column(Float, nullable=False)
+    dem_version = db.Column(Text, nullable=False)
+    step_deg = db.Column(Float, nullable=False)
+    ground_alt_m = db.Column(Float, nullable=False)
+    avg_terrain_m = db.Column(JSONB, nullable=False)
+    created_at = db.Column(DateTime(timezone=True), server_default=func.now())
+
+
+class PathLossMatrix(db.Model):
+    """
+    Index of ERP-independent field-strength matrices (1 kW ERP, isotropic
+    in azimuth) stored as .npy files under FILE_STORAGE_DIR, keyed by a hash
+    of the site geometry, propagation model inputs and DEM version.
+    """
+    __tablename__ = "path_loss_matrices"
+    __table_args__ = {"schema": "gis"}
+
+    id = db.Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    key = db.Column(Text, nullable=False, unique=True)
+    model = db.Column(Text, nullable=False)
+    lat = db.Column(Float, nullable=False)
+    lon = db.Column(Float, nullable=False)
+    h_agl = db.Column(Float, nullable=False)
+    freq_mhz = db.Column(Float, nullable=False)
+    dem_version = db.Column(Text, nullable=False)
+    step_deg = db.Column(Float, nullable=False)
+    step_m = db.Column(Float, nullable=False)
+    n_az = db.Column(Integer, nullable=False)
+    n_distances = db.Column(Integer, nullable=False)
+    file_path = db.Column(Text, nullable=False)
+    params = db.Column(JSONB, nullable=False, default=dict)
+    created_at = db.Column(DateTime(timezone=True), server_default=func.now())
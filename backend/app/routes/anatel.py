@@ -1,11 +1,18 @@
 from __future__ import annotations
 
+import math
+
 from flask import Blueprint, jsonify, request, g
 from geoalchemy2 import Geography
 from sqlalchemy import func
 
 from app.extensions import db
 from app.models import Aerodrome, AnatelStation, ViabilityStudy
+from app.services.antenna import compiled_anatel_pattern
+from app.services.contour import p1546_contour_radials
+from app.services.interactions import station_pairs
+from app.services.screening import SCREEN_RADIUS_KM
+from app.tasks.tasks import run_screening
 from app.utils.auth import require_auth
 
 
@@ -21,6 +28,21 @@ def _parse_float(value: str | None) -> float | None:
         return None
 
 
+def _arg_float(name: str, default: float, low: float, high: float) -> float:
+    # Unlike _parse_float, a bad or out-of-range value is an error (and an
+    # explicit 0 is kept, not replaced by the default).
+    raw = request.args.get(name)
+    if raw is None:
+        return default
+    try:
+        value = float(raw)
+    except ValueError:
+        raise ValueError(f"{name} must be a number") from None
+    if not low <= value <= high:
+        raise ValueError(f"{name} must be between {low:g} and {high:g}")
+    return value
+
+
 def _point(lon: float, lat: float):
     return func.ST_SetSRID(func.ST_MakePoint(lon, lat), 4674)
 
@@ -71,6 +93,39 @@ def list_stations():
     )
 
 
+@anatel_bp.get("/stations/<int:station_id>/contour")
+@require_auth
+def station_contour(station_id: int):
+    station = AnatelStation.query.get(station_id)
+    if not station:
+        return jsonify({"error": "not_found"}), 404
+    if not station.frequencia_mhz or not station.erp_kw:
+        return jsonify({"error": "station_without_frequency_or_erp"}), 400
+
+    try:
+        thresholds = [float(v) for v in request.args.getlist("threshold_dbuvm")] or [54.0]
+        step_deg = int(request.args.get("step_deg", "1"))
+        # P.1546 covers 1-50 % of time and 1-99 % of locations.
+        time_pct = _arg_float("time_pct", 50.0, 1.0, 50.0)
+        location_pct = _arg_float("location_pct", 50.0, 1.0, 99.0)
+        radial = p1546_contour_radials(
+            station.latitude,
+            station.longitude,
+            station.frequencia_mhz,
+            10 * math.log10(station.erp_kw * 1000.0),
+            station.altura_m or 30.0,
+            thresholds,
+            pattern=compiled_anatel_pattern(station) if station.pattern_dbd else None,
+            step_deg=step_deg,
+            time_pct=time_pct,
+            location_pct=location_pct,
+        )
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    db.session.commit()
+    return jsonify(radial.to_geojson(station.latitude, station.longitude, {"station_id": station.id}))
+
+
 @anatel_bp.get("/aerodromes")
 @require_auth
 def list_aerodromes():
@@ -189,3 +244,43 @@ def get_study(study_id: str):
             "resultado_json": study.resultado_json,
         }
     )
+
+
+@anatel_bp.post("/studies/<study_id>/screening")
+@require_auth
+def screen_study_route(study_id: str):
+    study = ViabilityStudy.query.filter_by(id=study_id, user_id=g.current_user.id).first()
+    if not study:
+        return jsonify({"error": "not_found"}), 404
+
+    payload = request.get_json(silent=True) or {}
+    radius_km = _parse_float(payload.get("radius_km")) or SCREEN_RADIUS_KM
+    try:
+        result = run_screening.delay(str(study.id), radius_km).get()
+    except ValueError as exc:
+        return jsonify({"error": str(exc)}), 400
+    return jsonify(result)
+
+
+@anatel_bp.get("/interactions")
+@require_auth
+def list_interactions():
+    key = request.args.get("station_key")
+    if not key:
+        return jsonify({"error": "station_key_required"}), 400
+
+    return jsonify(
+        [
+            {
+                "interferer_key": pair.interferer_key,
+                "victim_key": pair.victim_key,
+                "relation": pair.relation,
+                "pr_db": pair.pr_db,
+                "distance_km": pair.distance_km,
+                "worst_margin_db": pair.worst_margin_db,
+                "worst_azimuth_deg": pair.worst_azimuth_deg,
+                "passed": pair.worst_margin_db >= 0,
+            }
+            for pair in station_pairs(key)
+        ]
+    )
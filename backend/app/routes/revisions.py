@@ -4,6 +4,7 @@ from flask import Blueprint, jsonify, request, g
 
 from app.extensions import db
 from app.models import Project, ProjectRevision
+from app.services.recompute import plan_revision_run, record_stage_result
 from app.tasks.tasks import run_contour, run_interference, run_opea, run_rni
 from app.utils.auth import require_auth
 
@@ -89,36 +90,60 @@ def run_revision(revision_id: str):
         return jsonify({"error": "not_found"}), 404
 
     payload = request.get_json(force=True)
-    results = {}
 
+    # Normalized arguments of the requested stages, part of their inputs.
+    stage_args = {}
     contour_args = payload.get("contour")
     if contour_args:
-        results["contour"] = run_contour.delay(
-            revision_id,
-            float(contour_args.get("threshold_dbuvm", 54.0)),
-            int(contour_args.get("step_deg", 5)),
-            float(contour_args.get("step_km", 0.1)),
-        ).get()
-
-    if payload.get("interference"):
-        results["interference"] = run_interference.delay(revision_id).get()
-
+        thresholds = contour_args.get("thresholds_dbuvm") or [contour_args.get("threshold_dbuvm", 54.0)]
+        stage_args["contour"] = {
+            "thresholds_dbuvm": [float(t) for t in thresholds],
+            "kinds": contour_args.get("kinds"),
+            "step_deg": int(contour_args.get("step_deg", 5)),
+            "step_km": float(contour_args.get("step_km", 0.1)),
+            "options": {
+                k: contour_args[k] for k in ("method", "pattern", "time_pct", "location_pct") if k in contour_args
+            },
+        }
+    interference_args = payload.get("interference")
+    if interference_args:
+        aggregate = isinstance(interference_args, dict) and bool(interference_args.get("aggregate"))
+        stage_args["interference"] = {"aggregate": True} if aggregate else {}
     rni_args = payload.get("rni")
     if rni_args:
-        results["rni"] = run_rni.delay(
-            revision_id,
-            float(rni_args.get("s_limit_public", 10.0)),
-            float(rni_args.get("s_limit_occ", 50.0)),
-            float(rni_args.get("k_reflection", 2.56)),
-        ).get()
-
+        stage_args["rni"] = {
+            "s_limit_public": float(rni_args.get("s_limit_public", 10.0)),
+            "s_limit_occ": float(rni_args.get("s_limit_occ", 50.0)),
+            "k_reflection": float(rni_args.get("k_reflection", 2.56)),
+        }
     opea_args = payload.get("opea")
     if opea_args:
-        results["opea"] = run_opea.delay(
-            revision_id,
-            opea_args.get("aerodrome_ref"),
-            opea_args.get("aerodrome_lat"),
-            opea_args.get("aerodrome_lon"),
-        ).get()
-
-    return jsonify({"message": "queued", "results": results}), 200
+        stage_args["opea"] = {
+            "aerodrome_ref": opea_args.get("aerodrome_ref"),
+            "aerodrome_lat": opea_args.get("aerodrome_lat"),
+            "aerodrome_lon": opea_args.get("aerodrome_lon"),
+        }
+
+    tasks = {
+        "contour": lambda args: run_contour.delay(
+            revision_id, args["thresholds_dbuvm"], args["step_deg"], args["step_km"], args["kinds"], **args["options"]
+        ),
+        "interference": lambda args: run_interference.delay(revision_id, args.get("aggregate", False)),
+        "rni": lambda args: run_rni.delay(
+            revision_id, args["s_limit_public"], args["s_limit_occ"], args["k_reflection"]
+        ),
+        "opea": lambda args: run_opea.delay(
+            revision_id, args["aerodrome_ref"], args["aerodrome_lat"], args["aerodrome_lon"]
+        ),
+    }
+
+    # Only stages whose inputs changed since their last run are recomputed.
+    plan = plan_revision_run(revision, stage_args, force=bool(payload.get("force")))
+    results = {}
+    for stage, stage_plan in plan.stages.items():
+        if stage_plan.action == "run":
+            record_stage_result(revision, stage_plan, tasks[stage](stage_args[stage]).get())
+            db.session.commit()
+        results[stage] = stage_plan.result
+
+    return jsonify({"message": "queued", "results": results, "plan": plan.to_dict()}), 200
@@ -1,10 +1,24 @@
 
-from flask import Blueprint, request, jsonify
-from app.extensions import db
-from app.models.v4 import Network, V4Station, Job
-from app.tasks.computation import calculate_link_profile
+from flask import Blueprint, current_app, request, jsonify, Response, send_file
+from app.extensions import celery_app, db
+from app.models.v4 import Network, V4Antenna, V4Station, Job
+from app.services.antenna import compiled_v4_antenna
+from app.services.contour import P1546_MAX_DISTANCE_KM, p1546_contour_radials
+from app.services.coverage import load_block
+from app.services.raster_contours import ContourPolygons, store_contours
+from app.tasks.computation import (
+    calculate_channel_search,
+    calculate_coverage_raster,
+    calculate_link_batch,
+    calculate_link_profile,
+    calculate_network_coverage,
+    regenerate_network_contours,
+)
+from app.tasks.tasks import reindex_interactions
 from sqlalchemy import func
 import json
+import os
+import numpy as np
 
 v4_bp = Blueprint('v4', __name__, url_prefix='/api/v4')
 
@@ -74,6 +88,28 @@ def list_stations(network_id):
         "features": features
     })
 
+def _json_float(data, name, default, low, high):
+    # Like routes/anatel.py _arg_float, for JSON bodies: a bad or
+    # out-of-range value is an error.
+    value = data.get(name, default)
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a number") from None
+    if not low <= value <= high:
+        raise ValueError(f"{name} must be between {low:g} and {high:g}")
+    return value
+
+def _queue_reindex(station_id):
+    """
+    Hands the station's interaction re-screen to a worker. Without one
+    (eager Celery) the 400 km screening would run inside the request, so
+    the station is left stale instead: its fingerprint no longer matches
+    and the next `flask engspec reindex-interactions` picks it up.
+    """
+    if not celery_app.conf.task_always_eager:
+        reindex_interactions.delay("v4", [str(station_id)])
+
 @v4_bp.route('/stations', methods=['POST'])
 def create_station():
     data = request.json
@@ -94,8 +130,28 @@ def create_station():
     )
     db.session.add(station)
     db.session.commit()
+    _queue_reindex(station.id)
     return jsonify({'id': str(station.id)}), 201
 
+@v4_bp.route('/stations/<station_id>', methods=['PATCH'])
+def update_station(station_id):
+    """
+    Updates a station's parameters; the interaction index re-screens it
+    (only its own pairs) when a screening input changed, see _queue_reindex.
+    """
+    station = V4Station.query.get_or_404(station_id)
+    data = request.json or {}
+    for field in ('service', 'status', 'canal', 'freq_mhz', 'uf', 'municipio', 'h_eff', 'htx', 'd_max', 'erp_dbm'):
+        if field in data:
+            setattr(station, field, data[field])
+    if 'name' in data:
+        station.entidade = data['name']
+    if 'lat' in data and 'lon' in data:
+        station.geom = func.ST_GeomFromText(f"POINT({float(data['lon'])} {float(data['lat'])})", 4674)
+    db.session.commit()
+    _queue_reindex(station.id)
+    return jsonify({'id': str(station.id)}), 200
+
 # --- JOBS (CALCULATIONS) ---
 
 @v4_bp.route('/jobs/link', methods=['POST'])
@@ -119,6 +175,218 @@ def create_link_job():
     
     return jsonify({'job_id': str(job.id), 'task_id': task.id}), 202
 
+@v4_bp.route('/jobs/link-batch', methods=['POST'])
+def create_link_batch_job():
+    """
+    One transmitter against many receivers: inline `receivers`
+    ([{id, lat, lon, h_m}]) and/or every station of `rx_network_id`.
+    """
+    data = request.json
+    tx_id = data.get('tx_id')
+
+    # Receivers go to the task, not into Job.params.
+    params = {k: v for k, v in data.items() if k != 'receivers'}
+    params['receiver_count'] = len(data.get('receivers') or [])
+    job = Job(
+        network_id=data.get('network_id'),
+        type='link_batch',
+        status='pending',
+        params=params
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    options = {k: data[k] for k in ('time_pct', 'location_pct', 'env_type', 'k_factor', 'max_edges') if k in data}
+    task = calculate_link_batch.delay(
+        job.id, tx_id,
+        receivers=data.get('receivers'),
+        rx_network_id=data.get('rx_network_id'),
+        rx_h_m=data.get('rx_h_m', 10.0),
+        model=data.get('model', 'p1546'),
+        step_m=data.get('step_m', 100.0),
+        **options
+    )
+
+    return jsonify({'job_id': str(job.id), 'task_id': task.id}), 202
+
+@v4_bp.route('/jobs/channel-search', methods=['POST'])
+def create_channel_search_job():
+    """
+    Available channels at a site: lat, lon, service, erp_kw, h_agl_m and
+    optionally channels (default: the whole band) and pattern_h.
+    """
+    data = request.json or {}
+    missing = [k for k in ('lat', 'lon', 'service', 'erp_kw', 'h_agl_m') if data.get(k) is None]
+    if missing:
+        return jsonify({'error': f"Missing fields: {', '.join(missing)}"}), 400
+
+    job = Job(
+        network_id=data.get('network_id'),
+        type='channel_search',
+        status='pending',
+        params=data
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    options = {k: data[k] for k in ('channels', 'pattern_h', 'radius_km') if data.get(k) is not None}
+    task = calculate_channel_search.delay(
+        job.id, data['lat'], data['lon'], data['service'], data['erp_kw'], data['h_agl_m'], **options
+    )
+
+    return jsonify({'job_id': str(job.id), 'task_id': task.id}), 202
+
+@v4_bp.route('/jobs/<job_id>/links.npz', methods=['GET'])
+def get_link_batch_file(job_id):
+    """
+    Columnar result of a link-batch job (numpy .npz, one array per column).
+    """
+    job = Job.query.get_or_404(job_id)
+    if job.type != 'link_batch' or job.status != 'done' or not job.result_ref:
+        return jsonify({'error': 'Result not available'}), 404
+    path = os.path.join(current_app.config['FILE_STORAGE_DIR'], job.result_ref['file'])
+    if not os.path.exists(path):
+        return jsonify({'error': 'Result file missing'}), 404
+    return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+                     download_name=f'links_{job.id}.npz')
+
+@v4_bp.route('/jobs/coverage-raster', methods=['POST'])
+def create_coverage_raster_job():
+    data = request.json
+    tx_id = data.get('tx_id')
+    
+    job = Job(
+        network_id=data.get('network_id'),
+        type='coverage_raster',
+        status='pending',
+        params=data
+    )
+    db.session.add(job)
+    db.session.commit()
+    
+    options = {k: data[k] for k in ('rx_h_m', 'time_pct', 'location_pct', 'env_type', 'k_factor', 'max_edges', 'profile_step_m', 'radial_step_deg', 'levels_dbuvm', 'adaptive_stride', 'adaptive_margin_db') if k in data}
+    task = calculate_coverage_raster.delay(
+        job.id, tx_id, data.get('aoi'),
+        resolution_m=data.get('resolution_m', 100.0),
+        model=data.get('model', 'p1546'),
+        mode=data.get('mode', 'pixel'),
+        **options
+    )
+    
+    return jsonify({'job_id': str(job.id), 'task_id': task.id}), 202
+
+@v4_bp.route('/jobs/network-coverage', methods=['POST'])
+def create_network_coverage_job():
+    data = request.json
+    network_id = data.get('network_id')
+
+    job = Job(
+        network_id=network_id,
+        type='network_coverage',
+        status='pending',
+        params=data
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    options = {k: data[k] for k in ('rx_h_m', 'time_pct', 'location_pct', 'env_type', 'k_factor', 'max_edges', 'profile_step_m', 'radial_step_deg', 'levels_dbuvm', 'adaptive_stride', 'adaptive_margin_db') if k in data}
+    task = calculate_network_coverage.delay(
+        job.id, network_id,
+        resolution_m=data.get('resolution_m', 100.0),
+        model=data.get('model', 'p1546'),
+        mode=data.get('mode', 'pixel'),
+        threshold_dbuvm=data.get('threshold_dbuvm', 54.0),
+        radius_km=data.get('radius_km'),
+        **options
+    )
+
+    return jsonify({'job_id': str(job.id), 'task_id': task.id}), 202
+
+@v4_bp.route('/jobs/contours', methods=['POST'])
+def create_contours_job():
+    data = request.json
+    network_id = data.get('network_id')
+
+    job = Job(
+        network_id=network_id,
+        type='raster_contours',
+        status='pending',
+        params=data
+    )
+    db.session.add(job)
+    db.session.commit()
+
+    options = {k: data[k] for k in ('tolerance_px', 'station_ids') if k in data}
+    task = regenerate_network_contours.delay(job.id, network_id, data.get('levels', []), **options)
+
+    return jsonify({'job_id': str(job.id), 'task_id': task.id}), 202
+
+@v4_bp.route('/stations/<station_id>/contour', methods=['POST'])
+def station_contour(station_id):
+    """
+    Terrain-aware P.1546 contours of a station, computed synchronously
+    (radials every step_deg, default 1 deg). The horizontal pattern comes
+    from antenna_id (the compiled V4Antenna, electrical tilt included) or
+    an inline pattern_h. With
+    persist=true the contours replace the station's core.contours rows of
+    the same model and levels.
+    """
+    station = V4Station.query.get_or_404(station_id)
+    data = request.json or {}
+    thresholds = data.get('thresholds_dbuvm') or [data.get('threshold_dbuvm', 54.0)]
+
+    pattern = data.get('pattern_h')
+    if data.get('antenna_id'):
+        pattern = compiled_v4_antenna(V4Antenna.query.get_or_404(data['antenna_id']))
+
+    lat = db.session.scalar(func.ST_Y(station.geom))
+    lon = db.session.scalar(func.ST_X(station.geom))
+    try:
+        time_pct = _json_float(data, 'time_pct', 50.0, 1.0, 50.0)
+        location_pct = _json_float(data, 'location_pct', 50.0, 1.0, 99.0)
+        radial = p1546_contour_radials(
+            lat, lon,
+            station.freq_mhz or 100.0,
+            (station.erp_dbm or 60.0) - 30.0,
+            station.htx or 30.0,
+            thresholds,
+            pattern=pattern,
+            step_deg=int(data.get('step_deg', 1)),
+            time_pct=time_pct,
+            location_pct=location_pct,
+            rx_h_m=float(data.get('rx_h_m', 10.0)),
+            env_type=data.get('env_type', 'Rural'),
+            max_distance_km=float(data.get('max_distance_km') or station.d_max or P1546_MAX_DISTANCE_KM),
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    model = f"ITU1546_{time_pct:g}_{location_pct:g}"
+    if data.get('persist'):
+        lats, lons = radial.rings(lat, lon)
+        store_contours(station.network_id, station.id, model, [
+            ContourPolygons(level, [[(np.append(lons[i], lons[i][0]), np.append(lats[i], lats[i][0]))]])
+            for i, level in enumerate(radial.thresholds_dbuvm.tolist())
+        ])
+    # Terrain averages may have been computed and cached.
+    db.session.commit()
+
+    return jsonify(radial.to_geojson(lat, lon, {'station_id': str(station.id), 'model': model}))
+
+@v4_bp.route('/coverage/<station_id>/<layer>/<int:z>/<int:x>/<int:y>.f32', methods=['GET'])
+@v4_bp.route('/coverage/<station_id>/<layer>/<int:z>/<int:x>/<int:y>.bin', methods=['GET'])
+def get_coverage_block(station_id, layer, z, x, y):
+    """
+    Raw little-endian block (block_size x block_size). Station layers are
+    float32 with NaN = nodata; composite best/count layers (under the
+    network id) are int16/uint16, see X-Dtype.
+    """
+    values = load_block(station_id, layer, z, x, y)
+    if values is None:
+        return jsonify({'error': 'Block not found'}), 404
+    return Response(values.tobytes(), mimetype='application/octet-stream',
+                    headers={'X-Block-Size': str(values.shape[0]), 'X-Dtype': values.dtype.name})
+
 @v4_bp.route('/jobs/<job_id>', methods=['GET'])
 def get_job(job_id):
     job = Job.query.get_or_404(job_id)
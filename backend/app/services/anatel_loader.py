@@ -8,6 +8,10 @@ from geoalchemy2.elements import WKTElement
 
 from app.extensions import db
 from app.models import Aerodrome, AnatelStation
+from app.services.bulk import COPY_MIN_ROWS, insert_rows
+
+# Rows buffered per bulk write (and commit) during imports.
+IMPORT_BATCH_ROWS = COPY_MIN_ROWS
 
 
 def _parse_float(value: str | None) -> float | None:
@@ -41,6 +45,7 @@ def import_anatel_xml(path: str, truncate: bool = False) -> int:
 
     total = 0
     source = os.path.basename(path)
+    batch: list[dict] = []
 
     for event, elem in ET.iterparse(path, events=("end",)):
         if elem.tag != "row":
@@ -52,7 +57,7 @@ def import_anatel_xml(path: str, truncate: bool = False) -> int:
             elem.clear()
             continue
 
-        station = AnatelStation(
+        batch.append(dict(
             source=source,
             source_id=attrs.get("id") or attrs.get("IdtPlanoBasico"),
             service=attrs.get("Servico"),
@@ -72,14 +77,15 @@ def import_anatel_xml(path: str, truncate: bool = False) -> int:
             pattern_dbd=_parse_pipe_list(attrs.get("PadraoAntena_dBd")),
             limitacoes=_parse_pipe_list(attrs.get("Limitacoes")),
             geom=WKTElement(f"POINT({lon} {lat})", srid=4674),
-        )
-        db.session.add(station)
-        total += 1
+        ))
+        elem.clear()
 
-        if total % 1000 == 0:
+        if len(batch) >= IMPORT_BATCH_ROWS:
+            total += insert_rows(AnatelStation, batch)
             db.session.commit()
-        elem.clear()
+            batch = []
 
+    total += insert_rows(AnatelStation, batch)
     db.session.commit()
     return total
 
@@ -106,6 +112,7 @@ def import_aerodromes_json(path: str, truncate: bool = False) -> int:
         records = data
 
     total = 0
+    batch: list[dict] = []
     for record in records:
         lat = _find_value(record, ("lat", "latitude", "LAT", "Latitude"))
         lon = _find_value(record, ("lon", "longitude", "LON", "Longitude"))
@@ -117,7 +124,7 @@ def import_aerodromes_json(path: str, truncate: bool = False) -> int:
         except ValueError:
             continue
 
-        aerodrome = Aerodrome(
+        batch.append(dict(
             source=source,
             name=_find_value(record, ("nome", "name", "Nome")),
             icao=_find_value(record, ("icao", "ICAO")),
@@ -127,12 +134,13 @@ def import_aerodromes_json(path: str, truncate: bool = False) -> int:
             latitude=lat_f,
             longitude=lon_f,
             geom=WKTElement(f"POINT({lon_f} {lat_f})", srid=4674),
-        )
-        db.session.add(aerodrome)
-        total += 1
+        ))
 
-        if total % 1000 == 0:
+        if len(batch) >= IMPORT_BATCH_ROWS:
+            total += insert_rows(Aerodrome, batch)
             db.session.commit()
+            batch = []
 
+    total += insert_rows(Aerodrome, batch)
     db.session.commit()
     return total
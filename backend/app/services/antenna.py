@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+
+# Compiled grid: azimuth 0..359 deg (clockwise from north) by elevation
+# -90..90 deg (positive above the horizon), 1 deg steps.
+AZ_STEP_DEG = 1.0
+EL_STEP_DEG = 1.0
+N_AZ = int(round(360.0 / AZ_STEP_DEG))
+N_EL = int(round(180.0 / EL_STEP_DEG)) + 1
+
+# Compiled patterns kept per process.
+PATTERN_CACHE_SIZE = 512
+
+
+def _pattern_samples(pattern, start: float, span: float) -> tuple[np.ndarray, np.ndarray]:
+    """
+    (angles, gains) of a pattern given either as a mapping angle -> gain
+    (V4Antenna.pattern_h/pattern_v) or as a list of gains evenly spaced
+    from `start` (AnatelStation.pattern_dbd): over [start, start + span)
+    for a full circle, [start, start + span] otherwise.
+    """
+    if isinstance(pattern, dict):
+        items = sorted((float(angle), float(gain)) for angle, gain in pattern.items())
+        angles = np.array([angle for angle, _ in items], dtype=np.float64)
+        gains = np.array([gain for _, gain in items], dtype=np.float64)
+    else:
+        gains = np.asarray(pattern, dtype=np.float64).ravel()
+        if span >= 360.0:
+            angles = start + span / max(gains.size, 1) * np.arange(gains.size, dtype=np.float64)
+        else:
+            angles = np.linspace(start, start + span, gains.size) if gains.size > 1 else np.full(gains.size, 0.0)
+    return angles, gains
+
+
+def _horizontal_db(pattern) -> np.ndarray:
+    # Relative horizontal pattern on the AZ grid, circular interpolation.
+    azimuths = AZ_STEP_DEG * np.arange(N_AZ, dtype=np.float64)
+    if pattern is None or len(pattern) == 0:
+        return np.zeros(N_AZ)
+    angles, gains = _pattern_samples(pattern, 0.0, 360.0)
+    if gains.size == 0:
+        return np.zeros(N_AZ)
+    angles = np.mod(angles, 360.0)
+    order = np.argsort(angles)
+    angles, gains = angles[order], gains[order] - gains.max()
+    xp = np.concatenate((angles[-1:] - 360.0, angles, angles[:1] + 360.0))
+    fp = np.concatenate((gains[-1:], gains, gains[:1]))
+    return np.interp(azimuths, xp, fp)
+
+
+def _vertical_db(pattern) -> np.ndarray:
+    # Relative vertical pattern on the EL grid, held flat past the samples.
+    elevations = -90.0 + EL_STEP_DEG * np.arange(N_EL, dtype=np.float64)
+    if pattern is None or len(pattern) == 0:
+        return np.zeros(N_EL)
+    angles, gains = _pattern_samples(pattern, -90.0, 180.0)
+    if gains.size == 0:
+        return np.zeros(N_EL)
+    order = np.argsort(angles)
+    return np.interp(elevations, angles[order], gains[order] - gains.max())
+
+
+@dataclass(frozen=True)
+class CompiledPattern:
+    """
+    Dense relative pattern grid[az, el] (dB, max 0, float32) plus the
+    antenna's peak gain and its electrical downtilt.
+    """
+
+    grid: np.ndarray
+    gain_dbd: float = 0.0
+    tilt_el_deg: float = 0.0
+
+    @property
+    def horizontal_db(self) -> np.ndarray:
+        """
+        Relative gain on the horizon at every AZ_STEP_DEG, without tilt.
+        """
+        return self.grid[:, N_EL // 2]
+
+    def gain(
+        self,
+        azimuth_deg,
+        elevation_deg=0.0,
+        tilt_el_deg: float | None = None,
+        tilt_mech_deg: float = 0.0,
+        tilt_mech_az_deg: float = 0.0,
+    ) -> np.ndarray:
+        """
+        Relative gain (dB, <= 0) towards arrays of azimuths and elevations
+        (broadcast), bilinear on the grid. Electrical downtilt (default:
+        the antenna's) lowers the vertical pattern; mechanical downtilt
+        rotates the whole antenna down towards tilt_mech_az_deg.
+        """
+        az, el = np.broadcast_arrays(
+            np.asarray(azimuth_deg, dtype=np.float64), np.asarray(elevation_deg, dtype=np.float64)
+        )
+        if tilt_mech_deg:
+            # Direction in the frame of the tilted antenna.
+            t = np.radians(tilt_mech_deg)
+            rel = np.radians(az - tilt_mech_az_deg)
+            el_r = np.radians(el)
+            u = np.cos(el_r) * np.cos(rel)
+            w = np.cos(el_r) * np.sin(rel)
+            z = np.sin(el_r)
+            u_t = u * np.cos(t) - z * np.sin(t)
+            z_t = u * np.sin(t) + z * np.cos(t)
+            az = tilt_mech_az_deg + np.degrees(np.arctan2(w, u_t))
+            el = np.degrees(np.arcsin(np.clip(z_t, -1.0, 1.0)))
+        tilt = self.tilt_el_deg if tilt_el_deg is None else tilt_el_deg
+        el = el + tilt
+
+        fa = np.mod(az, 360.0) / AZ_STEP_DEG
+        fe = np.clip((el + 90.0) / EL_STEP_DEG, 0.0, N_EL - 1.0)
+        a0 = np.floor(fa).astype(np.int64) % N_AZ
+        a1 = (a0 + 1) % N_AZ
+        e0 = np.minimum(np.floor(fe).astype(np.int64), N_EL - 2)
+        wa = fa - np.floor(fa)
+        we = fe - e0
+        g = self.grid
+        low = g[a0, e0] * (1.0 - we) + g[a0, e0 + 1] * we
+        high = g[a1, e0] * (1.0 - we) + g[a1, e0 + 1] * we
+        return low * (1.0 - wa) + high * wa
+
+    def gain_dbd_at(self, azimuth_deg, elevation_deg=0.0, **tilts) -> np.ndarray:
+        return self.gain_dbd + self.gain(azimuth_deg, elevation_deg, **tilts)
+
+
+def compile_pattern(pattern_h=None, pattern_v=None, gain_dbd: float = 0.0, tilt_el_deg: float = 0.0) -> CompiledPattern:
+    """
+    Compiles horizontal and vertical patterns (mappings angle -> gain or
+    evenly spaced lists, any gain reference) into one normalised grid; the
+    patterns are combined separably, grid = h(az) + v(el).
+    """
+    grid = (_horizontal_db(pattern_h)[:, None] + _vertical_db(pattern_v)[None, :]).astype(np.float32)
+    return CompiledPattern(grid=grid, gain_dbd=float(gain_dbd or 0.0), tilt_el_deg=float(tilt_el_deg or 0.0))
+
+
+_cache: OrderedDict = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _cached(key, build) -> CompiledPattern:
+    with _cache_lock:
+        pattern = _cache.get(key)
+        if pattern is not None:
+            _cache.move_to_end(key)
+            return pattern
+    pattern = build()
+    with _cache_lock:
+        _cache[key] = pattern
+        while len(_cache) > PATTERN_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return pattern
+
+
+def compiled_v4_antenna(antenna) -> CompiledPattern:
+    """
+    Compiled V4Antenna, cached by id and updated_at.
+    """
+    return _cached(
+        ("v4", str(antenna.id), antenna.updated_at),
+        lambda: compile_pattern(antenna.pattern_h, antenna.pattern_v, antenna.gain_dbd, antenna.tilt_el),
+    )
+
+
+def compiled_anatel_pattern(station) -> CompiledPattern:
+    """
+    Compiled AnatelStation.pattern_dbd (horizontal only; erp_kw already
+    includes the gain), cached by id and import time.
+    """
+    return _cached(
+        ("anatel", station.id, station.created_at),
+        lambda: compile_pattern(station.pattern_dbd),
+    )
+
+
+def horizontal_attenuation_db(pattern, azimuths_deg) -> np.ndarray:
+    """
+    Horizontal pattern relative to its maximum (dB, <= 0) at azimuths_deg.
+    ERP is quoted in the direction of maximum gain, so ERP plus this is the
+    ERP on each azimuth. pattern is a CompiledPattern (evaluated on the
+    horizon, tilts included) or a raw pattern compiled on the fly; an empty
+    or missing pattern is omnidirectional.
+    """
+    azimuths_deg = np.asarray(azimuths_deg, dtype=np.float64)
+    if not isinstance(pattern, CompiledPattern):
+        if pattern is None or len(pattern) == 0:
+            return np.zeros(azimuths_deg.shape)
+        pattern = compile_pattern(pattern)
+    return pattern.gain(azimuths_deg, 0.0)
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+from typing import Iterable, Sequence
+
+from sqlalchemy import inspect, insert
+
+from app.extensions import db
+
+# Batches at least this large go through COPY instead of a multi-row INSERT.
+COPY_MIN_ROWS = 5000
+
+
+def _python_default(column):
+    """
+    Value of a Python-side scalar or callable column default (e.g. uuid4),
+    None when the column has no such default.
+    """
+    default = column.default
+    if default is None or default.is_sequence or default.is_clause_element:
+        return None
+    if default.is_callable:
+        return default.arg(None)
+    return default.arg
+
+
+def _copy_rows(model, rows: Sequence[dict]) -> None:
+    """
+    Writes rows (keyed by mapped attribute name) with COPY FROM STDIN on the
+    session's connection. Values go through the column types' bind
+    processors, so geometries are sent as EWKT and JSONB as psycopg Jsonb.
+    """
+    mapper = inspect(model)
+    table = model.__table__
+    present = set()
+    for row in rows:
+        present.update(row)
+
+    # COPY bypasses Python-side defaults; columns missing from every row
+    # keep their server defaults.
+    attrs = []
+    for attr in mapper.column_attrs:
+        column = attr.columns[0]
+        if column.table is not table:
+            continue
+        if attr.key in present:
+            attrs.append((attr.key, column, False))
+        elif _python_default(column) is not None:
+            attrs.append((attr.key, column, True))
+
+    connection = db.session.connection()
+    dialect = connection.dialect
+    processors = [column.type.dialect_impl(dialect).bind_processor(dialect) for _, column, _ in attrs]
+
+    preparer = dialect.identifier_preparer
+    column_list = ", ".join(preparer.quote(column.name) for _, column, _ in attrs)
+    statement = f"COPY {preparer.format_table(table)} ({column_list}) FROM STDIN"
+
+    cursor = connection.connection.driver_connection.cursor()
+    with cursor.copy(statement) as copy:
+        for row in rows:
+            values = []
+            for (key, column, use_default), process in zip(attrs, processors):
+                value = _python_default(column) if use_default else row.get(key)
+                if value is not None and process is not None:
+                    value = process(value)
+                values.append(value)
+            copy.write_row(values)
+
+
+def insert_rows(model, rows: Sequence[dict], copy_min_rows: int = COPY_MIN_ROWS) -> int:
+    """
+    Inserts dict rows (keyed by mapped attribute name) in the current
+    transaction: an ORM bulk INSERT (batched multi-row VALUES) for small
+    batches, COPY for batches of at least copy_min_rows.
+    Returns the number of rows written.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    if len(rows) >= copy_min_rows and db.session.connection().dialect.driver == "psycopg":
+        _copy_rows(model, rows)
+    else:
+        db.session.execute(insert(model), rows)
+    return len(rows)
+
+
+def insert_objects(objects: Iterable, copy_min_rows: int = COPY_MIN_ROWS) -> int:
+    """
+    insert_rows for transient ORM instances of a single model, replacing
+    one session.add() per row. Python-side defaults (ids) are assigned on
+    the instances first so callers can keep returning them; the instances
+    are not attached to the session.
+    """
+    objects = list(objects)
+    if not objects:
+        return 0
+    model = type(objects[0])
+    mapper = inspect(model)
+    autoincrement = model.__table__.autoincrement_column
+
+    rows = []
+    for obj in objects:
+        if type(obj) is not model:
+            raise ValueError("insert_objects expects instances of a single model")
+        row = {}
+        for attr in mapper.column_attrs:
+            column = attr.columns[0]
+            value = getattr(obj, attr.key)
+            if value is None:
+                value = _python_default(column)
+                if value is not None:
+                    setattr(obj, attr.key, value)
+                elif column.server_default is not None or column is autoincrement:
+                    continue
+            row[attr.key] = value
+        rows.append(row)
+
+    return insert_rows(model, rows, copy_min_rows=copy_min_rows)
@@ -0,0 +1,284 @@
+from __future__ import annotations
+
+import dataclasses
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from app.math.geodesy import inverse_points
+from app.math.p1546_native import distance_for_field
+from app.models import AnatelStation
+from app.services.antenna import compile_pattern
+from app.services.channels import (
+    FM,
+    KIND_NAMES,
+    NO_RELATION,
+    RELATIONS,
+    TV_ANALOG,
+    TV_DIGITAL,
+    ProtectionTable,
+    channel_frequency_mhz,
+    load_protection_table,
+    protected_field_dbuvm,
+    station_kind,
+)
+from app.services.haat import get_terrain_averages
+from app.services.screening import (
+    CONTOUR_STEP_DEG,
+    SCREEN_RADIUS_KM,
+    WANTED_TIME_PCT,
+    HeffModel,
+    ScreeningStation,
+    StationArrays,
+    caused_margins,
+    contour_points,
+    reaches_contour,
+    received_margins,
+    screening_filter,
+    station_from_anatel,
+)
+from app.utils.geo import destination_points
+
+# Channels searched per kind: the FM band (88.1-107.9 MHz) and the TV
+# channels of each technology; channel 37 is reserved for radio astronomy.
+SEARCH_CHANNELS = {
+    FM: range(201, 301),
+    TV_ANALOG: range(2, 70),
+    TV_DIGITAL: range(7, 52),
+}
+EXCLUDED_CHANNELS = frozenset({37})
+
+
+@dataclass(frozen=True)
+class ChannelAvailability:
+    channel: int
+    frequency_mhz: float
+    pairs: int
+    conflicts: int
+    worst_caused_db: float | None
+    worst_received_db: float | None
+    limiting_station_id: str | None = None
+    limiting_direction: str | None = None
+    limiting_relation: str | None = None
+
+    @property
+    def available(self) -> bool:
+        return self.conflicts == 0
+
+    @property
+    def worst_margin_db(self) -> float:
+        margins = [m for m in (self.worst_caused_db, self.worst_received_db) if m is not None]
+        return min(margins) if margins else float("inf")
+
+    def to_dict(self) -> dict:
+        worst = self.worst_margin_db
+        return {
+            "channel": self.channel,
+            "frequency_mhz": round(self.frequency_mhz, 3),
+            "available": self.available,
+            "pairs": self.pairs,
+            "conflicts": self.conflicts,
+            "worst_margin_db": round(worst, 2) if np.isfinite(worst) else None,
+            "worst_caused_db": None if self.worst_caused_db is None else round(self.worst_caused_db, 2),
+            "worst_received_db": None if self.worst_received_db is None else round(self.worst_received_db, 2),
+            "limiting_station_id": self.limiting_station_id,
+            "limiting_direction": self.limiting_direction,
+            "limiting_relation": self.limiting_relation,
+        }
+
+
+@dataclass(frozen=True)
+class ChannelSearchResult:
+    kind: int
+    candidates: int
+    channels: list[ChannelAvailability] = field(default_factory=list)
+
+    def to_dict(self) -> dict:
+        return {
+            "kind": KIND_NAMES[self.kind],
+            "candidates": self.candidates,
+            "available": sum(1 for channel in self.channels if channel.available),
+            "channels": [channel.to_dict() for channel in self.channels],
+        }
+
+
+def band_channels(kind: int) -> list[int]:
+    return [channel for channel in SEARCH_CHANNELS[kind] if channel not in EXCLUDED_CHANNELS]
+
+
+def _caused_margins(site_arrays, site_heff, candidates, pair_channel_index, pair_victim, pr_db, erp_offset_db):
+    # The site (one row per searched channel) against candidate contours;
+    # contour points are computed once per victim and shared by every
+    # channel.
+    victim_ids, victim_pos = np.unique(pair_victim, return_inverse=True)
+    lats, lons, wanted = contour_points(StationArrays.from_stations([candidates[k] for k in victim_ids]))
+    contours = (lats[victim_pos], lons[victim_pos], wanted[victim_pos])
+    return caused_margins(site_arrays, contours, pr_db, erp_offset_db, index=pair_channel_index, heff_model=site_heff)
+
+
+def _received_margins(site_contours, cand, pair_channel_index, pair_interferer, pr_db, erp_offset_db):
+    # Candidates against the site's contour on each searched channel, one
+    # D/U evaluation per channel.
+    lats, lons, wanted = site_contours
+    margins = np.empty((pair_interferer.size, lats.shape[1]), dtype=np.float64)
+    for c in np.unique(pair_channel_index).tolist():
+        rows = np.flatnonzero(pair_channel_index == c)
+        contour = (lats[c:c + 1], lons[c:c + 1], wanted[c:c + 1])
+        margins[rows] = received_margins(cand, pair_interferer[rows], contour, pr_db[rows], erp_offset_db[rows])
+    return margins
+
+
+def search_channels(
+    site: ScreeningStation,
+    candidates: list[ScreeningStation],
+    channels=None,
+    site_heff: HeffModel | None = None,
+    table: ProtectionTable | None = None,
+) -> ChannelSearchResult:
+    """
+    Availability of every channel for a site (site.channel is ignored)
+    against candidate stations, interference caused and received. One
+    (channels x candidates) table lookup and one reach test cover the
+    whole band; D/U is computed only for related pairs in reach, through
+    screening's du_matrix/p1546_model evaluator with the site's HAAT per
+    azimuth (site_heff) and victim contours shared across channels.
+    Channels are ranked available first, then by worst margin.
+    """
+    table = table or load_protection_table()
+    channels = np.array(sorted(channels or band_channels(site.kind)), dtype=np.int64)
+    if site_heff is None:
+        def site_heff(azimuth_deg):
+            return np.full(np.shape(azimuth_deg), site.heff_m)
+
+    n_ch = channels.size
+    freq = np.asarray(channel_frequency_mhz(site.kind, channels), dtype=np.float64)
+    # The site on every searched channel, one row each.
+    site_arrays = StationArrays.from_stations([dataclasses.replace(site, channel=int(ch)) for ch in channels])
+
+    # Site contour on every channel: one batched inversion.
+    azimuths = np.arange(0.0, 360.0, float(CONTOUR_STEP_DEG))
+    site_wanted = protected_field_dbuvm(site.kind, channels)
+    radius = distance_for_field(
+        site_wanted[:, None],
+        freq[:, None],
+        WANTED_TIME_PCT,
+        site_heff(azimuths)[None, :],
+        erp_kw=site.erp_kw * 10 ** (site_arrays.gain_db(0, azimuths)[None, :] / 10.0),
+        max_distance_km=SCREEN_RADIUS_KM,
+    )
+    pairs_by_channel: list[list[tuple[str, int, float, int]]] = [[] for _ in range(n_ch)]
+
+    n = len(candidates)
+    if n:
+        cand = StationArrays.from_stations(candidates)
+        sep_m, az_to_cand = inverse_points(np.full(n, site.lat), np.full(n, site.lon), cand.lat, cand.lon)
+        sep_km = sep_m / 1000.0
+        cand_wanted = protected_field_dbuvm(cand.kind, cand.channel)
+        cand_radius = distance_for_field(
+            cand_wanted, cand.frequency_mhz, WANTED_TIME_PCT, cand.heff_m,
+            erp_kw=cand.erp_kw, max_distance_km=SCREEN_RADIUS_KM,
+        )
+
+        # Caused: site on channel c interferes with candidate n.
+        relation, pr_db, offset = table.lookup(site.kind, channels[:, None], cand.kind[None, :], cand.channel[None, :])
+        ci, ni = np.nonzero(relation != NO_RELATION)
+        if ci.size:
+            keep = reaches_contour(
+                sep_km[ni] - cand_radius[ni],
+                cand_wanted[ni] - pr_db[ci, ni],
+                freq[ci],
+                site_heff(az_to_cand[ni]),
+                site.erp_kw * 10 ** ((site_arrays.gain_db(0, az_to_cand[ni]) + offset[ci, ni]) / 10.0),
+            )
+            ci, ni = ci[keep], ni[keep]
+        if ci.size:
+            margins = _caused_margins(
+                site_arrays, site_heff, candidates, ci, ni,
+                pr_db[ci, ni].astype(np.float64), offset[ci, ni].astype(np.float64),
+            )
+            worst = margins.min(axis=1)
+            for c, k, m in zip(ci.tolist(), ni.tolist(), worst.tolist()):
+                pairs_by_channel[c].append(("caused", k, m, int(relation[c, k])))
+
+        # Received: candidate n interferes with the site on channel c.
+        relation, pr_db, offset = table.lookup(cand.kind[None, :], cand.channel[None, :], site.kind, channels[:, None])
+        ci, ni = np.nonzero(relation != NO_RELATION)
+        if ci.size:
+            keep = reaches_contour(
+                sep_km[ni] - radius[ci].max(axis=1),
+                site_wanted[ci] - pr_db[ci, ni],
+                cand.frequency_mhz[ni],
+                cand.heff_m[ni],
+                cand.erp_kw[ni] * 10 ** (offset[ci, ni] / 10.0),
+            )
+            ci, ni = ci[keep], ni[keep]
+        if ci.size:
+            lats, lons = destination_points(site.lat, site.lon, azimuths[None, :], np.maximum(radius, 0.1))
+            contours = (lats, lons, np.broadcast_to(site_wanted[:, None], lats.shape))
+            margins = _received_margins(
+                contours, cand, ci, ni, pr_db[ci, ni].astype(np.float64), offset[ci, ni].astype(np.float64)
+            )
+            worst = margins.min(axis=1)
+            for c, k, m in zip(ci.tolist(), ni.tolist(), worst.tolist()):
+                pairs_by_channel[c].append(("received", k, m, int(relation[c, k])))
+
+    results = []
+    for c, channel in enumerate(channels.tolist()):
+        pairs = pairs_by_channel[c]
+        caused = [m for direction, _, m, _ in pairs if direction == "caused"]
+        received = [m for direction, _, m, _ in pairs if direction == "received"]
+        limiting = min(pairs, key=lambda pair: pair[2]) if pairs else None
+        results.append(ChannelAvailability(
+            channel=channel,
+            frequency_mhz=float(freq[c]),
+            pairs=len(pairs),
+            conflicts=sum(1 for pair in pairs if pair[2] < 0.0),
+            worst_caused_db=min(caused) if caused else None,
+            worst_received_db=min(received) if received else None,
+            limiting_station_id=candidates[limiting[1]].station_id if limiting else None,
+            limiting_direction=limiting[0] if limiting else None,
+            limiting_relation=RELATIONS[limiting[3]] if limiting else None,
+        ))
+    results.sort(key=lambda r: (not r.available, -r.worst_margin_db, r.channel))
+    return ChannelSearchResult(kind=site.kind, candidates=n, channels=results)
+
+
+def search_site(
+    lat: float,
+    lon: float,
+    service: str,
+    erp_kw: float,
+    h_agl_m: float,
+    channels=None,
+    pattern_h=None,
+    radius_km: float = SCREEN_RADIUS_KM,
+) -> ChannelSearchResult:
+    """
+    Channel search at a site against anatel_stations, with the site's
+    HAAT per azimuth from its cached 3-15 km terrain averages.
+    """
+    if erp_kw is None or erp_kw <= 0:
+        raise ValueError("erp_kw must be positive")
+    kind = station_kind(service, None)
+    channels = sorted(channels or band_channels(kind))
+    averages = get_terrain_averages(lat, lon, step_deg=1.0)
+
+    def site_heff(azimuth_deg):
+        return averages.heff_at(azimuth_deg, h_agl_m)
+
+    site = ScreeningStation(
+        station_id=None,
+        lat=lat,
+        lon=lon,
+        kind=kind,
+        channel=channels[0],
+        erp_kw=erp_kw,
+        heff_m=float(np.mean(averages.heff(h_agl_m))),
+        pattern=compile_pattern(pattern_h) if pattern_h else None,
+        service=service,
+    )
+    table = load_protection_table()
+    condition = screening_filter(AnatelStation.geom, AnatelStation.frequencia_mhz, site, table, radius_km, channels)
+    rows = AnatelStation.query.filter(condition).all() if condition is not None else []
+    candidates = [s for s in (station_from_anatel(row) for row in rows) if s is not None]
+    return search_channels(site, candidates, channels, site_heff=site_heff, table=table)
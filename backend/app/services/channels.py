@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
+
+DU_THRESHOLDS_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "data", "du_thresholds.json")
+
+# Station kinds. TV analog and digital share the TV channel axis (2-69);
+# FM, RTR, Radiovias and RadCom use the FM channel axis (141-300).
+FM, TV_ANALOG, TV_DIGITAL = 0, 1, 2
+KIND_NAMES = ("FM", "TV_Analog", "TV_Digital")
+TECHNOLOGY = {TV_ANALOG: "Analog", TV_DIGITAL: "Digital"}
+DIGITAL_SERVICES = {"GTVD", "RTVD", "TVD"}
+
+FM_CHANNELS = (141, 300)
+TV_CHANNELS = (2, 69)
+MAX_CHANNEL = FM_CHANNELS[1]
+
+# Interferer channel relative to the victim's, per relationship (victim
+# perspective: "adj_upper" is an interferer one channel above).
+RELATION_OFFSETS = {
+    "co": (0,),
+    "adj_lower": (-1,),
+    "adj_upper": (1,),
+    "adj2_lower": (-2,),
+    "adj2_upper": (2,),
+    "lo_taboo": (-7, 7),
+    "if_taboo": (-8, 8),
+    "audio_image": (14,),
+    "video_image": (15,),
+    # FM receivers' 10.7 MHz IF: interferers 10.6-10.8 MHz (53-54 channels) away.
+    "fm_if_taboo": (-54, -53, 53, 54),
+}
+RELATIONS = tuple(RELATION_OFFSETS)
+NO_RELATION = -1
+
+# Half channel width (MHz), to turn related channels into frequency ranges.
+HALF_BANDWIDTH_MHZ = {FM: 0.1, TV_ANALOG: 3.0, TV_DIGITAL: 3.0}
+
+_CHANNEL_RE = re.compile(r"\d+")
+
+
+def parse_channel(canal) -> int | None:
+    """
+    Channel number of an Anatel "Canal" value ("201", "14+", "7D"...).
+    """
+    if canal is None:
+        return None
+    match = _CHANNEL_RE.search(str(canal))
+    return int(match.group()) if match else None
+
+
+def fm_frequency_mhz(channel):
+    return 87.9 + 0.2 * (np.asarray(channel, dtype=np.float64) - 200.0)
+
+
+def tv_frequency_mhz(channel):
+    """
+    Centre frequency of 6 MHz TV channels (VHF 2-4, 5-6, 7-13; UHF 14-69).
+    """
+    ch = np.asarray(channel, dtype=np.float64)
+    return np.select(
+        [ch <= 4, ch <= 6, ch <= 13],
+        [57.0 + 6.0 * (ch - 2), 79.0 + 6.0 * (ch - 5), 177.0 + 6.0 * (ch - 7)],
+        473.0 + 6.0 * (ch - 14),
+    )
+
+
+def channel_frequency_mhz(kind, channel):
+    kind = np.asarray(kind)
+    return np.where(kind == FM, fm_frequency_mhz(channel), tv_frequency_mhz(channel))
+
+
+def channel_from_frequency(kind: int, frequency_mhz: float) -> int:
+    if kind == FM:
+        return int(round((frequency_mhz - 87.9) / 0.2)) + 200
+    if frequency_mhz >= 470.0:
+        return int(round((frequency_mhz - 473.0) / 6.0)) + 14
+    if frequency_mhz >= 174.0:
+        return int(round((frequency_mhz - 177.0) / 6.0)) + 7
+    if frequency_mhz >= 76.0:
+        return int(round((frequency_mhz - 79.0) / 6.0)) + 5
+    return int(round((frequency_mhz - 57.0) / 6.0)) + 2
+
+
+def station_kind(service: str | None, channel: int | None) -> int:
+    """
+    Kind of a station from its service code and channel: channels on the
+    FM axis are FM; TV services ending in D (GTVD, RTVD) are digital.
+    """
+    if channel is not None and channel >= FM_CHANNELS[0]:
+        return FM
+    service = (service or "").strip().upper()
+    if service in DIGITAL_SERVICES or (service.startswith(("TV", "GTV", "RTV")) and service.endswith("D")):
+        return TV_DIGITAL
+    if channel is None and service in ("FM", "RTR", "RADCOM", "RADIOVIAS"):
+        return FM
+    return TV_ANALOG
+
+
+def protected_field_dbuvm(kind, channel) -> np.ndarray:
+    """
+    Field at the protected contour: 66 dBuV/m for FM; TV analog 58/64/70
+    and digital 43/51 dBuV/m on channels 2-6/7-13/14+ (digital VHF low uses
+    the VHF value).
+    """
+    kind = np.asarray(kind)
+    ch = np.asarray(channel, dtype=np.float64)
+    analog = np.select([ch <= 6, ch <= 13], [58.0, 64.0], 70.0)
+    digital = np.where(ch <= 13, 43.0, 51.0)
+    return np.where(kind == FM, 66.0, np.where(kind == TV_DIGITAL, digital, analog))
+
+
+@dataclass(frozen=True)
+class ProtectionTable:
+    """
+    Dense lookup of the protection ratios of data/du_thresholds.json,
+    indexed [interferer kind, interferer channel, victim kind, victim
+    channel]: relation index (NO_RELATION where the pair does not
+    interact), required D/U (dB) and the interferer ERP correction (dB,
+    TV channels 5/6 enter FM adjacency at 12 % ERP).
+    """
+
+    relation: np.ndarray
+    pr_db: np.ndarray
+    erp_offset_db: np.ndarray
+
+    def lookup(self, interferer_kind, interferer_channel, victim_kind, victim_channel):
+        ik, ich, vk, vch = np.broadcast_arrays(
+            np.asarray(interferer_kind, dtype=np.int64),
+            np.asarray(interferer_channel, dtype=np.int64),
+            np.asarray(victim_kind, dtype=np.int64),
+            np.asarray(victim_channel, dtype=np.int64),
+        )
+        valid = (ich >= 0) & (ich <= MAX_CHANNEL) & (vch >= 0) & (vch <= MAX_CHANNEL)
+        ich = np.where(valid, ich, 0)
+        vch = np.where(valid, vch, 0)
+        relation = np.where(valid, self.relation[ik, ich, vk, vch], NO_RELATION)
+        pr_db = np.where(valid, self.pr_db[ik, ich, vk, vch], np.nan)
+        return relation, pr_db, np.where(valid, self.erp_offset_db[ik, ich, vk, vch], 0.0)
+
+    def related(self, kind: int, channel: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        (kinds, channels) interacting with a station in either direction;
+        empty for a channel outside the table.
+        """
+        if not 0 <= channel <= MAX_CHANNEL:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty
+        as_interferer = self.relation[kind, channel] != NO_RELATION
+        as_victim = self.relation[:, :, kind, channel] != NO_RELATION
+        kinds, channels = np.nonzero(as_interferer | as_victim)
+        return kinds, channels
+
+
+def _set(table, ik, ich, vk, vch, relation, pr_db, erp_offset_db=0.0):
+    if 0 <= ich <= MAX_CHANNEL and 0 <= vch <= MAX_CHANNEL:
+        table[0][ik, ich, vk, vch] = RELATIONS.index(relation)
+        table[1][ik, ich, vk, vch] = pr_db
+        table[2][ik, ich, vk, vch] = erp_offset_db
+
+
+@lru_cache(maxsize=4)
+def load_protection_table(path: str | None = None) -> ProtectionTable:
+    with open(path or DU_THRESHOLDS_PATH, "r", encoding="utf-8") as handle:
+        data = json.load(handle)
+
+    shape = (len(KIND_NAMES), MAX_CHANNEL + 1, len(KIND_NAMES), MAX_CHANNEL + 1)
+    table = (
+        np.full(shape, NO_RELATION, dtype=np.int8),
+        np.full(shape, np.nan, dtype=np.float32),
+        np.zeros(shape, dtype=np.float32),
+    )
+
+    # Same-service ratios, keyed "<interferer>/<victim>" ("X sobre Y").
+    same_service = [(FM, FM, FM_CHANNELS, data.get("FM", {}).get("FM/FM", {}))]
+    for ik in (TV_ANALOG, TV_DIGITAL):
+        for vk in (TV_ANALOG, TV_DIGITAL):
+            ratios = data.get("TV_Digital", {}).get(f"{TECHNOLOGY[ik]}/{TECHNOLOGY[vk]}", {})
+            same_service.append((ik, vk, TV_CHANNELS, ratios))
+    for ik, vk, (lo, hi), ratios in same_service:
+        for relation, pr_db in ratios.items():
+            for offset in RELATION_OFFSETS.get(relation, ()):
+                for vch in range(lo, hi + 1):
+                    if lo <= vch + offset <= hi:
+                        _set(table, ik, vch + offset, vk, vch, relation, pr_db)
+
+    # FM <-> TV channels 5/6 rules.
+    for rule in data.get("FM_TV", []):
+        ik = KIND_NAMES.index(rule["interferer"])
+        vk = KIND_NAMES.index(rule["victim"])
+        erp_offset_db = 10.0 * np.log10(rule.get("erp_factor", 1.0))
+        if "interferer_channels" in rule:
+            lo, hi = rule["interferer_channels"]
+            for ich in range(lo, hi + 1):
+                _set(table, ik, ich, vk, rule["victim_channel"], rule["relation"], rule["pr_db"], erp_offset_db)
+        else:
+            lo, hi = rule["victim_channels"]
+            for vch in range(lo, hi + 1):
+                _set(table, ik, rule["interferer_channel"], vk, vch, rule["relation"], rule["pr_db"], erp_offset_db)
+
+    return ProtectionTable(*table)
+
+
+def frequency_ranges(kinds, channels) -> list[tuple[float, float]]:
+    """
+    Merged [low, high] frequency ranges (MHz) covering the given channels.
+    """
+    if len(channels) == 0:
+        return []
+    centres = channel_frequency_mhz(kinds, channels)
+    half = np.array([HALF_BANDWIDTH_MHZ[int(k)] for k in np.asarray(kinds).ravel()])
+    spans = sorted(zip((centres - half).tolist(), (centres + half).tolist()))
+    merged = [list(spans[0])]
+    for lo, hi in spans[1:]:
+        if lo <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], hi)
+        else:
+            merged.append([lo, hi])
+    return [(lo, hi) for lo, hi in merged]
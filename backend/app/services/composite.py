@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from dataclasses import dataclass
+
+import numpy as np
+
+from app.extensions import db
+from app.models import FieldTile
+from app.services.coverage import (
+    AOI,
+    CoverageGrid,
+    CoverageParams,
+    RadialField,
+    aoi_from_params,
+    aoi_max_distance_m,
+    block_metadata,
+    compute_block,
+    coverage_layer,
+    load_block,
+    load_block_metadata,
+    store_block,
+)
+from app.services.pathloss import cached_radial_field
+
+# Composite layers of a network, stored under revision_id = network id.
+COMPOSITE_LAYERS = ("max", "best", "count")
+
+# Best-server value of pixels no station reaches.
+NO_SERVER = -1
+
+
+@dataclass(frozen=True)
+class StationCoverage:
+    """
+    One station's contribution to a composite: its coverage parameters and
+    the AOI its own (cached, per-station) blocks are computed over.
+    """
+
+    station_id: str
+    params: CoverageParams
+    aoi_params: dict
+
+    @property
+    def aoi(self) -> AOI:
+        return aoi_from_params(self.aoi_params)
+
+    @property
+    def layer(self) -> str:
+        return coverage_layer(self.params, self.aoi)
+
+    def radial_field(self, grid: CoverageGrid) -> RadialField | None:
+        """
+        The station's radial fan in "radial" mode (through the path-loss
+        cache), None in the other modes.
+        """
+        if self.params.mode != "radial":
+            return None
+        return cached_radial_field(self.params, grid, aoi_max_distance_m(self.params, self.aoi))
+
+    def to_dict(self) -> dict:
+        return {"station_id": self.station_id, "params": self.params.to_dict(), "aoi": self.aoi_params}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "StationCoverage":
+        return cls(data["station_id"], CoverageParams.from_dict(data["params"]), data["aoi"])
+
+
+def composite_layer(kind: str, digest: str) -> str:
+    return f"composite:{kind}:{digest}"
+
+
+def composite_digest(model: str, resolution_m: float, threshold_dbuvm: float, options: dict) -> str:
+    """
+    Hash of the network-wide settings. Station membership is deliberately
+    left out so adding a station keeps the layer names and only rewrites
+    the blocks it overlaps (see sources_digest).
+    """
+    payload = {"model": model, "resolution_m": resolution_m, "threshold_dbuvm": threshold_dbuvm, "options": options}
+    return hashlib.sha1(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def sources_digest(sources: list[StationCoverage]) -> str:
+    """
+    Fingerprint of the station layers feeding one composite block.
+    """
+    payload = sorted((s.station_id, s.layer) for s in sources)
+    return hashlib.sha1(json.dumps(payload).encode()).hexdigest()[:16]
+
+
+def overlapping_sources(sources: list[StationCoverage], grid: CoverageGrid, x: int, y: int) -> list[StationCoverage]:
+    out = []
+    for source in sources:
+        x0, x1, y0, y1 = grid.block_range(*source.aoi.bbox)
+        if x0 <= x <= x1 and y0 <= y <= y1:
+            out.append(source)
+    return out
+
+
+def station_block(source: StationCoverage, grid: CoverageGrid, x: int, y: int) -> np.ndarray | None:
+    """
+    A station's block from grid.field_tiles, computed and stored on a miss.
+    None when the block lies outside the station's AOI.
+    """
+    values = load_block(source.station_id, source.layer, grid.z, x, y)
+    if values is not None:
+        return values
+    values = compute_block(source.params, grid, source.aoi, x, y, radial=source.radial_field(grid))
+    if values is not None:
+        store_block(
+            source.station_id, source.layer, grid, x, y, values, block_metadata(grid, x, y, source.params)
+        )
+    return values
+
+
+def delete_composite_blocks(network_id, digest: str, z: int, blocks) -> int:
+    """
+    Drops every composite layer of the given blocks. Returns the number of
+    tiles deleted.
+    """
+    layers = [composite_layer(kind, digest) for kind in COMPOSITE_LAYERS]
+    deleted = 0
+    for x, y in blocks:
+        deleted += FieldTile.query.filter(
+            FieldTile.revision_id == network_id,
+            FieldTile.layer.in_(layers),
+            FieldTile.z == z,
+            FieldTile.x == x,
+            FieldTile.y == y,
+        ).delete(synchronize_session=False)
+    return deleted
+
+
+def stale_composite_blocks(network_id, digest: str, z: int, blocks) -> list[tuple[int, int]]:
+    """
+    Stored composite blocks outside `blocks` (no current station reaches
+    them any more, e.g. after a station was removed or moved).
+    """
+    current = set(blocks)
+    stored = db.session.execute(
+        db.select(FieldTile.x, FieldTile.y).filter(
+            FieldTile.revision_id == network_id,
+            FieldTile.layer.in_([composite_layer(kind, digest) for kind in COMPOSITE_LAYERS]),
+            FieldTile.z == z,
+        ).distinct()
+    ).all()
+    return sorted((x, y) for x, y in stored if (x, y) not in current)
+
+
+def composite_block(
+    sources: list[StationCoverage],
+    grid: CoverageGrid,
+    x: int,
+    y: int,
+    threshold_dbuvm: float,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray, list[str]] | None:
+    """
+    Max field, best server (index into the returned station ids, NO_SERVER
+    where no station has a value) and number of stations at or above
+    threshold_dbuvm, folded in one station block at a time.
+    """
+    size = grid.block_size
+    max_field = np.full((size, size), -np.inf, dtype=np.float32)
+    best = np.full((size, size), NO_SERVER, dtype=np.int16)
+    count = np.zeros((size, size), dtype=np.uint16)
+    station_ids: list[str] = []
+
+    for source in sources:
+        values = station_block(source, grid, x, y)
+        if values is None:
+            continue
+        index = len(station_ids)
+        station_ids.append(source.station_id)
+        # NaN (outside the station AOI) never compares true.
+        better = values > max_field
+        max_field[better] = values[better]
+        best[better] = index
+        count += values >= threshold_dbuvm
+
+    if not station_ids:
+        return None
+    max_field[best == NO_SERVER] = np.nan
+    return max_field, best, count, station_ids
+
+
+def compute_and_store_composite_block(
+    network_id,
+    sources: list[StationCoverage],
+    grid: CoverageGrid,
+    digest: str,
+    x: int,
+    y: int,
+    threshold_dbuvm: float,
+) -> str:
+    """
+    Recomputes one composite block unless its stored copy was built from
+    the same station layers. Returns "unchanged", "stored" or "empty"; an
+    empty block loses any composite tiles stored for it earlier.
+    """
+    sources = overlapping_sources(sources, grid, x, y)
+    fingerprint = sources_digest(sources)
+    stored = load_block_metadata(network_id, composite_layer("max", digest), grid.z, x, y)
+    if stored and stored.get("sources") == fingerprint:
+        return "unchanged"
+
+    merged = composite_block(sources, grid, x, y, threshold_dbuvm)
+    if merged is None:
+        if stored is not None:
+            delete_composite_blocks(network_id, digest, grid.z, [(x, y)])
+        return "empty"
+    north, west = grid.block_origin(x, y)
+    metadata = {
+        "byte_order": "little",
+        "block_size": grid.block_size,
+        "resolution_m": grid.resolution_m,
+        "pixel_deg": grid.pixel_deg,
+        "north": north,
+        "west": west,
+        "threshold_dbuvm": threshold_dbuvm,
+        "stations": merged[3],
+        "sources": fingerprint,
+    }
+    layers = (
+        ("max", merged[0], {"dtype": "float32", "nodata": "nan", "unit": "dBuV/m"}),
+        ("best", merged[1], {"dtype": "int16", "nodata": NO_SERVER, "unit": "station index"}),
+        ("count", merged[2], {"dtype": "uint16", "unit": "stations"}),
+    )
+    for kind, values, extra in layers:
+        store_block(network_id, composite_layer(kind, digest), grid, x, y, values, dict(metadata, **extra))
+    return "stored"
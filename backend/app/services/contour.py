@@ -3,11 +3,24 @@ from __future__ import annotations
 import math
 from dataclasses import dataclass
 
+import numpy as np
 from geoalchemy2.elements import WKTElement
 
 from app.extensions import db
+from app.math.p1546_native import distance_for_field
 from app.models import Antenna, Contour, ContourPoint, Feedline, ProjectRevision, Station, Transmitter
-from app.utils.geo import GeoPoint, build_polygon_wkt, destination_point, generate_radials
+from app.services.antenna import horizontal_attenuation_db
+from app.services.bulk import insert_objects
+from app.services.haat import get_terrain_averages
+from app.utils.geo import build_polygon_wkt_arrays, destination_points, generate_radials
+
+
+# "hybrid" is the free-space estimate, "p1546" the terrain-aware engine.
+CONTOUR_METHODS = ("hybrid", "p1546")
+
+# Search range and tolerance of the P.1546 inverse.
+P1546_MAX_DISTANCE_KM = 1000.0
+P1546_CONTOUR_TOL_KM = 0.01
 
 
 @dataclass(frozen=True)
@@ -59,16 +72,141 @@ def field_strength_dbuvm(erp_dbw_value: float, distance_km: float) -> float:
     return 106.92 + 10 * math.log10(erp_kw) - 20 * math.log10(distance_km)
 
 
-def compute_contour(
-    revision: ProjectRevision,
+def distance_for_field_km(
+    erp_dbw_value: float,
     threshold_dbuvm: float,
+    step_km: float = 0.1,
+    max_distance_km: float = 200.0,
+) -> float:
+    """
+    Inverse of field_strength_dbuvm: farthest multiple of step_km (up to
+    max_distance_km) at which the field still reaches threshold_dbuvm.
+    """
+    if step_km <= 0:
+        raise ValueError("step_km must be positive")
+    erp_kw = _db_to_linear(erp_dbw_value) / 1000.0
+    if erp_kw <= 0:
+        return 0.0
+    exact_km = 10 ** ((106.92 + 10 * math.log10(erp_kw) - threshold_dbuvm) / 20.0)
+    n_steps = min(math.floor(exact_km / step_km + 1e-9), math.floor(max_distance_km / step_km + 1e-9))
+    if n_steps < 1:
+        return 0.0
+    # Guard the rounding at the boundary against the forward model.
+    if field_strength_dbuvm(erp_dbw_value, n_steps * step_km) < threshold_dbuvm:
+        n_steps -= 1
+    return n_steps * step_km
+
+
+@dataclass(frozen=True)
+class RadialContour:
+    """
+    P.1546 contour distances on every radial: distances_km[i, a] for
+    thresholds_dbuvm[i] at azimuths_deg[a].
+    """
+
+    azimuths_deg: np.ndarray
+    thresholds_dbuvm: np.ndarray
+    distances_km: np.ndarray
+    heff_m: np.ndarray
+    erp_dbw: np.ndarray
+
+    def rings(self, lat: float, lon: float) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Contour vertices (lats, lons), each (n_thresholds, n_azimuths).
+        """
+        return destination_points(lat, lon, self.azimuths_deg[None, :], self.distances_km)
+
+    def to_geojson(self, lat: float, lon: float, properties: dict | None = None) -> dict:
+        lats, lons = self.rings(lat, lon)
+        features = []
+        for i, threshold in enumerate(self.thresholds_dbuvm.tolist()):
+            ring = [[float(x), float(y)] for x, y in zip(lons[i], lats[i])]
+            ring.append(ring[0])
+            features.append({
+                "type": "Feature",
+                "geometry": {"type": "Polygon", "coordinates": [ring]},
+                "properties": dict(
+                    properties or {},
+                    threshold_dbuvm=threshold,
+                    distances_km=[round(float(d), 3) for d in self.distances_km[i]],
+                ),
+            })
+        return {"type": "FeatureCollection", "features": features}
+
+
+def p1546_contour_radials(
+    lat: float,
+    lon: float,
+    freq_mhz: float,
+    erp_dbw_value: float,
+    h_agl: float,
+    thresholds_dbuvm,
+    pattern=None,
+    step_deg: int = 1,
+    time_pct: float = 50.0,
+    location_pct: float = 50.0,
+    rx_h_m: float = 10.0,
+    env_type: str = "Rural",
+    ground_alt_m: float | None = None,
+    max_distance_km: float = P1546_MAX_DISTANCE_KM,
+    tol_km: float = P1546_CONTOUR_TOL_KM,
+) -> RadialContour:
+    """
+    Terrain-aware P.1546 contour: per-radial effective height from the
+    cached 3-15 km terrain averages and per-radial ERP from the horizontal
+    pattern (see horizontal_attenuation_db), all radials and thresholds
+    inverted in one batched distance_for_field call.
+    """
+    azimuths = np.asarray(generate_radials(step_deg), dtype=np.float64)
+    thresholds = np.asarray(thresholds_dbuvm, dtype=np.float64).ravel()
+    heff = get_terrain_averages(lat, lon, step_deg=1.0).heff_at(azimuths, h_agl, ground_alt_m)
+    erp_az = erp_dbw_value + horizontal_attenuation_db(pattern, azimuths)
+    distances = distance_for_field(
+        thresholds[:, None],
+        freq_mhz,
+        time_pct,
+        heff[None, :],
+        erp_kw=10 ** (erp_az[None, :] / 10.0) / 1000.0,
+        rx_h_m=rx_h_m,
+        env_type=env_type,
+        location_pct=location_pct,
+        ha_m=h_agl,
+        max_distance_km=max_distance_km,
+        tol_km=tol_km,
+    )
+    return RadialContour(azimuths, thresholds, distances, heff, erp_az)
+
+
+def compute_contours(
+    revision: ProjectRevision,
+    thresholds_dbuvm,
     step_deg: int = 5,
     step_km: float = 0.1,
     max_distance_km: float = 200.0,
-) -> ContourResult:
+    kinds=None,
+    method: str = "hybrid",
+    pattern=None,
+    time_pct: float = 50.0,
+    location_pct: float = 50.0,
+) -> list[ContourResult]:
+    """
+    One Contour per threshold (kinds[i], default "protected"), persisted in
+    one transaction.
+    method="hybrid" is the free-space estimate; method="p1546" runs
+    p1546_contour_radials with the station height and frequency, and the
+    horizontal pattern (list, azimuth -> gain mapping or CompiledPattern) when given.
+    """
+    if method not in CONTOUR_METHODS:
+        raise ValueError(f"Unsupported contour method: {method}")
     station: Station | None = revision.station[0] if revision.station else None
     if not station:
         raise ValueError("Station data is required to compute contour")
+    thresholds = [float(t) for t in thresholds_dbuvm]
+    if not thresholds:
+        raise ValueError("At least one threshold is required")
+    kinds = list(kinds) if kinds else ["protected"] * len(thresholds)
+    if len(kinds) != len(thresholds):
+        raise ValueError("kinds must match thresholds_dbuvm")
 
     transmitter = revision.transmitter[0] if revision.transmitter else None
     feedline = revision.feedline[0] if revision.feedline else None
@@ -76,59 +214,84 @@ def compute_contour(
 
     erp = erp_dbw(transmitter, antenna, feedline)
     radials = generate_radials(step_deg)
+    if step_km <= 0:
+        raise ValueError("step_km must be positive")
 
-    contour_points: list[ContourPoint] = []
-    poly_points: list[GeoPoint] = []
-
-    for idx, azimuth in enumerate(radials):
-        farthest_distance_km = 0.0
-        farthest_point = destination_point(station.tx_lat, station.tx_lon, azimuth, 0.0)
-
-        distance_km = step_km
-        while distance_km <= max_distance_km:
-            e_dbuvm = field_strength_dbuvm(erp, distance_km)
-            if e_dbuvm >= threshold_dbuvm:
-                farthest_distance_km = distance_km
-                farthest_point = destination_point(station.tx_lat, station.tx_lon, azimuth, distance_km)
-            distance_km += step_km
+    if method == "p1546":
+        if not station.frequency_mhz:
+            raise ValueError("Station frequency is required for a P.1546 contour")
+        radial = p1546_contour_radials(
+            station.tx_lat,
+            station.tx_lon,
+            station.frequency_mhz,
+            erp,
+            station.tower_height_agl_m or 0.0,
+            thresholds,
+            pattern=pattern,
+            step_deg=step_deg,
+            time_pct=time_pct,
+            location_pct=location_pct,
+            ground_alt_m=station.ground_alt_m,
+            max_distance_km=max_distance_km,
+        )
+        # Quantized down to step_km like the free-space contour.
+        distances = np.floor(radial.distances_km / step_km + 1e-9) * step_km
+    else:
+        # Free space does not depend on azimuth: one closed-form inverse
+        # per threshold serves every radial.
+        distances = np.array([
+            [distance_for_field_km(erp, threshold, step_km, max_distance_km)] * len(radials)
+            for threshold in thresholds
+        ])
+    srid = int(revision.inputs_snapshot.get("srid", 4674)) if revision.inputs_snapshot else 4674
 
-        contour_points.append(
+    results = []
+    for threshold, kind, radial_km in zip(thresholds, kinds, distances):
+        lats, lons = destination_points(station.tx_lat, station.tx_lon, radials, radial_km)
+        contour_points = [
             ContourPoint(
                 azimuth_deg=azimuth,
-                distance_km=round(farthest_distance_km, 4),
-                lat=farthest_point.lat,
-                lon=farthest_point.lon,
+                distance_km=round(float(radial_km[idx]), 4),
+                lat=float(lats[idx]),
+                lon=float(lons[idx]),
                 order_idx=idx,
             )
+            for idx, azimuth in enumerate(radials)
+        ]
+        contour = Contour(
+            revision_id=revision.id,
+            contour_kind=kind,
+            threshold_dbuvm=threshold,
+            method=method,
+            geom=WKTElement(build_polygon_wkt_arrays(lats, lons), srid=srid),
+            metadata_json={
+                "method": method,
+                "step_deg": step_deg,
+                "step_km": step_km,
+                "max_distance_km": max_distance_km,
+                "erp_dbw": erp,
+                "threshold_dbuvm": threshold,
+            },
         )
-        poly_points.append(farthest_point)
-
-    polygon_wkt = build_polygon_wkt(poly_points)
-    contour = Contour(
-        revision_id=revision.id,
-        contour_kind="protected",
-        threshold_dbuvm=threshold_dbuvm,
-        method="hybrid",
-        geom=WKTElement(
-            polygon_wkt,
-            srid=int(revision.inputs_snapshot.get("srid", 4674)) if revision.inputs_snapshot else 4674,
-        ),
-        metadata_json={
-            "step_deg": step_deg,
-            "step_km": step_km,
-            "max_distance_km": max_distance_km,
-            "erp_dbw": erp,
-            "threshold_dbuvm": threshold_dbuvm,
-        },
-    )
+        db.session.add(contour)
+        results.append(ContourResult(contour=contour, points=contour_points))
 
-    db.session.add(contour)
     db.session.flush()
-
-    for point in contour_points:
-        point.contour_id = contour.id
-        db.session.add(point)
+    for result in results:
+        for point in result.points:
+            point.contour_id = result.contour.id
+    insert_objects([point for result in results for point in result.points])
 
     db.session.commit()
 
-    return ContourResult(contour=contour, points=contour_points)
+    return results
+
+
+def compute_contour(
+    revision: ProjectRevision,
+    threshold_dbuvm: float,
+    step_deg: int = 5,
+    step_km: float = 0.1,
+    max_distance_km: float = 200.0,
+) -> ContourResult:
+    return compute_contours(revision, [threshold_dbuvm], step_deg, step_km, max_distance_km)[0]
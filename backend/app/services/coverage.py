@@ -0,0 +1,614 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+from dataclasses import asdict, dataclass, field
+
+import numpy as np
+from sqlalchemy.dialects.postgresql import insert
+
+from app.extensions import db
+from app.math.deygout import calc_deygout_loss_batch, calc_deygout_loss_radials
+from app.math.geodesy import inverse_points
+from app.math.p1546_native import field_strength, free_space_field
+from app.math.raster import grid_mask
+from app.models import FieldTile
+from app.services.haat import TerrainAverages
+from app.services.terrain import TerrainService, get_terrain_service
+from app.utils.geo import destination_points, distances_km
+
+# Pixels per block side. Blocks are the unit of scheduling and storage.
+BLOCK_SIZE = 256
+
+# Pixel size in degrees is resolution_m / METERS_PER_DEGREE on both axes,
+# so blocks are aligned on one global grid per resolution (east-west pixels
+# shrink by cos(lat)).
+METERS_PER_DEGREE = 111320.0
+
+COVERAGE_MODELS = ("p1546", "deygout")
+
+# "pixel" evaluates every pixel on its own path; "radial" evaluates a dense
+# fan of radials once and resamples it onto the grid (interactive previews);
+# "adaptive" refines a coarse lattice only around the contour levels.
+COVERAGE_MODES = ("pixel", "radial", "adaptive")
+
+# Bounds of the automatic radial spacing in "radial" mode (degrees).
+RADIAL_STEP_MIN_DEG = 0.1
+RADIAL_STEP_MAX_DEG = 1.0
+
+# Pixels per batch of terrain profiles in the Deygout model.
+PROFILE_CHUNK = 4096
+
+
+@dataclass(frozen=True)
+class CoverageGrid:
+    resolution_m: float
+    block_size: int = BLOCK_SIZE
+
+    @property
+    def pixel_deg(self) -> float:
+        return self.resolution_m / METERS_PER_DEGREE
+
+    @property
+    def block_deg(self) -> float:
+        return self.pixel_deg * self.block_size
+
+    @property
+    def z(self) -> int:
+        return int(round(self.resolution_m))
+
+    def block_range(self, lat_min: float, lat_max: float, lon_min: float, lon_max: float):
+        """
+        Inclusive block index ranges (x0, x1, y0, y1) covering a bbox.
+        x counts eastwards from 180 W, y southwards from 90 N.
+        """
+        x0 = int(math.floor((lon_min + 180.0) / self.block_deg))
+        x1 = int(math.floor((lon_max + 180.0) / self.block_deg))
+        y0 = int(math.floor((90.0 - lat_max) / self.block_deg))
+        y1 = int(math.floor((90.0 - lat_min) / self.block_deg))
+        return x0, x1, y0, y1
+
+    def blocks(self, lat_min: float, lat_max: float, lon_min: float, lon_max: float) -> list[tuple[int, int]]:
+        x0, x1, y0, y1 = self.block_range(lat_min, lat_max, lon_min, lon_max)
+        return [(x, y) for y in range(y0, y1 + 1) for x in range(x0, x1 + 1)]
+
+    def block_origin(self, x: int, y: int) -> tuple[float, float]:
+        """
+        (north, west) edges of a block, in degrees.
+        """
+        return 90.0 - y * self.block_deg, -180.0 + x * self.block_deg
+
+    def block_centers(self, x: int, y: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Pixel-centre latitudes (rows, north to south) and longitudes (columns).
+        """
+        north, west = self.block_origin(x, y)
+        offsets = (np.arange(self.block_size, dtype=np.float64) + 0.5) * self.pixel_deg
+        return north - offsets, west + offsets
+
+
+@dataclass(frozen=True)
+class AOI:
+    """
+    Area of interest as closed rings stored back to back (ring k spans
+    ring_offsets[k]:ring_offsets[k + 1]), evaluated with the even-odd rule.
+    """
+
+    ring_offsets: np.ndarray
+    ring_lat: np.ndarray
+    ring_lon: np.ndarray
+
+    @property
+    def bbox(self) -> tuple[float, float, float, float]:
+        return (
+            float(self.ring_lat.min()),
+            float(self.ring_lat.max()),
+            float(self.ring_lon.min()),
+            float(self.ring_lon.max()),
+        )
+
+    def digest(self) -> str:
+        payload = np.concatenate(
+            (self.ring_offsets.astype(np.float64), np.round(self.ring_lat, 7), np.round(self.ring_lon, 7))
+        )
+        return hashlib.sha1(payload.tobytes()).hexdigest()[:16]
+
+    def mask(self, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+        return grid_mask(lats, lons, self.ring_offsets, self.ring_lat, self.ring_lon)
+
+
+def _aoi_from_rings(rings: list) -> AOI:
+    offsets = [0]
+    lats: list[float] = []
+    lons: list[float] = []
+    for ring in rings:
+        if len(ring) < 3:
+            raise ValueError("AOI rings need at least 3 points")
+        for lon, lat, *_ in ring:
+            lons.append(float(lon))
+            lats.append(float(lat))
+        offsets.append(len(lats))
+    if not lats:
+        raise ValueError("AOI is empty")
+    return AOI(
+        ring_offsets=np.array(offsets, dtype=np.int64),
+        ring_lat=np.array(lats, dtype=np.float64),
+        ring_lon=np.array(lons, dtype=np.float64),
+    )
+
+
+def aoi_circle(lat: float, lon: float, radius_km: float, step_deg: float = 1.0) -> AOI:
+    if radius_km <= 0:
+        raise ValueError("radius_km must be positive")
+    azimuths = np.arange(0.0, 360.0, step_deg)
+    lats, lons = destination_points(lat, lon, azimuths, radius_km)
+    return _aoi_from_rings([list(zip(lons.tolist(), lats.tolist()))])
+
+
+def aoi_from_params(aoi: dict) -> AOI:
+    """
+    AOI from a request payload: a GeoJSON Polygon/MultiPolygon (or Feature),
+    {"center": [lat, lon], "radius_km": r} or {"bbox": [west, south, east, north]}.
+    """
+    if not aoi:
+        raise ValueError("AOI is required")
+    if aoi.get("type") == "Feature":
+        aoi = aoi.get("geometry") or {}
+    if "center" in aoi:
+        lat, lon = aoi["center"]
+        return aoi_circle(float(lat), float(lon), float(aoi.get("radius_km", 0.0)))
+    if "bbox" in aoi:
+        west, south, east, north = (float(v) for v in aoi["bbox"])
+        return _aoi_from_rings([[(west, south), (east, south), (east, north), (west, north)]])
+    if aoi.get("type") == "Polygon":
+        return _aoi_from_rings(aoi["coordinates"])
+    if aoi.get("type") == "MultiPolygon":
+        return _aoi_from_rings([ring for polygon in aoi["coordinates"] for ring in polygon])
+    raise ValueError("Unsupported AOI geometry")
+
+
+@dataclass(frozen=True)
+class CoverageParams:
+    tx_lat: float
+    tx_lon: float
+    freq_mhz: float
+    erp_kw: float
+    tx_h_agl: float
+    model: str = "p1546"
+    mode: str = "pixel"
+    radial_step_deg: float | None = None
+    # Adaptive mode: contour levels to resolve, initial stride (pixels) and
+    # how close (dB) a cell's corners must come to a level to be split.
+    levels_dbuvm: tuple[float, ...] = field(default_factory=tuple)
+    adaptive_stride: int = 16
+    adaptive_margin_db: float = 1.0
+    rx_h_m: float = 10.0
+    time_pct: float = 50.0
+    location_pct: float = 50.0
+    env_type: str = "Rural"
+    k_factor: float = 1.333
+    max_edges: int = 3
+    profile_step_m: float | None = None
+    # 3-15 km terrain averages at the site (see app.services.haat)
+    heff_step_deg: float = 1.0
+    ground_alt_m: float = 0.0
+    avg_terrain_m: tuple[float, ...] = field(default_factory=tuple)
+    dem_version: str = ""
+
+    def __post_init__(self):
+        if self.model not in COVERAGE_MODELS:
+            raise ValueError(f"Unsupported coverage model: {self.model}")
+        if self.mode not in COVERAGE_MODES:
+            raise ValueError(f"Unsupported coverage mode: {self.mode}")
+        if self.mode == "adaptive" and not self.levels_dbuvm:
+            raise ValueError("Adaptive mode needs at least one contour level")
+        object.__setattr__(self, "avg_terrain_m", tuple(float(v) for v in self.avg_terrain_m))
+        object.__setattr__(self, "levels_dbuvm", tuple(float(v) for v in self.levels_dbuvm))
+
+    def to_dict(self) -> dict:
+        data = asdict(self)
+        data["avg_terrain_m"] = list(self.avg_terrain_m)
+        data["levels_dbuvm"] = list(self.levels_dbuvm)
+        return data
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "CoverageParams":
+        return cls(**data)
+
+    def digest(self) -> str:
+        return hashlib.sha1(json.dumps(self.to_dict(), sort_keys=True).encode()).hexdigest()[:16]
+
+    def terrain_averages(self) -> TerrainAverages:
+        return TerrainAverages(
+            step_deg=self.heff_step_deg,
+            ground_alt_m=self.ground_alt_m,
+            avg_terrain_m=np.asarray(self.avg_terrain_m, dtype=np.float64),
+            dem_version=self.dem_version,
+        )
+
+
+def coverage_layer(params: CoverageParams, aoi: AOI) -> str:
+    """
+    FieldTile layer name: the model plus the parameter and AOI hashes of the
+    cache key; station and resolution go in revision_id and z.
+    """
+    return f"coverage:{params.model}:{params.digest()}:{aoi.digest()}"
+
+
+def _field_p1546(params: CoverageParams, dist_km: np.ndarray, azimuth: np.ndarray) -> np.ndarray:
+    if params.avg_terrain_m:
+        heff = params.terrain_averages().heff_at(azimuth, params.tx_h_agl)
+    else:
+        # No DEM at the site: flat terrain, heff equals the height above ground.
+        heff = params.tx_h_agl
+    return field_strength(
+        params.freq_mhz,
+        params.time_pct,
+        heff,
+        dist_km,
+        rx_h_m=params.rx_h_m,
+        erp_kw=params.erp_kw,
+        env_type=params.env_type,
+        location_pct=params.location_pct,
+        ha_m=params.tx_h_agl,
+    )
+
+
+def _field_deygout(
+    params: CoverageParams,
+    dist_km: np.ndarray,
+    azimuth: np.ndarray,
+    step_m: float,
+    terrain: TerrainService,
+) -> np.ndarray:
+    """
+    Free-space field minus Deygout diffraction over the terrain profile to
+    every pixel.
+    """
+    out = free_space_field(np.maximum(dist_km, 1e-3)) + 10.0 * np.log10(params.erp_kw)
+    dist_m = dist_km * 1000.0
+    for start in range(0, dist_m.size, PROFILE_CHUNK):
+        chunk = slice(start, start + PROFILE_CHUNK)
+        elev, n_valid = terrain.profiles(params.tx_lat, params.tx_lon, azimuth[chunk], dist_m[chunk], step_m)
+        out[chunk] -= calc_deygout_loss_batch(
+            elev,
+            dist_m[chunk],
+            params.rx_h_m,
+            params.freq_mhz,
+            params.tx_h_agl,
+            k_factor=params.k_factor,
+            max_edges=params.max_edges,
+            n_valid=n_valid,
+        )
+    return out
+
+
+@dataclass(frozen=True)
+class RadialField:
+    """
+    Field strength on a fan of radials: values[a, j] at azimuth a * step_deg
+    and distance j * step_m from the transmitter.
+    """
+
+    step_deg: float
+    step_m: float
+    values: np.ndarray
+
+    def resample(self, dist_m: np.ndarray, azimuth_deg: np.ndarray) -> np.ndarray:
+        """
+        Bilinear interpolation in (azimuth, distance), circular in azimuth.
+        Points beyond the last sample take the last sample's value.
+        """
+        n_az, n_d = self.values.shape
+        fa = np.mod(azimuth_deg, 360.0) / self.step_deg
+        fd = np.clip(dist_m / self.step_m, 0.0, n_d - 1.0)
+        a0 = np.floor(fa).astype(np.int64) % n_az
+        a1 = (a0 + 1) % n_az
+        d0 = np.minimum(np.floor(fd).astype(np.int64), n_d - 2)
+        wa = fa - np.floor(fa)
+        wd = fd - d0
+        v = self.values
+        near = v[a0, d0] * (1.0 - wd) + v[a0, d0 + 1] * wd
+        far = v[a1, d0] * (1.0 - wd) + v[a1, d0 + 1] * wd
+        return near * (1.0 - wa) + far * wa
+
+
+def aoi_max_distance_m(params: CoverageParams, aoi: AOI) -> float:
+    """
+    Farthest AOI point from the transmitter (always a ring vertex).
+    """
+    return float(np.max(distances_km(params.tx_lat, params.tx_lon, aoi.ring_lat, aoi.ring_lon))) * 1000.0
+
+
+def radial_steps(params: CoverageParams, grid: CoverageGrid, max_distance_m: float) -> tuple[float, float, int]:
+    """
+    (step_deg, step_m, n_distances) of a fan dense enough for the grid:
+    samples every profile_step_m (default: resolution) out to past
+    max_distance_m, and azimuths about one pixel apart at max_distance_m
+    within RADIAL_STEP_MIN_DEG..RADIAL_STEP_MAX_DEG (rounded to divide 360).
+    """
+    step_m = params.profile_step_m or grid.resolution_m
+    step_deg = params.radial_step_deg or math.degrees(grid.resolution_m / max(max_distance_m, step_m))
+    step_deg = min(max(step_deg, RADIAL_STEP_MIN_DEG), RADIAL_STEP_MAX_DEG)
+    n_az = int(math.ceil(360.0 / step_deg))
+    return 360.0 / n_az, step_m, int(math.ceil(max_distance_m / step_m)) + 2
+
+
+def radial_fan_field(
+    params: CoverageParams,
+    step_deg: float,
+    step_m: float,
+    n_distances: int,
+    terrain: TerrainService | None = None,
+) -> np.ndarray:
+    """
+    Field strength (n_az, n_distances) at azimuths a * step_deg and
+    distances j * step_m from the transmitter.
+    """
+    n_az = int(round(360.0 / step_deg))
+    azimuths = step_deg * np.arange(n_az, dtype=np.float64)
+    dist_m = step_m * np.arange(n_distances, dtype=np.float64)
+    dist_km = np.broadcast_to(dist_m / 1000.0, (n_az, dist_m.size))
+    az_grid = np.broadcast_to(azimuths[:, None], dist_km.shape)
+
+    if params.model == "p1546":
+        values = _field_p1546(params, dist_km, az_grid)
+    else:
+        terrain = terrain or get_terrain_service()
+        fan = terrain.radials(params.tx_lat, params.tx_lon, azimuths, dist_m)
+        loss = calc_deygout_loss_radials(
+            fan, step_m, params.rx_h_m, params.freq_mhz, params.tx_h_agl,
+            k_factor=params.k_factor, max_edges=params.max_edges,
+        )
+        values = free_space_field(np.maximum(dist_km, 1e-3)) + 10.0 * np.log10(params.erp_kw) - loss
+    return np.ascontiguousarray(values)
+
+
+def compute_radial_field(
+    params: CoverageParams,
+    grid: CoverageGrid,
+    max_distance_m: float,
+    terrain: TerrainService | None = None,
+) -> RadialField:
+    """
+    Field strength on the radial fan of radial_steps. See
+    app.services.pathloss.cached_radial_field for the ERP-independent,
+    disk-cached equivalent.
+    """
+    step_deg, step_m, n_distances = radial_steps(params, grid, max_distance_m)
+    values = radial_fan_field(params, step_deg, step_m, n_distances, terrain)
+    return RadialField(step_deg=step_deg, step_m=step_m, values=values)
+
+
+def _field_at_points(
+    params: CoverageParams,
+    grid: CoverageGrid,
+    px_lat: np.ndarray,
+    px_lon: np.ndarray,
+    terrain: TerrainService | None,
+    radial: RadialField | None,
+) -> np.ndarray:
+    px_lat = np.ascontiguousarray(px_lat, dtype=np.float64)
+    px_lon = np.ascontiguousarray(px_lon, dtype=np.float64)
+    dist_m, azimuth = inverse_points(
+        np.full(px_lat.size, params.tx_lat), np.full(px_lat.size, params.tx_lon), px_lat, px_lon
+    )
+    dist_km = dist_m / 1000.0
+
+    if params.mode == "radial":
+        if radial is None:
+            raise ValueError("Radial mode needs a precomputed radial field")
+        return radial.resample(dist_m, azimuth)
+    if params.model == "p1546":
+        return _field_p1546(params, dist_km, azimuth)
+    step_m = params.profile_step_m or grid.resolution_m
+    return _field_deygout(params, dist_km, azimuth, step_m, terrain or get_terrain_service())
+
+
+def adaptive_block_values(
+    params: CoverageParams,
+    grid: CoverageGrid,
+    lats: np.ndarray,
+    lons: np.ndarray,
+    mask: np.ndarray,
+    terrain: TerrainService | None = None,
+) -> tuple[np.ndarray, int]:
+    """
+    Quadtree evaluation of one block for params.levels_dbuvm. Nodes are
+    evaluated on a lattice of stride params.adaptive_stride (node indices
+    0..block_size, the last row/column being the first pixel of the next
+    block); a cell is split in four while it intersects the AOI and its
+    corner values come within adaptive_margin_db of a level. Cells left
+    unsplit are filled by bilinear interpolation of their corners, so
+    pixels are exact only where cells reached stride 1, i.e. along the
+    contours. Returns (values over the block, number of evaluated nodes).
+    """
+    if not params.levels_dbuvm:
+        raise ValueError("Adaptive mode needs at least one contour level")
+    size = grid.block_size
+    stride = int(params.adaptive_stride)
+    if stride < 1 or stride & (stride - 1) or size % stride:
+        raise ValueError("adaptive_stride must be a power of two dividing the block size")
+
+    n = size + 1
+    offsets = np.arange(n, dtype=np.float64)
+    node_lat = lats[0] - offsets * grid.pixel_deg
+    node_lon = lons[0] + offsets * grid.pixel_deg
+    values = np.full((n, n), np.nan, dtype=np.float64)
+    known = np.zeros((n, n), dtype=bool)
+
+    # Integral image of the mask, to test cells against the AOI in O(1).
+    mask_sum = np.zeros((n, n), dtype=np.int64)
+    mask_sum[1:, 1:] = np.cumsum(np.cumsum(mask, axis=0), axis=1)
+    levels = np.asarray(params.levels_dbuvm, dtype=np.float64)
+    margin = params.adaptive_margin_db
+
+    def evaluate(r, c):
+        pending = ~known[r, c]
+        r, c = r[pending], c[pending]
+        if r.size:
+            values[r, c] = _field_at_points(params, grid, node_lat[r], node_lon[c], terrain, None)
+            known[r, c] = True
+
+    def fill(r0, c0, s):
+        # Bilinear fill of cells (r0, c0) of side s from their corners.
+        if r0.size == 0:
+            return
+        t = np.arange(s + 1, dtype=np.float64) / s
+        rr = r0[:, None, None] + np.arange(s + 1)[None, :, None]
+        cc = c0[:, None, None] + np.arange(s + 1)[None, None, :]
+        v00 = values[r0, c0][:, None, None]
+        v01 = values[r0, c0 + s][:, None, None]
+        v10 = values[r0 + s, c0][:, None, None]
+        v11 = values[r0 + s, c0 + s][:, None, None]
+        tr = t[None, :, None]
+        tc = t[None, None, :]
+        interp = (v00 * (1 - tc) + v01 * tc) * (1 - tr) + (v10 * (1 - tc) + v11 * tc) * tr
+        rr, cc = np.broadcast_arrays(rr, cc)
+        keep = ~known[rr, cc]
+        values[rr[keep], cc[keep]] = interp[keep]
+
+    grid_idx = np.arange(0, n, stride)
+    evaluate(*[a.ravel() for a in np.meshgrid(grid_idx, grid_idx, indexing="ij")])
+    r0, c0 = [a.ravel() for a in np.meshgrid(grid_idx[:-1], grid_idx[:-1], indexing="ij")]
+
+    s = stride
+    while s > 1 and r0.size:
+        r1 = np.minimum(r0 + s, size)
+        c1 = np.minimum(c0 + s, size)
+        inside = (mask_sum[r1, c1] - mask_sum[r0, c1] - mask_sum[r1, c0] + mask_sum[r0, c0]) > 0
+        corners = np.stack(
+            (values[r0, c0], values[r0, c0 + s], values[r0 + s, c0], values[r0 + s, c0 + s])
+        )
+        lo = corners.min(axis=0)[:, None]
+        hi = corners.max(axis=0)[:, None]
+        straddle = ((lo - margin <= levels[None, :]) & (hi + margin >= levels[None, :])).any(axis=1)
+        split = inside & straddle
+
+        fill(r0[~split], c0[~split], s)
+        r0, c0 = r0[split], c0[split]
+        h = s // 2
+        # The five new nodes of every split cell (centre and edge midpoints).
+        new_r = np.concatenate((r0 + h, r0, r0 + h, r0 + h, r0 + s))
+        new_c = np.concatenate((c0 + h, c0 + h, c0, c0 + s, c0 + h))
+        evaluate(new_r, new_c)
+        r0 = np.concatenate((r0, r0, r0 + h, r0 + h))
+        c0 = np.concatenate((c0, c0 + h, c0, c0 + h))
+        s = h
+
+    return values[:size, :size], int(known.sum())
+
+
+def compute_block(
+    params: CoverageParams,
+    grid: CoverageGrid,
+    aoi: AOI,
+    x: int,
+    y: int,
+    terrain: TerrainService | None = None,
+    radial: RadialField | None = None,
+) -> np.ndarray | None:
+    """
+    Field strength (dBuV/m, float32) for one block, NaN outside the AOI.
+    Returns None when no pixel centre of the block falls inside the AOI.
+    In "radial" mode the pixels are resampled from `radial`
+    (compute_radial_field), which callers share across blocks; "adaptive"
+    mode goes through adaptive_block_values.
+    """
+    lats, lons = grid.block_centers(x, y)
+    mask = aoi.mask(lats, lons)
+    if not mask.any():
+        return None
+
+    out = np.full((grid.block_size, grid.block_size), np.nan, dtype=np.float32)
+    if params.mode == "adaptive":
+        values, _ = adaptive_block_values(params, grid, lats, lons, mask, terrain)
+        out[mask] = values[mask]
+        return out
+
+    rows, cols = np.nonzero(mask)
+    out[rows, cols] = _field_at_points(params, grid, lats[rows], lons[cols], terrain, radial)
+    return out
+
+
+def block_metadata(grid: CoverageGrid, x: int, y: int, params: CoverageParams) -> dict:
+    north, west = grid.block_origin(x, y)
+    return {
+        "dtype": "float32",
+        "byte_order": "little",
+        "nodata": "nan",
+        "unit": "dBuV/m",
+        "model": params.model,
+        "mode": params.mode,
+        "block_size": grid.block_size,
+        "resolution_m": grid.resolution_m,
+        "pixel_deg": grid.pixel_deg,
+        "north": north,
+        "west": west,
+    }
+
+
+def store_block(
+    station_id,
+    layer: str,
+    grid: CoverageGrid,
+    x: int,
+    y: int,
+    values: np.ndarray,
+    metadata: dict,
+) -> None:
+    # Payloads are little-endian in the dtype named by metadata["dtype"].
+    dtype = np.dtype(metadata.get("dtype", "float32")).newbyteorder("<")
+    payload = np.ascontiguousarray(values, dtype=dtype).tobytes()
+    stmt = insert(FieldTile).values(
+        revision_id=station_id,
+        layer=layer,
+        z=grid.z,
+        x=x,
+        y=y,
+        payload=payload,
+        metadata_json=metadata,
+    )
+    db.session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["revision_id", "layer", "z", "x", "y"],
+            set_={"payload": stmt.excluded.payload, "metadata": stmt.excluded["metadata"]},
+        )
+    )
+
+
+def load_block(station_id, layer: str, z: int, x: int, y: int) -> np.ndarray | None:
+    tile = FieldTile.query.filter_by(revision_id=station_id, layer=layer, z=z, x=x, y=y).first()
+    if tile is None or tile.payload is None:
+        return None
+    metadata = tile.metadata_json or {}
+    size = int(metadata.get("block_size", BLOCK_SIZE))
+    dtype = np.dtype(metadata.get("dtype", "float32")).newbyteorder("<")
+    return np.frombuffer(tile.payload, dtype=dtype).reshape(size, size)
+
+
+def load_block_metadata(station_id, layer: str, z: int, x: int, y: int) -> dict | None:
+    return db.session.execute(
+        db.select(FieldTile.metadata_json).filter_by(revision_id=station_id, layer=layer, z=z, x=x, y=y)
+    ).scalar_one_or_none()
+
+
+def compute_and_store_block(
+    station_id,
+    params: CoverageParams,
+    grid: CoverageGrid,
+    aoi: AOI,
+    x: int,
+    y: int,
+    radial: RadialField | None = None,
+) -> bool:
+    """
+    Computes one block and upserts it into grid.field_tiles.
+    Returns False (nothing stored) for blocks outside the AOI.
+    """
+    values = compute_block(params, grid, aoi, x, y, radial=radial)
+    if values is None:
+        return False
+    store_block(station_id, coverage_layer(params, aoi), grid, x, y, values, block_metadata(grid, x, y, params))
+    return True
@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+from sqlalchemy.dialects.postgresql import insert
+
+from app.extensions import db
+from app.math.p1546 import TERRAIN_AVG_END_M, get_terrain_avg_3_15_radials, terrain_avg_3_15_distances
+from app.models import TerrainAverage
+from app.services.terrain import TerrainService, get_terrain_service
+
+# Cache key precision for site coordinates (~0.1 m).
+LOCATION_DECIMALS = 6
+
+
+@dataclass(frozen=True)
+class TerrainAverages:
+    step_deg: float
+    ground_alt_m: float
+    avg_terrain_m: np.ndarray
+    dem_version: str
+
+    @property
+    def azimuths_deg(self) -> np.ndarray:
+        return self.step_deg * np.arange(self.avg_terrain_m.size, dtype=np.float64)
+
+    def heff(self, h_agl: float, ground_alt_m: float | None = None) -> np.ndarray:
+        """
+        Effective height (HAAT/HNMT) per azimuth for an antenna h_agl metres
+        above ground. ground_alt_m overrides the DEM ground level at the site.
+        """
+        ground = self.ground_alt_m if ground_alt_m is None else ground_alt_m
+        return ground + h_agl - self.avg_terrain_m
+
+    def heff_at(self, azimuths_deg, h_agl: float, ground_alt_m: float | None = None) -> np.ndarray:
+        """
+        heff interpolated (circularly) at arbitrary azimuths.
+        """
+        heff = self.heff(h_agl, ground_alt_m)
+        az = np.mod(np.asarray(azimuths_deg, dtype=np.float64), 360.0)
+        xp = np.append(self.azimuths_deg, 360.0)
+        fp = np.append(heff, heff[0])
+        return np.interp(az, xp, fp)
+
+
+def compute_terrain_averages(
+    lat: float,
+    lon: float,
+    step_deg: float = 1.0,
+    terrain: TerrainService | None = None,
+) -> TerrainAverages:
+    """
+    3-15 km average terrain on every azimuth at step_deg, from one radial fan.
+    """
+    if step_deg <= 0 or abs(360.0 / step_deg - round(360.0 / step_deg)) > 1e-9:
+        raise ValueError("step_deg must be a positive divisor of 360")
+
+    terrain = terrain or get_terrain_service()
+    azimuths = step_deg * np.arange(int(round(360.0 / step_deg)), dtype=np.float64)
+    fan = terrain.radials(lat, lon, azimuths, terrain_avg_3_15_distances())
+
+    return TerrainAverages(
+        step_deg=step_deg,
+        ground_alt_m=terrain.elevation(lat, lon),
+        avg_terrain_m=get_terrain_avg_3_15_radials(fan),
+        dem_version=terrain.dem_version(lat, lon, TERRAIN_AVG_END_M),
+    )
+
+
+def get_terrain_averages(lat: float, lon: float, step_deg: float = 1.0) -> TerrainAverages:
+    """
+    Cached compute_terrain_averages, persisted in gis.terrain_averages and
+    keyed by site location and DEM version.
+    """
+    terrain = get_terrain_service()
+    lat_key = round(float(lat), LOCATION_DECIMALS)
+    lon_key = round(float(lon), LOCATION_DECIMALS)
+    dem_version = terrain.dem_version(lat_key, lon_key, TERRAIN_AVG_END_M)
+
+    cached = TerrainAverage.query.filter_by(
+        lat=lat_key,
+        lon=lon_key,
+        dem_version=dem_version,
+        step_deg=float(step_deg),
+    ).first()
+    if cached:
+        return TerrainAverages(
+            step_deg=cached.step_deg,
+            ground_alt_m=cached.ground_alt_m,
+            avg_terrain_m=np.asarray(cached.avg_terrain_m, dtype=np.float64),
+            dem_version=cached.dem_version,
+        )
+
+    result = compute_terrain_averages(lat_key, lon_key, step_deg=step_deg, terrain=terrain)
+    db.session.execute(
+        insert(TerrainAverage)
+        .values(
+            lat=lat_key,
+            lon=lon_key,
+            dem_version=result.dem_version,
+            step_deg=float(step_deg),
+            ground_alt_m=result.ground_alt_m,
+            avg_terrain_m=[round(float(v), 2) for v in result.avg_terrain_m],
+        )
+        .on_conflict_do_nothing(constraint="uq_terrain_averages_key")
+    )
+    return result
@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import Iterable
+
+from sqlalchemy import func, or_
+
+from app.extensions import db
+from app.models import AnatelStation, IndexedStation, StationInteraction, V4Station
+from app.services.bulk import insert_rows
+from app.services.channels import ProtectionTable, load_protection_table
+from app.services.screening import (
+    SCREEN_RADIUS_KM,
+    ScreeningStation,
+    screen_station,
+    screening_filter,
+    station_from_anatel,
+    station_from_v4,
+)
+
+ANATEL_PREFIX = "anatel:"
+V4_PREFIX = "v4:"
+
+# Stations re-screened per commit.
+REINDEX_BATCH = 50
+
+# Keys per IN (...) clause when deleting pairs.
+KEY_CHUNK = 1000
+
+
+def anatel_key(row: AnatelStation) -> str:
+    # source_id survives re-imports, the row id does not; ids are only
+    # unique within one source file. Rows without one are keyed by site.
+    if row.source_id:
+        return f"{ANATEL_PREFIX}{row.source}:{row.source_id}"
+    site = _fingerprint([row.fistel, row.service, row.canal, round(row.latitude, 6), round(row.longitude, 6)])
+    return f"{ANATEL_PREFIX}{row.source}:~{site}"
+
+
+def v4_key(station_id) -> str:
+    return f"{V4_PREFIX}{station_id}"
+
+
+def _fingerprint(values) -> str:
+    return hashlib.sha1(json.dumps(values, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def anatel_fingerprint(row: AnatelStation) -> str:
+    """
+    Fingerprint of the columns screening reads from an anatel_stations row.
+    """
+    return _fingerprint([
+        round(row.latitude, 6), round(row.longitude, 6), row.service, row.canal, row.frequencia_mhz,
+        row.erp_kw, row.altura_m, row.pattern_dbd,
+    ])
+
+
+def v4_fingerprint(station: V4Station, lat: float, lon: float) -> str:
+    return _fingerprint([
+        round(lat, 6), round(lon, 6), station.service, station.canal, station.freq_mhz,
+        station.erp_dbm, station.h_eff, station.htx,
+    ])
+
+
+def _latest_anatel(query) -> dict[str, AnatelStation]:
+    # Imports append; the newest row of each key is the current one.
+    rows: dict[str, AnatelStation] = {}
+    for row in query.order_by(AnatelStation.id):
+        rows[anatel_key(row)] = row
+    return rows
+
+
+def _v4_rows(query) -> list[tuple[V4Station, float, float]]:
+    return [
+        (station, float(lat), float(lon))
+        for station, lat, lon in query.add_columns(func.ST_Y(V4Station.geom), func.ST_X(V4Station.geom))
+    ]
+
+
+def neighbours(
+    station: ScreeningStation,
+    table: ProtectionTable,
+    radius_km: float = SCREEN_RADIUS_KM,
+) -> list[ScreeningStation]:
+    """
+    Keyed screening views of the anatel and V4 stations that may interact
+    with station (its own key excluded).
+    """
+    found: list[ScreeningStation] = []
+    condition = screening_filter(AnatelStation.geom, AnatelStation.frequencia_mhz, station, table, radius_km)
+    if condition is None:
+        return found
+    for key, row in _latest_anatel(AnatelStation.query.filter(condition)).items():
+        other = station_from_anatel(row)
+        if other is not None and key != station.station_id:
+            found.append(dataclasses.replace(other, station_id=key))
+    condition = screening_filter(V4Station.geom, V4Station.freq_mhz, station, table, radius_km)
+    for row, lat, lon in _v4_rows(V4Station.query.filter(condition)):
+        other = station_from_v4(row, lat, lon)
+        if other is not None and v4_key(row.id) != station.station_id:
+            found.append(dataclasses.replace(other, station_id=v4_key(row.id)))
+    return found
+
+
+def _delete_pairs(keys: list[str]) -> None:
+    for start in range(0, len(keys), KEY_CHUNK):
+        chunk = keys[start:start + KEY_CHUNK]
+        StationInteraction.query.filter(
+            or_(StationInteraction.interferer_key.in_(chunk), StationInteraction.victim_key.in_(chunk))
+        ).delete(synchronize_session=False)
+
+
+@dataclass(frozen=True)
+class ReindexResult:
+    changed: int
+    removed: int
+    pairs: int
+
+    def to_dict(self) -> dict:
+        return {"changed": self.changed, "removed": self.removed, "pairs": self.pairs}
+
+
+def reindex_stations(
+    stations: dict[str, ScreeningStation | None],
+    fingerprints: dict[str, str],
+    removed: Iterable[str] = (),
+) -> ReindexResult:
+    """
+    Re-screens the given stations (key -> screening view, None when it can
+    no longer be screened) against their current neighbours and replaces
+    every pair touching them; pairs of removed keys are dropped. Pairs
+    between two untouched stations are left as they are.
+    """
+    table = load_protection_table()
+    removed = list(removed)
+    if removed:
+        _delete_pairs(removed)
+        for start in range(0, len(removed), KEY_CHUNK):
+            IndexedStation.query.filter(
+                IndexedStation.station_key.in_(removed[start:start + KEY_CHUNK])
+            ).delete(synchronize_session=False)
+        db.session.commit()
+
+    keys = list(stations)
+    total = 0
+    for start in range(0, len(keys), REINDEX_BATCH):
+        batch = keys[start:start + REINDEX_BATCH]
+        _delete_pairs(batch)
+        for key in batch:
+            station = stations[key]
+            rows = []
+            if station is not None:
+                station = dataclasses.replace(station, station_id=key)
+                result = screen_station(station, neighbours(station, table), table)
+                for pair in result.pairs:
+                    caused = pair.direction == "caused"
+                    rows.append(dict(
+                        interferer_key=key if caused else pair.station_id,
+                        victim_key=pair.station_id if caused else key,
+                        relation=pair.relation,
+                        pr_db=pair.pr_db,
+                        distance_km=pair.distance_km,
+                        worst_margin_db=pair.worst_margin_db,
+                        worst_azimuth_deg=pair.worst_azimuth_deg,
+                    ))
+            pair_count = len(rows)
+            # A neighbour re-screened in this batch already wrote the pair.
+            existing = {
+                (pair.interferer_key, pair.victim_key)
+                for pair in StationInteraction.query.filter(
+                    or_(StationInteraction.interferer_key == key, StationInteraction.victim_key == key)
+                )
+            }
+            rows = [row for row in rows if (row["interferer_key"], row["victim_key"]) not in existing]
+            total += insert_rows(StationInteraction, rows)
+            db.session.merge(IndexedStation(station_key=key, fingerprint=fingerprints[key], pair_count=pair_count))
+            db.session.flush()
+        db.session.commit()
+
+    return ReindexResult(changed=len(keys), removed=len(removed), pairs=total)
+
+
+def _stale(current: dict[str, str], prefix: str) -> tuple[list[str], list[str]]:
+    # (changed or new keys, keys gone) of one station source.
+    stored = dict(
+        db.session.query(IndexedStation.station_key, IndexedStation.fingerprint).filter(
+            IndexedStation.station_key.startswith(prefix)
+        )
+    )
+    changed = [key for key, fingerprint in current.items() if stored.get(key) != fingerprint]
+    removed = [key for key in stored if key not in current]
+    return changed, removed
+
+
+def sync_anatel_index() -> ReindexResult:
+    """
+    Brings the index up to date with anatel_stations after an import: only
+    stations whose screening inputs changed (or that are new) are
+    re-screened, and stations no longer present lose their pairs.
+    """
+    rows = _latest_anatel(AnatelStation.query)
+    current = {key: anatel_fingerprint(row) for key, row in rows.items()}
+    changed, removed = _stale(current, ANATEL_PREFIX)
+    return reindex_stations({key: station_from_anatel(rows[key]) for key in changed}, current, removed)
+
+
+def sync_v4_index(station_ids=None) -> ReindexResult:
+    """
+    Same as sync_anatel_index for stations_v4, optionally limited to some
+    stations (e.g. the one just edited).
+    """
+    query = V4Station.query
+    if station_ids is not None:
+        query = query.filter(V4Station.id.in_(list(station_ids)))
+    rows = {v4_key(station.id): (station, lat, lon) for station, lat, lon in _v4_rows(query)}
+    current = {key: v4_fingerprint(*row) for key, row in rows.items()}
+    changed, removed = _stale(current, V4_PREFIX)
+    if station_ids is not None:
+        wanted = {v4_key(station_id) for station_id in station_ids}
+        removed = [key for key in removed if key in wanted]
+    return reindex_stations({key: station_from_v4(*rows[key]) for key in changed}, current, removed)
+
+
+def station_pairs(key: str) -> list[StationInteraction]:
+    return (
+        StationInteraction.query.filter(
+            or_(StationInteraction.interferer_key == key, StationInteraction.victim_key == key)
+        )
+        .order_by(StationInteraction.worst_margin_db)
+        .all()
+    )
@@ -1,13 +1,16 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
+from typing import Callable
 
+import numpy as np
 from geoalchemy2.elements import WKTElement
 
 from app.extensions import db
+from app.math.geodesy import inverse_matrix
 from app.models import Contour, ContourPoint, InterferenceCase, InterferenceTestPoint, ProjectRevision, Station
-from app.services.contour import erp_dbw, field_strength_dbuvm
-from app.utils.geo import distance_km
+from app.services.bulk import insert_objects
+from app.services.contour import erp_dbw
 
 
 @dataclass(frozen=True)
@@ -17,7 +20,182 @@ class InterferenceResult:
     passed: bool
 
 
+@dataclass(frozen=True)
+class DUMatrix:
+    """
+    Interfering field and D/U margin of every interferer (rows) at every
+    test point (columns), plus the worst point of each interferer.
+    """
+
+    unwanted_dbuvm: np.ndarray
+    margin_db: np.ndarray
+    worst_index: np.ndarray
+
+    @property
+    def worst_margin_db(self) -> np.ndarray:
+        return self.margin_db[np.arange(self.margin_db.shape[0]), self.worst_index]
+
+    @property
+    def passed(self) -> np.ndarray:
+        return self.worst_margin_db >= 0.0
+
+
+# Interferers reported per point by the aggregate evaluation.
+TOP_OFFENDERS = 3
+
+FieldModel = Callable[[np.ndarray, np.ndarray], np.ndarray]
+
+
+def free_space_model(erp_dbw_values) -> FieldModel:
+    """
+    Free-space field of interferers with the given ERPs (dBW, one per row),
+    the vectorized form of contour.field_strength_dbuvm.
+    """
+    erp = np.asarray(erp_dbw_values, dtype=np.float64).reshape(-1, 1)
+
+    def model(distance_km: np.ndarray, azimuth_deg: np.ndarray) -> np.ndarray:
+        with np.errstate(divide="ignore"):
+            field = 106.92 + (erp - 30.0) - 20.0 * np.log10(distance_km)
+        return np.where(distance_km > 0.0, field, np.inf)
+
+    return model
+
+
+def du_matrix(
+    tx_lat,
+    tx_lon,
+    point_lat,
+    point_lon,
+    wanted_dbuvm,
+    du_required_db,
+    model: FieldModel,
+) -> DUMatrix:
+    """
+    D/U margins of N interferers at P test points in one pass: distances
+    and azimuths from every interferer to every point come from one
+    geodesic inverse_matrix call, and model(distance_km, azimuth_deg) returns
+    the (N, P) interfering fields. wanted_dbuvm and du_required_db
+    broadcast against (N, P): per point (P,), per interferer (N, 1) or
+    per pair.
+    """
+    tx_lat = np.asarray(tx_lat, dtype=np.float64).ravel()
+    tx_lon = np.asarray(tx_lon, dtype=np.float64).ravel()
+    point_lat = np.asarray(point_lat, dtype=np.float64).ravel()
+    point_lon = np.asarray(point_lon, dtype=np.float64).ravel()
+    n, p = tx_lat.size, point_lat.size
+    if n == 0 or p == 0:
+        raise ValueError("du_matrix needs at least one interferer and one point")
+
+    dist_m, azimuth = inverse_matrix(tx_lat, tx_lon, point_lat, point_lon)
+    unwanted = model(dist_m / 1000.0, azimuth)
+    margin = np.asarray(wanted_dbuvm, dtype=np.float64) - unwanted - np.asarray(du_required_db, dtype=np.float64)
+    margin = np.broadcast_to(margin, (n, p))
+    return DUMatrix(unwanted_dbuvm=unwanted, margin_db=margin, worst_index=np.argmin(margin, axis=1))
+
+
+@dataclass(frozen=True)
+class AggregateDU:
+    """
+    Aggregate interference at each test point. contributions_db keeps the
+    PR-weighted field of every interferer (rows) at every point (float32);
+    top_index the top_k interferers per point, strongest first.
+    """
+
+    wanted_dbuvm: np.ndarray
+    aggregate_dbuvm: np.ndarray
+    contributions_db: np.ndarray
+    top_index: np.ndarray
+
+    @property
+    def margin_db(self) -> np.ndarray:
+        return self.wanted_dbuvm - self.aggregate_dbuvm
+
+    @property
+    def worst_index(self) -> int:
+        return int(np.argmin(self.margin_db))
+
+    @property
+    def passed(self) -> bool:
+        return bool(np.all(self.margin_db >= 0.0))
+
+    def offenders(self, point_index: int) -> list[tuple[int, float, float]]:
+        """
+        (row, weighted field dB, share of the aggregate power) of the top
+        interferers at one point.
+        """
+        total = self.aggregate_dbuvm[point_index]
+        rows = self.top_index[:, point_index].tolist()
+        return [
+            (
+                row,
+                float(self.contributions_db[row, point_index]),
+                float(10 ** ((self.contributions_db[row, point_index] - total) / 10.0)) if np.isfinite(total) else 1.0,
+            )
+            for row in rows
+        ]
+
+
+def aggregate_du(wanted_dbuvm, margin_db, top_k: int = TOP_OFFENDERS, sources=None) -> AggregateDU:
+    """
+    Power sum, at every point, of the PR-weighted interfering fields
+    (U + PR = wanted - margin) of all rows of a D/U margin matrix, in one
+    vectorized pass over the (N, P) array. Rows with the same `sources`
+    label are one emitter seen through several cases: only the strongest
+    of them enters the sum at each point (the others are kept at -inf).
+    """
+    margin_db = np.atleast_2d(np.asarray(margin_db, dtype=np.float64))
+    wanted = np.broadcast_to(np.asarray(wanted_dbuvm, dtype=np.float64), margin_db.shape[1:])
+    weighted = wanted - margin_db
+    n_sources = margin_db.shape[0]
+    if sources is not None:
+        _, group = np.unique(np.asarray(sources), return_inverse=True)
+        n_sources = int(group.max()) + 1
+        strongest = np.zeros(weighted.shape, dtype=bool)
+        columns = np.arange(weighted.shape[1])
+        for g in range(n_sources):
+            rows = np.flatnonzero(group == g)
+            strongest[rows[np.argmax(weighted[rows], axis=0)], columns] = True
+        weighted = np.where(strongest, weighted, -np.inf)
+    peak = weighted.max(axis=0)
+    with np.errstate(invalid="ignore", over="ignore"):
+        power = np.sum(10 ** ((weighted - peak) / 10.0), axis=0)
+        total = np.where(np.isfinite(peak), peak + 10.0 * np.log10(power), peak)
+    top_k = min(top_k, n_sources)
+    top_index = np.argsort(-weighted, axis=0, kind="stable")[:top_k]
+    return AggregateDU(
+        wanted_dbuvm=np.array(wanted),
+        aggregate_dbuvm=total,
+        contributions_db=weighted.astype(np.float32),
+        top_index=top_index.astype(np.int32),
+    )
+
+
+@dataclass(frozen=True)
+class InterferenceRun:
+    results: list[InterferenceResult]
+    aggregate: AggregateDU | None = None
+    points: list[ContourPoint] | None = None
+
+
 def run_interference_case(revision: ProjectRevision, case: InterferenceCase) -> InterferenceResult:
+    return run_interference_cases(revision, [case]).results[0]
+
+
+def run_interference_cases(
+    revision: ProjectRevision,
+    cases: list[InterferenceCase],
+    aggregate: bool = False,
+) -> InterferenceRun:
+    """
+    Evaluates the revision's interference cases against its protected
+    contour in one D/U matrix (one row per case) and stores each case's
+    test points. With aggregate, the PR-weighted fields of all cases are
+    also power-summed at every test point; every case's interferer is the
+    revision's own transmitter, so its cases count as a single source.
+    """
+    if not cases:
+        return InterferenceRun(results=[])
+
     contour = (
         Contour.query.filter_by(revision_id=revision.id, contour_kind="protected")
         .order_by(Contour.id)
@@ -40,31 +218,43 @@ def run_interference_case(revision: ProjectRevision, case: InterferenceCase) ->
         revision.feedline[0] if revision.feedline else None,
     )
 
-    test_points: list[InterferenceTestPoint] = []
-    passed = True
-
-    for point in points:
-        d_dbuvm = contour.threshold_dbuvm
-        distance = distance_km(station.tx_lat, station.tx_lon, point.lat, point.lon)
-        u_dbuvm = field_strength_dbuvm(erp, distance)
-        margin_db = (d_dbuvm - u_dbuvm) - case.du_required_db
-        point_passed = margin_db >= 0
-        passed = passed and point_passed
-
-        test_points.append(
+    d_dbuvm = contour.threshold_dbuvm
+    n = len(cases)
+    matrix = du_matrix(
+        np.full(n, station.tx_lat),
+        np.full(n, station.tx_lon),
+        np.array([point.lat for point in points]),
+        np.array([point.lon for point in points]),
+        d_dbuvm,
+        np.array([case.du_required_db for case in cases])[:, None],
+        free_space_model(np.full(n, erp)),
+    )
+    srid = contour.geom.srid or 4674
+    results = []
+    all_points: list[InterferenceTestPoint] = []
+    for row, case in enumerate(cases):
+        test_points = [
             InterferenceTestPoint(
                 case_id=case.id,
-                geom=WKTElement(f"POINT({point.lon} {point.lat})", srid=contour.geom.srid or 4674),
+                geom=WKTElement(f"POINT({point.lon} {point.lat})", srid=srid),
                 d_dbuvm=d_dbuvm,
                 u_dbuvm=u_dbuvm,
                 margin_db=margin_db,
-                passed=point_passed,
+                passed=margin_db >= 0,
             )
-        )
+            for point, u_dbuvm, margin_db in zip(
+                points, matrix.unwanted_dbuvm[row].tolist(), matrix.margin_db[row].tolist()
+            )
+        ]
+        all_points.extend(test_points)
+        results.append(InterferenceResult(case=case, points=test_points, passed=bool(matrix.passed[row])))
 
-    for test_point in test_points:
-        db.session.add(test_point)
+    insert_objects(all_points)
 
     db.session.commit()
 
-    return InterferenceResult(case=case, points=test_points, passed=passed)
+    return InterferenceRun(
+        results=results,
+        aggregate=aggregate_du(d_dbuvm, matrix.margin_db, sources=np.zeros(n, dtype=np.int64)) if aggregate else None,
+        points=points,
+    )
@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import os
+import tempfile
+from dataclasses import dataclass, fields
+
+import numpy as np
+from flask import current_app
+
+from app.math.deygout import calc_deygout_loss_batch, calc_profile_clearance_batch
+from app.math.geodesy import inverse_points
+from app.math.p1546_native import basic_transmission_loss, field_strength, free_space_field
+from app.services.coverage import PROFILE_CHUNK, CoverageParams
+from app.services.terrain import TerrainService, get_terrain_service
+
+# Sub-directory of FILE_STORAGE_DIR holding the batch results.
+LINKS_SUBDIR = "links"
+
+# Default spacing of the terrain profile samples (m).
+LINK_PROFILE_STEP_M = 100.0
+
+
+@dataclass(frozen=True)
+class LinkBatch:
+    """
+    One transmitter against many receivers, one column per quantity.
+    field_dbuvm and loss_db follow the selected model; both model fields
+    are kept so either can be compared without a rerun.
+    """
+
+    rx_id: np.ndarray
+    rx_lat: np.ndarray
+    rx_lon: np.ndarray
+    rx_h_m: np.ndarray
+    distance_km: np.ndarray
+    azimuth_deg: np.ndarray
+    field_dbuvm: np.ndarray
+    loss_db: np.ndarray
+    field_p1546_dbuvm: np.ndarray
+    diffraction_db: np.ndarray
+    clearance_m: np.ndarray
+    fresnel_ratio: np.ndarray
+
+    @property
+    def columns(self) -> list[str]:
+        return [f.name for f in fields(self)]
+
+    def summary(self) -> dict:
+        n = int(self.rx_lat.size)
+        return {
+            "count": n,
+            "line_of_sight": int(np.count_nonzero(self.clearance_m >= 0.0)),
+            "fresnel_clear": int(np.count_nonzero(self.fresnel_ratio >= 0.6)),
+            "max_distance_km": float(self.distance_km.max()) if n else 0.0,
+        }
+
+
+def evaluate_links(
+    params: CoverageParams,
+    rx_lat,
+    rx_lon,
+    rx_h_m=10.0,
+    rx_id=None,
+    step_m: float = LINK_PROFILE_STEP_M,
+    terrain: TerrainService | None = None,
+) -> LinkBatch:
+    """
+    Link budget from the transmitter in params to every receiver: geodesic
+    profiles are sampled and run through the batched Deygout and clearance
+    kernels PROFILE_CHUNK receivers at a time, sorted by distance so each
+    chunk pads its profiles to a similar length. P.1546 uses the site's
+    3-15 km terrain averages on each receiver's azimuth.
+    """
+    terrain = terrain or get_terrain_service()
+    rx_lat = np.ascontiguousarray(rx_lat, dtype=np.float64).ravel()
+    rx_lon = np.ascontiguousarray(rx_lon, dtype=np.float64).ravel()
+    if rx_lat.shape != rx_lon.shape:
+        raise ValueError("rx_lat and rx_lon must have the same shape")
+    n = rx_lat.size
+    rx_h_m = np.broadcast_to(np.asarray(rx_h_m, dtype=np.float64), (n,)).copy()
+    rx_id = np.asarray(rx_id if rx_id is not None else np.arange(n)).astype(str)
+    if rx_id.shape != (n,):
+        raise ValueError("rx_id must have one entry per receiver")
+
+    dist_m, azimuth = inverse_points(np.full(n, params.tx_lat), np.full(n, params.tx_lon), rx_lat, rx_lon)
+    dist_km = dist_m / 1000.0
+
+    diffraction = np.zeros(n, dtype=np.float64)
+    clearance = np.full(n, np.inf, dtype=np.float64)
+    fresnel = np.full(n, np.inf, dtype=np.float64)
+    order = np.argsort(dist_m, kind="stable")
+    for start in range(0, n, PROFILE_CHUNK):
+        chunk = order[start:start + PROFILE_CHUNK]
+        elev, n_valid = terrain.profiles(params.tx_lat, params.tx_lon, azimuth[chunk], dist_m[chunk], step_m)
+        diffraction[chunk] = calc_deygout_loss_batch(
+            elev,
+            dist_m[chunk],
+            rx_h_m[chunk],
+            params.freq_mhz,
+            params.tx_h_agl,
+            k_factor=params.k_factor,
+            max_edges=params.max_edges,
+            n_valid=n_valid,
+        )
+        clearance[chunk], fresnel[chunk] = calc_profile_clearance_batch(
+            elev, dist_m[chunk], rx_h_m[chunk], params.freq_mhz, params.tx_h_agl,
+            k_factor=params.k_factor, n_valid=n_valid,
+        )
+
+    if params.avg_terrain_m:
+        heff = params.terrain_averages().heff_at(azimuth, params.tx_h_agl)
+    else:
+        heff = params.tx_h_agl
+    field_p1546 = field_strength(
+        params.freq_mhz,
+        params.time_pct,
+        heff,
+        dist_km,
+        rx_h_m=rx_h_m,
+        erp_kw=params.erp_kw,
+        env_type=params.env_type,
+        location_pct=params.location_pct,
+        ha_m=params.tx_h_agl,
+    )
+    if params.model == "p1546":
+        field = field_p1546
+    else:
+        field = free_space_field(np.maximum(dist_km, 1e-3)) + 10.0 * np.log10(params.erp_kw) - diffraction
+
+    return LinkBatch(
+        rx_id=rx_id,
+        rx_lat=rx_lat,
+        rx_lon=rx_lon,
+        rx_h_m=rx_h_m.astype(np.float32),
+        distance_km=dist_km.astype(np.float32),
+        azimuth_deg=azimuth.astype(np.float32),
+        field_dbuvm=field.astype(np.float32),
+        loss_db=basic_transmission_loss(field, params.freq_mhz, params.erp_kw).astype(np.float32),
+        field_p1546_dbuvm=field_p1546.astype(np.float32),
+        diffraction_db=diffraction.astype(np.float32),
+        clearance_m=clearance.astype(np.float32),
+        fresnel_ratio=fresnel.astype(np.float32),
+    )
+
+
+def link_batch_path(job_id) -> str:
+    return os.path.join(LINKS_SUBDIR, f"{job_id}.npz")
+
+
+def write_link_batch(relative_path: str, batch: LinkBatch) -> None:
+    """
+    Writes the columns as a compressed .npz under FILE_STORAGE_DIR (atomic
+    rename, so readers never see a partial file).
+    """
+    path = os.path.join(current_app.config["FILE_STORAGE_DIR"], relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            np.savez_compressed(handle, **{name: getattr(batch, name) for name in batch.columns})
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import tempfile
+from dataclasses import dataclass, replace
+
+import numpy as np
+from flask import current_app
+from sqlalchemy.dialects.postgresql import insert
+
+from app.extensions import db
+from app.math.p1546_native import basic_transmission_loss
+from app.models import PathLossMatrix
+from app.services.antenna import CompiledPattern
+from app.services.coverage import (
+    CoverageGrid,
+    CoverageParams,
+    RadialField,
+    radial_fan_field,
+    radial_steps,
+)
+from app.services.haat import LOCATION_DECIMALS
+from app.services.terrain import TerrainService, get_terrain_service
+
+# Sub-directory of FILE_STORAGE_DIR holding the matrices.
+PATHLOSS_SUBDIR = "pathloss"
+
+# Matrices hold the field for this ERP; any other ERP is an offset.
+REFERENCE_ERP_KW = 1.0
+
+# CoverageParams fields that do not change the propagation: ERP is applied
+# on top of the matrix, the others only select how a raster is rendered.
+_NON_GEOMETRY_FIELDS = (
+    "erp_kw",
+    "mode",
+    "radial_step_deg",
+    "profile_step_m",
+    "levels_dbuvm",
+    "adaptive_stride",
+    "adaptive_margin_db",
+)
+
+
+def pattern_at(pattern_db, azimuths_deg) -> np.ndarray:
+    """
+    Relative horizontal pattern (dB, samples evenly spaced over 360 degrees
+    from north, or a CompiledPattern evaluated on the horizon) interpolated
+    circularly at azimuths_deg.
+    """
+    if isinstance(pattern_db, CompiledPattern):
+        return pattern_db.gain(azimuths_deg, 0.0)
+    pattern = np.asarray(pattern_db, dtype=np.float64).ravel()
+    if pattern.size == 0:
+        raise ValueError("Horizontal pattern is empty")
+    xp = np.append(360.0 / pattern.size * np.arange(pattern.size), 360.0)
+    fp = np.append(pattern, pattern[0])
+    return np.interp(np.mod(np.asarray(azimuths_deg, dtype=np.float64), 360.0), xp, fp)
+
+
+@dataclass(frozen=True)
+class PathLossField:
+    """
+    Field strength (dBuV/m) for REFERENCE_ERP_KW radiated isotropically in
+    azimuth: field_1kw[a, j] at azimuth a * step_deg and distance j * step_m.
+    """
+
+    key: str
+    step_deg: float
+    step_m: float
+    field_1kw: np.ndarray
+
+    @property
+    def azimuths_deg(self) -> np.ndarray:
+        return self.step_deg * np.arange(self.field_1kw.shape[0], dtype=np.float64)
+
+    @property
+    def distances_m(self) -> np.ndarray:
+        return self.step_m * np.arange(self.field_1kw.shape[1], dtype=np.float64)
+
+    def path_loss_db(self, freq_mhz: float) -> np.ndarray:
+        return basic_transmission_loss(self.field_1kw, freq_mhz, REFERENCE_ERP_KW)
+
+    def field(self, erp_dbw: float, losses_db: float = 0.0, pattern_db=None) -> np.ndarray:
+        """
+        Field for an ERP (dBW, before losses_db of feedline/combiner) and an
+        optional relative horizontal pattern (see pattern_at): one array add.
+        """
+        offset = erp_dbw - losses_db - 10.0 * np.log10(REFERENCE_ERP_KW * 1000.0)
+        out = self.field_1kw + offset
+        if pattern_db is not None:
+            out += pattern_at(pattern_db, self.azimuths_deg)[:, None]
+        return out
+
+    def radial_field(self, erp_dbw: float, losses_db: float = 0.0, pattern_db=None) -> RadialField:
+        return RadialField(
+            step_deg=self.step_deg,
+            step_m=self.step_m,
+            values=np.ascontiguousarray(self.field(erp_dbw, losses_db, pattern_db)),
+        )
+
+
+def path_loss_key(params: CoverageParams, step_deg: float, step_m: float, n_distances: int, dem_version: str) -> str:
+    data = params.to_dict()
+    for name in _NON_GEOMETRY_FIELDS:
+        data.pop(name)
+    data["tx_lat"] = round(params.tx_lat, LOCATION_DECIMALS)
+    data["tx_lon"] = round(params.tx_lon, LOCATION_DECIMALS)
+    data.update(
+        step_deg=round(step_deg, 9),
+        step_m=float(step_m),
+        n_distances=int(n_distances),
+        path_dem_version=dem_version,
+    )
+    return hashlib.sha1(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+def _storage_path(relative_path: str) -> str:
+    return os.path.join(current_app.config["FILE_STORAGE_DIR"], relative_path)
+
+
+def _write_matrix(relative_path: str, values: np.ndarray) -> None:
+    # Written under a temporary name and renamed, so concurrent readers
+    # never see a partial file.
+    path = _storage_path(relative_path)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            np.save(handle, np.ascontiguousarray(values, dtype=np.float32))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def get_path_loss_field(
+    params: CoverageParams,
+    step_deg: float,
+    step_m: float,
+    n_distances: int,
+    terrain: TerrainService | None = None,
+) -> PathLossField:
+    """
+    ERP-independent radial fan for params' site, height, frequency and
+    model, cached as a float32 .npy under FILE_STORAGE_DIR/pathloss and
+    indexed in gis.path_loss_matrices. The Deygout model keys on the DEM
+    tiles under the whole fan; P.1546 on params.dem_version (3-15 km).
+    """
+    terrain = terrain or get_terrain_service()
+    if params.model == "deygout":
+        dem_version = terrain.dem_version(params.tx_lat, params.tx_lon, step_m * n_distances)
+    else:
+        dem_version = params.dem_version
+    key = path_loss_key(params, step_deg, step_m, n_distances, dem_version)
+
+    cached = PathLossMatrix.query.filter_by(key=key).first()
+    if cached and os.path.exists(_storage_path(cached.file_path)):
+        values = np.load(_storage_path(cached.file_path))
+        return PathLossField(key=key, step_deg=cached.step_deg, step_m=cached.step_m, field_1kw=values)
+
+    reference = replace(params, erp_kw=REFERENCE_ERP_KW)
+    values = radial_fan_field(reference, step_deg, step_m, n_distances, terrain).astype(np.float32)
+    relative_path = cached.file_path if cached else os.path.join(PATHLOSS_SUBDIR, key[:2], f"{key}.npy")
+    _write_matrix(relative_path, values)
+
+    if not cached:
+        db.session.execute(
+            insert(PathLossMatrix)
+            .values(
+                key=key,
+                model=params.model,
+                lat=round(params.tx_lat, LOCATION_DECIMALS),
+                lon=round(params.tx_lon, LOCATION_DECIMALS),
+                h_agl=params.tx_h_agl,
+                freq_mhz=params.freq_mhz,
+                dem_version=dem_version,
+                step_deg=step_deg,
+                step_m=step_m,
+                n_az=int(values.shape[0]),
+                n_distances=int(values.shape[1]),
+                file_path=relative_path,
+                params={k: v for k, v in reference.to_dict().items() if k not in _NON_GEOMETRY_FIELDS},
+            )
+            .on_conflict_do_nothing(index_elements=["key"])
+        )
+    return PathLossField(key=key, step_deg=step_deg, step_m=step_m, field_1kw=values)
+
+
+def cached_radial_field(
+    params: CoverageParams,
+    grid: CoverageGrid,
+    max_distance_m: float,
+    losses_db: float = 0.0,
+    pattern_db=None,
+    terrain: TerrainService | None = None,
+) -> RadialField:
+    """
+    compute_radial_field through the path-loss cache: only the ERP
+    (params.erp_kw), losses and pattern are applied per call.
+    """
+    step_deg, step_m, n_distances = radial_steps(params, grid, max_distance_m)
+    cached = get_path_loss_field(params, step_deg, step_m, n_distances, terrain)
+    erp_dbw = 10.0 * np.log10(params.erp_kw * 1000.0)
+    return cached.radial_field(erp_dbw, losses_db, pattern_db)
@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import math
+from dataclasses import dataclass
+
+import numpy as np
+from geoalchemy2.elements import WKTElement
+
+from app.extensions import db
+from app.math.contours import link_rings, marching_squares, simplify_rings
+from app.math.raster import point_in_rings
+from app.models import FieldTile
+from app.models.v4 import SRID, Contour
+from app.services.bulk import insert_objects
+from app.services.coverage import CoverageGrid, load_block
+
+# Default Douglas-Peucker tolerance, in pixels.
+SIMPLIFY_TOLERANCE_PX = 0.5
+
+
+@dataclass(frozen=True)
+class ContourPolygons:
+    """
+    Polygons of {field >= level}: each polygon is a list of rings (outer
+    ring first, then holes) of (lon, lat) arrays, closed.
+    """
+
+    level: float
+    polygons: list[list[tuple[np.ndarray, np.ndarray]]]
+
+    def to_wkt(self) -> str:
+        parts = []
+        for polygon in self.polygons:
+            rings = []
+            for lons, lats in polygon:
+                coords = ", ".join(f"{lon:.7f} {lat:.7f}" for lon, lat in zip(lons.tolist(), lats.tolist()))
+                rings.append(f"({coords})")
+            parts.append(f"({', '.join(rings)})")
+        return f"MULTIPOLYGON({', '.join(parts)})"
+
+
+def layer_blocks(owner_id, layer: str, z: int) -> set[tuple[int, int]]:
+    rows = db.session.execute(
+        db.select(FieldTile.x, FieldTile.y).filter_by(revision_id=owner_id, layer=layer, z=z)
+    ).all()
+    return {(int(x), int(y)) for x, y in rows}
+
+
+def _padded_block(loaded: dict, grid: CoverageGrid, x: int, y: int) -> np.ndarray:
+    """
+    Block (x, y) plus the first row/column of its south, east and
+    south-east neighbours (NaN where a block is missing).
+    """
+    size = grid.block_size
+    out = np.full((size + 1, size + 1), np.nan, dtype=np.float64)
+    for (dx, dy), rows, cols in (
+        ((0, 0), slice(0, size), slice(0, size)),
+        ((1, 0), slice(0, size), slice(size, size + 1)),
+        ((0, 1), slice(size, size + 1), slice(0, size)),
+        ((1, 1), slice(size, size + 1), slice(size, size + 1)),
+    ):
+        values = loaded.get((x + dx, y + dy))
+        if values is not None:
+            out[rows, cols] = values[: rows.stop - rows.start, : cols.stop - cols.start]
+    return out
+
+
+def trace_segments(owner_id, layer: str, grid: CoverageGrid, levels) -> tuple[np.ndarray, ...]:
+    """
+    Marching-squares segments of every level over all stored blocks of a
+    layer, streaming the blocks one row at a time (a block row and the one
+    below it are held in memory). Cells between blocks are traced by the
+    block owning their top-left pixel; blocks west/north of stored ones are
+    visited as empty so rings close along the data edge.
+    """
+    levels = np.asarray(levels, dtype=np.float64)
+    stored = layer_blocks(owner_id, layer, grid.z)
+    visit = sorted(
+        {(x - dx, y - dy) for x, y in stored for dx in (0, 1) for dy in (0, 1)},
+        key=lambda b: (b[1], b[0]),
+    )
+    n_cols_global = int(math.ceil(360.0 / grid.pixel_deg)) + 2
+
+    loaded: dict = {}
+    parts = []
+    for x, y in visit:
+        for key in [k for k in loaded if k[1] < y]:
+            del loaded[key]
+        for key in ((x, y), (x + 1, y), (x, y + 1), (x + 1, y + 1)):
+            if key not in loaded:
+                loaded[key] = load_block(owner_id, layer, grid.z, *key) if key in stored else None
+        values = _padded_block(loaded, grid, x, y)
+        if np.isnan(values).all():
+            continue
+        parts.append(marching_squares(values, levels, y * grid.block_size, x * grid.block_size, n_cols_global))
+
+    if not parts:
+        empty_i = np.empty(0, dtype=np.int64)
+        empty_f = np.empty(0, dtype=np.float64)
+        return empty_i, empty_i, empty_i, empty_f, empty_f
+    return tuple(np.concatenate(arrays) for arrays in zip(*parts))
+
+
+def _assemble_polygons(grid: CoverageGrid, rows: np.ndarray, cols: np.ndarray, offsets: np.ndarray):
+    """
+    Groups rings (pixel coordinates, outer rings counter-clockwise in
+    x = col, y = -row) into polygons: every hole goes to the smallest outer
+    ring containing it.
+    """
+    xs = cols
+    ys = -rows
+    starts = offsets[:-1]
+    nxt = np.arange(1, xs.size + 1)
+    nxt[offsets[1:] - 1] = starts
+    area = 0.5 * np.add.reduceat(xs * ys[nxt] - xs[nxt] * ys, starts) if starts.size else np.empty(0)
+
+    outers = np.nonzero(area > 0)[0]
+    outers = outers[np.argsort(area[outers])]
+    bbox = np.stack((
+        np.minimum.reduceat(xs, starts), np.maximum.reduceat(xs, starts),
+        np.minimum.reduceat(ys, starts), np.maximum.reduceat(ys, starts),
+    ), axis=1) if starts.size else np.empty((0, 4))
+    holes_of = {int(k): [] for k in outers}
+    for h in np.nonzero(area < 0)[0]:
+        px, py = xs[offsets[h]], ys[offsets[h]]
+        candidates = outers[
+            (bbox[outers, 0] <= px) & (px <= bbox[outers, 1]) & (bbox[outers, 2] <= py) & (py <= bbox[outers, 3])
+        ]
+        for k in candidates:
+            ring = np.array([0, offsets[k + 1] - offsets[k]], dtype=np.int64)
+            if point_in_rings(py, px, ring, ys[offsets[k]:offsets[k + 1]], xs[offsets[k]:offsets[k + 1]]):
+                holes_of[int(k)].append(int(h))
+                break
+
+    def to_lonlat(k):
+        a, b = offsets[k], offsets[k + 1]
+        lat = 90.0 - (np.append(rows[a:b], rows[a]) + 0.5) * grid.pixel_deg
+        lon = -180.0 + (np.append(cols[a:b], cols[a]) + 0.5) * grid.pixel_deg
+        return lon, lat
+
+    return [[to_lonlat(k)] + [to_lonlat(h) for h in holes_of[int(k)]] for k in outers]
+
+
+def extract_contours(
+    owner_id,
+    layer: str,
+    grid: CoverageGrid,
+    levels,
+    tolerance_px: float = SIMPLIFY_TOLERANCE_PX,
+) -> list[ContourPolygons]:
+    """
+    Contours of a stored raster layer at several levels from one pass over
+    its blocks, stitched across block edges by exact edge keys and
+    simplified with Douglas-Peucker. All levels are simplified together,
+    so no ring collapses, flips or crosses a ring of its own or of another
+    level (see simplify_rings).
+    """
+    levels = [float(v) for v in levels]
+    level_idx, key_from, key_to, rows, cols = trace_segments(owner_id, layer, grid, levels)
+
+    ring_rows, ring_cols, ring_offsets, ring_level = [], [], [np.zeros(1, dtype=np.int64)], []
+    n_points = 0
+    for li in range(len(levels)):
+        sel = np.nonzero(level_idx == li)[0]
+        if sel.size == 0:
+            continue
+        order, offsets = link_rings(key_from[sel], key_to[sel])
+        ring_rows.append(rows[sel][order])
+        ring_cols.append(cols[sel][order])
+        ring_offsets.append(offsets[1:] + n_points)
+        ring_level.append(np.full(offsets.size - 1, li, dtype=np.int64))
+        n_points += order.size
+    if not ring_level:
+        return [ContourPolygons(level, []) for level in levels]
+
+    ring_rows = np.concatenate(ring_rows)
+    ring_cols = np.concatenate(ring_cols)
+    offsets = np.concatenate(ring_offsets)
+    ring_level = np.concatenate(ring_level)
+    keep = simplify_rings(ring_cols, -ring_rows, offsets, float(tolerance_px))
+    counts = np.add.reduceat(keep.astype(np.int64), offsets[:-1]) if offsets.size > 1 else np.empty(0, np.int64)
+
+    out = []
+    for li, level in enumerate(levels):
+        rings = np.nonzero(ring_level == li)[0]
+        if rings.size == 0:
+            out.append(ContourPolygons(level, []))
+            continue
+        a, b = offsets[rings[0]], offsets[rings[-1] + 1]
+        new_offsets = np.concatenate(([0], np.cumsum(counts[rings])))
+        level_keep = keep[a:b]
+        polygons = _assemble_polygons(grid, ring_rows[a:b][level_keep], ring_cols[a:b][level_keep], new_offsets)
+        out.append(ContourPolygons(level, polygons))
+    return out
+
+
+def store_contours(network_id, station_id, model: str, contours: list[ContourPolygons]) -> list[Contour]:
+    """
+    Replaces the station's core.contours rows of the same model and levels.
+    Levels without any polygon are only cleared.
+    """
+    levels = [c.level for c in contours]
+    Contour.query.filter(
+        Contour.station_id == station_id,
+        Contour.model == model,
+        Contour.field_strength_dbuvm.in_(levels),
+    ).delete(synchronize_session=False)
+
+    rows = [
+        Contour(
+            network_id=network_id,
+            station_id=station_id,
+            field_strength_dbuvm=c.level,
+            model=model,
+            geom=WKTElement(c.to_wkt(), srid=SRID),
+        )
+        for c in contours
+        if c.polygons
+    ]
+    insert_objects(rows)
+    return rows
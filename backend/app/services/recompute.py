@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import hashlib
+import json
+from dataclasses import dataclass, field
+
+from app.math.p1546 import TERRAIN_AVG_END_M
+from app.models import ProjectRevision
+from app.services.terrain import get_terrain_service
+
+# Revision run stages, in execution order.
+STAGES = ("contour", "interference", "rni", "opea")
+
+# Input groups each stage reads. "args" is the stage's own run arguments.
+STAGE_INPUTS = {
+    "contour": ("location", "site", "erp", "srid", "args"),
+    "interference": ("location", "erp", "cases", "args"),
+    "rni": ("location", "erp", "srid", "args"),
+    "opea": ("location", "args"),
+}
+
+# Stages whose results feed another stage: interference reads the
+# protected contour.
+STAGE_UPSTREAM = {
+    "interference": ("contour",),
+}
+
+
+def _fingerprint(value) -> str:
+    return hashlib.sha1(json.dumps(value, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def _first(rows):
+    return rows[0] if rows else None
+
+
+def revision_inputs(revision: ProjectRevision) -> dict:
+    """
+    Everything the stages read from a revision, split into input groups:
+    "location" (site coordinates), "site" (the rest of the station, plus
+    the version of the DEM tiles under its 3-15 km terrain averages, which
+    P.1546 contours read), "erp" (transmitter, feedline and antenna), "srid" (the only field of
+    inputs_snapshot the stages use) and "cases" (interference cases).
+    """
+    station = _first(revision.station)
+    transmitter = _first(revision.transmitter)
+    feedline = _first(revision.feedline)
+    antenna = _first(revision.antenna)
+    snapshot = revision.inputs_snapshot or {}
+
+    return {
+        "location": station and {"tx_lat": station.tx_lat, "tx_lon": station.tx_lon},
+        "site": station and {
+            "ground_alt_m": station.ground_alt_m,
+            "tower_height_agl_m": station.tower_height_agl_m,
+            "frequency_mhz": station.frequency_mhz,
+            "channel": station.channel,
+            "bandwidth_khz": station.bandwidth_khz,
+            "polarization": station.polarization,
+            "datum": station.datum,
+            "dem_version": get_terrain_service().dem_version(station.tx_lat, station.tx_lon, TERRAIN_AVG_END_M),
+        },
+        "erp": {
+            "transmitter": transmitter and {
+                "tx_power_w": transmitter.tx_power_w,
+                "losses_internal_db": transmitter.losses_internal_db,
+            },
+            "feedline": feedline and {
+                "length_m": feedline.length_m,
+                "attn_db_per_100m": feedline.attn_db_per_100m,
+                "connector_losses_db": feedline.connector_losses_db,
+            },
+            "antenna": antenna and {
+                "gain_dbd": antenna.gain_dbd,
+                "tilt_electrical_deg": antenna.tilt_electrical_deg,
+                "tilt_mechanical_deg": antenna.tilt_mechanical_deg,
+                "pattern_h_file_id": antenna.pattern_h_file_id,
+                "pattern_v_file_id": antenna.pattern_v_file_id,
+            },
+        },
+        "srid": int(snapshot.get("srid", 4674)),
+        "cases": sorted(
+            (
+                {
+                    "id": str(case.id),
+                    "victim_station_ref": case.victim_station_ref,
+                    "relationship": case.relationship,
+                    "du_required_db": case.du_required_db,
+                }
+                for case in revision.interference_cases
+            ),
+            key=lambda case: case["id"],
+        ),
+    }
+
+
+@dataclass
+class StagePlan:
+    stage: str
+    action: str  # "run" or "skip"
+    changed: list[str]
+    fingerprint: str
+    inputs: dict[str, str]
+    result: object = None
+
+
+@dataclass
+class RunPlan:
+    stages: dict[str, StagePlan] = field(default_factory=dict)
+
+    def to_dict(self) -> dict:
+        return {name: {"action": plan.action, "changed": plan.changed} for name, plan in self.stages.items()}
+
+
+def plan_revision_run(revision: ProjectRevision, stage_args: dict[str, dict], force: bool = False) -> RunPlan:
+    """
+    Diffs the revision's current inputs against the inputs recorded in
+    revision.run_state for each requested stage (stage_args: stage -> its
+    normalized run arguments) and marks a stage "skip", reusing its stored
+    result, when none of its input groups nor its upstream stages changed.
+    An ERP-only change therefore reruns contour and interference but not
+    OPEA, and an OPEA-only change reruns OPEA alone.
+    """
+    inputs = revision_inputs(revision)
+    state = revision.run_state or {}
+    plan = RunPlan()
+
+    for stage in STAGES:
+        if stage not in stage_args:
+            continue
+        groups = dict(inputs, args=stage_args[stage])
+        fingerprints = {name: _fingerprint(groups[name]) for name in STAGE_INPUTS[stage]}
+        for upstream in STAGE_UPSTREAM.get(stage, ()):
+            if upstream in plan.stages:
+                fingerprints[upstream] = plan.stages[upstream].fingerprint
+            elif upstream in state:
+                fingerprints[upstream] = state[upstream]["fingerprint"]
+        fingerprint = _fingerprint(fingerprints)
+
+        previous = state.get(stage)
+        if previous is None:
+            changed = sorted(fingerprints)
+        else:
+            changed = sorted(
+                name for name, value in fingerprints.items() if previous["inputs"].get(name) != value
+            )
+        # A rerun upstream stage produces new rows even with unchanged inputs.
+        for name in STAGE_UPSTREAM.get(stage, ()):
+            if name in plan.stages and plan.stages[name].action == "run" and name not in changed:
+                changed.append(name)
+        if force or changed:
+            plan.stages[stage] = StagePlan(stage, "run", changed, fingerprint, fingerprints)
+        else:
+            plan.stages[stage] = StagePlan(stage, "skip", [], fingerprint, fingerprints, previous.get("result"))
+    return plan
+
+
+def record_stage_result(revision: ProjectRevision, stage_plan: StagePlan, result) -> None:
+    """
+    Stores a stage's input fingerprints and result in revision.run_state
+    (caller commits).
+    """
+    state = dict(revision.run_state or {})
+    state[stage_plan.stage] = {
+        "fingerprint": stage_plan.fingerprint,
+        "inputs": stage_plan.inputs,
+        "result": result,
+    }
+    # Reassigned rather than mutated so the JSONB change is detected.
+    revision.run_state = state
+    stage_plan.result = result
@@ -7,8 +7,9 @@ from geoalchemy2.elements import WKTElement
 
 from app.extensions import db
 from app.models import RNIAssessment, RNIZone, ProjectRevision, Station
+from app.services.bulk import insert_objects
 from app.services.contour import erp_dbw
-from app.utils.geo import GeoPoint, build_polygon_wkt, destination_point, generate_radials
+from app.utils.geo import build_polygon_wkt_arrays, destination_points, generate_radials
 
 
 @dataclass(frozen=True)
@@ -35,10 +36,8 @@ def calc_r_compliance_far_field(eirp_w: float, k: float, s_lim: float) -> float:
 
 
 def _build_circle_polygon(lat: float, lon: float, radius_m: float) -> str:
-    points: list[GeoPoint] = []
-    for azimuth in generate_radials(5):
-        points.append(destination_point(lat, lon, azimuth, radius_m / 1000.0))
-    return build_polygon_wkt(points)
+    lats, lons = destination_points(lat, lon, generate_radials(5), radius_m / 1000.0)
+    return build_polygon_wkt_arrays(lats, lons)
 
 
 def run_rni_assessment(
@@ -84,8 +83,7 @@ def run_rni_assessment(
         ),
     ]
 
-    for zone in zones:
-        db.session.add(zone)
+    insert_objects(zones)
 
     db.session.commit()
 
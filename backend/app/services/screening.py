@@ -0,0 +1,532 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Callable
+
+import numpy as np
+from geoalchemy2 import Geography
+from sqlalchemy import and_, cast, func, or_
+
+from app.math.geodesy import inverse_points
+from app.math.p1546_native import distance_for_field, field_strength
+from app.models import AnatelStation
+from app.services.antenna import N_AZ, CompiledPattern, compile_pattern, compiled_anatel_pattern
+from app.services.channels import (
+    KIND_NAMES,
+    NO_RELATION,
+    RELATIONS,
+    ProtectionTable,
+    channel_frequency_mhz,
+    channel_from_frequency,
+    frequency_ranges,
+    load_protection_table,
+    parse_channel,
+    protected_field_dbuvm,
+    station_kind,
+)
+from app.services.interference import AggregateDU, FieldModel, aggregate_du, du_matrix
+from app.utils.geo import destination_points
+
+# Candidates farther than this from the proposed site are never screened.
+SCREEN_RADIUS_KM = 400.0
+
+# Wanted fields (protected contours) are E(50,50); interfering fields E(50,10).
+WANTED_TIME_PCT = 50.0
+INTERFERING_TIME_PCT = 10.0
+
+# Protected contours are evaluated on radials every 5 degrees.
+CONTOUR_STEP_DEG = 5
+
+# Reference antenna height when a station has none (FM planning rule).
+DEFAULT_HEFF_M = 40.0
+
+# Pairs per vectorized D/U batch.
+PAIR_CHUNK = 512
+
+DIRECTIONS = ("caused", "received")
+
+# Antenna height above average terrain per azimuth (degrees -> metres).
+HeffModel = Callable[[np.ndarray], np.ndarray]
+
+
+@dataclass(frozen=True)
+class ScreeningStation:
+    station_id: str | None
+    lat: float
+    lon: float
+    kind: int
+    channel: int
+    erp_kw: float
+    heff_m: float
+    pattern: CompiledPattern | None = None
+    service: str | None = None
+
+    @property
+    def frequency_mhz(self) -> float:
+        return float(channel_frequency_mhz(self.kind, self.channel))
+
+
+def station_from_study(study) -> ScreeningStation:
+    """
+    Proposed station of a ViabilityStudy. parametros_json may carry a
+    horizontal pattern ("pattern_h": list or azimuth -> gain mapping).
+    """
+    channel = parse_channel(study.canal)
+    kind = station_kind(study.service_type, channel)
+    if channel is None:
+        if not study.frequencia_mhz:
+            raise ValueError("Study needs a channel or a frequency")
+        channel = channel_from_frequency(kind, study.frequencia_mhz)
+    if not study.erp_kw:
+        raise ValueError("Study needs an ERP")
+    pattern_h = (study.parametros_json or {}).get("pattern_h")
+    return ScreeningStation(
+        station_id=None,
+        lat=study.latitude,
+        lon=study.longitude,
+        kind=kind,
+        channel=channel,
+        erp_kw=study.erp_kw,
+        heff_m=study.haat_m or study.altura_antena_m or DEFAULT_HEFF_M,
+        pattern=compile_pattern(pattern_h) if pattern_h else None,
+        service=study.service_type,
+    )
+
+
+def station_from_anatel(station: AnatelStation) -> ScreeningStation | None:
+    """
+    Screening view of an anatel_stations row; None without channel or ERP.
+    """
+    channel = parse_channel(station.canal)
+    kind = station_kind(station.service, channel)
+    if channel is None and station.frequencia_mhz:
+        channel = channel_from_frequency(kind, station.frequencia_mhz)
+    if channel is None or not station.erp_kw:
+        return None
+    return ScreeningStation(
+        station_id=str(station.id),
+        lat=station.latitude,
+        lon=station.longitude,
+        kind=kind,
+        channel=channel,
+        erp_kw=station.erp_kw,
+        heff_m=station.altura_m or DEFAULT_HEFF_M,
+        pattern=compiled_anatel_pattern(station) if station.pattern_dbd else None,
+        service=station.service,
+    )
+
+
+def station_from_v4(station, lat: float, lon: float) -> ScreeningStation | None:
+    """
+    Screening view of a V4Station (omnidirectional, the model has no
+    antenna link); None without channel or frequency.
+    """
+    channel = station.canal
+    kind = station_kind(station.service, channel)
+    if channel is None and station.freq_mhz:
+        channel = channel_from_frequency(kind, station.freq_mhz)
+    if channel is None:
+        return None
+    return ScreeningStation(
+        station_id=str(station.id),
+        lat=lat,
+        lon=lon,
+        kind=kind,
+        channel=channel,
+        # erp_dbm -> kW (60 dBm = 1 kW)
+        erp_kw=10 ** (((station.erp_dbm if station.erp_dbm is not None else 60.0) - 60.0) / 10.0),
+        heff_m=station.h_eff or station.htx or DEFAULT_HEFF_M,
+        service=station.service,
+    )
+
+
+@dataclass(frozen=True)
+class StationArrays:
+    """
+    Struct-of-arrays view of stations; patterns stacked as horizontal
+    relative gains on the compiled azimuth grid (zeros when omni).
+    """
+
+    lat: np.ndarray
+    lon: np.ndarray
+    kind: np.ndarray
+    channel: np.ndarray
+    frequency_mhz: np.ndarray
+    erp_kw: np.ndarray
+    heff_m: np.ndarray
+    pattern_db: np.ndarray
+
+    @classmethod
+    def from_stations(cls, stations: list[ScreeningStation]) -> "StationArrays":
+        kind = np.array([s.kind for s in stations], dtype=np.int64)
+        channel = np.array([s.channel for s in stations], dtype=np.int64)
+        pattern_db = np.zeros((len(stations), N_AZ), dtype=np.float32)
+        for i, station in enumerate(stations):
+            if station.pattern is not None:
+                pattern_db[i] = station.pattern.horizontal_db
+        return cls(
+            lat=np.array([s.lat for s in stations], dtype=np.float64),
+            lon=np.array([s.lon for s in stations], dtype=np.float64),
+            kind=kind,
+            channel=channel,
+            frequency_mhz=np.asarray(channel_frequency_mhz(kind, channel), dtype=np.float64),
+            erp_kw=np.array([s.erp_kw for s in stations], dtype=np.float64),
+            heff_m=np.array([s.heff_m for s in stations], dtype=np.float64),
+            pattern_db=pattern_db,
+        )
+
+    def gain_db(self, index, azimuth_deg) -> np.ndarray:
+        """
+        Relative horizontal gain of station index towards azimuth_deg
+        (broadcast), linear between the 1 degree pattern samples.
+        """
+        pos = np.mod(np.asarray(azimuth_deg, dtype=np.float64), 360.0) * (N_AZ / 360.0)
+        a0 = np.floor(pos).astype(np.int64) % N_AZ
+        w = pos - np.floor(pos)
+        return self.pattern_db[index, a0] * (1.0 - w) + self.pattern_db[index, (a0 + 1) % N_AZ] * w
+
+
+def contour_points(victims: StationArrays, step_deg: int = CONTOUR_STEP_DEG) -> tuple[np.ndarray, ...]:
+    """
+    Protected contour of every victim on radials every step_deg: (lat, lon,
+    wanted field) arrays shaped (n_victims, n_radials). Distances come from
+    one batched P.1546 inversion with per-radial ERP from the pattern;
+    identical radials (every radial of an omnidirectional station) are
+    inverted once.
+    """
+    azimuths = np.arange(0.0, 360.0, float(step_deg))
+    index = np.arange(victims.lat.size)[:, None]
+    wanted = protected_field_dbuvm(victims.kind, victims.channel)[:, None]
+    erp_kw = victims.erp_kw[:, None] * 10 ** (victims.gain_db(index, azimuths[None, :]) / 10.0)
+    inputs = np.broadcast_arrays(wanted, victims.frequency_mhz[:, None], victims.heff_m[:, None], erp_kw)
+    unique, inverse = np.unique(np.stack(inputs, axis=-1).reshape(-1, 4), axis=0, return_inverse=True)
+    radius_km = distance_for_field(
+        unique[:, 0],
+        unique[:, 1],
+        WANTED_TIME_PCT,
+        unique[:, 2],
+        erp_kw=unique[:, 3],
+        max_distance_km=SCREEN_RADIUS_KM,
+    )[inverse.ravel()].reshape(erp_kw.shape)
+    lats, lons = destination_points(
+        victims.lat[:, None], victims.lon[:, None], azimuths[None, :], np.maximum(radius_km, 0.1)
+    )
+    return lats, lons, np.broadcast_to(wanted, lats.shape)
+
+
+def reaches_contour(gap_km, target_dbuvm, freq_mhz, heff_m, erp_kw) -> np.ndarray:
+    """
+    Reach test of interferer -> victim pairs: True where the interferer's
+    E(50,10) still reaches target_dbuvm (protected field minus PR) gap_km
+    away, the separation minus the victim's contour radius. One field
+    evaluation per pair, rather than inverting for the interferer's reach.
+    """
+    gap_km = np.asarray(gap_km, dtype=np.float64)
+    field = field_strength(freq_mhz, INTERFERING_TIME_PCT, heff_m, np.maximum(gap_km, 1e-3), erp_kw=erp_kw)
+    return (gap_km <= 0.0) | (field >= target_dbuvm)
+
+
+def p1546_model(
+    interferers: StationArrays,
+    index,
+    erp_offset_db=0.0,
+    heff_model: HeffModel | None = None,
+) -> FieldModel:
+    """
+    du_matrix field model: E(50,10) of interferers[index] (one per row,
+    or per element when index is 2-D), each with its pattern towards the
+    point and erp_offset_db (broadcast against the (N, P) matrix) added to
+    its ERP. heff_model replaces the stations' single HAAT with one per
+    azimuth.
+    """
+    index = np.asarray(index, dtype=np.int64)
+    if index.ndim < 2:
+        index = index.reshape(-1, 1)
+
+    def model(distance_km: np.ndarray, azimuth_deg: np.ndarray) -> np.ndarray:
+        gain_db = interferers.gain_db(index, azimuth_deg) + erp_offset_db
+        return field_strength(
+            interferers.frequency_mhz[index],
+            INTERFERING_TIME_PCT,
+            interferers.heff_m[index] if heff_model is None else heff_model(azimuth_deg),
+            distance_km,
+            erp_kw=interferers.erp_kw[index] * 10 ** (gain_db / 10.0),
+        )
+
+    return model
+
+
+@dataclass(frozen=True)
+class ScreeningPair:
+    direction: str  # "caused" (proposed interferes) or "received"
+    station_id: str
+    service: str | None
+    channel: int
+    kind: str
+    relation: str
+    pr_db: float
+    distance_km: float
+    worst_margin_db: float
+    worst_azimuth_deg: float
+
+    @property
+    def passed(self) -> bool:
+        return self.worst_margin_db >= 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "direction": self.direction,
+            "station_id": self.station_id,
+            "service": self.service,
+            "channel": self.channel,
+            "kind": self.kind,
+            "relation": self.relation,
+            "pr_db": self.pr_db,
+            "distance_km": round(self.distance_km, 3),
+            "worst_margin_db": round(self.worst_margin_db, 2),
+            "worst_azimuth_deg": self.worst_azimuth_deg,
+            "passed": self.passed,
+        }
+
+
+@dataclass(frozen=True)
+class ScreeningResult:
+    candidates: int
+    related: int
+    in_reach: int
+    pairs: list[ScreeningPair] = field(default_factory=list)
+    # Power sum of the received interference on the proposed contour.
+    aggregate: AggregateDU | None = None
+    aggregate_ids: list[str] = field(default_factory=list)
+
+    @property
+    def passed(self) -> bool:
+        return all(pair.passed for pair in self.pairs) and (self.aggregate is None or self.aggregate.passed)
+
+    def aggregate_dict(self) -> dict | None:
+        if self.aggregate is None:
+            return None
+        worst = self.aggregate.worst_index
+        return {
+            "passed": self.aggregate.passed,
+            "worst_margin_db": round(float(self.aggregate.margin_db[worst]), 2),
+            "worst_azimuth_deg": float(worst * CONTOUR_STEP_DEG),
+            "top_offenders": [
+                {"station_id": self.aggregate_ids[row], "weighted_dbuvm": round(weighted, 2), "share": round(share, 3)}
+                for row, weighted, share in self.aggregate.offenders(worst)
+            ],
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "passed": self.passed,
+            "candidates": self.candidates,
+            "related": self.related,
+            "in_reach": self.in_reach,
+            "pairs": [pair.to_dict() for pair in sorted(self.pairs, key=lambda p: p.worst_margin_db)],
+            "aggregate": self.aggregate_dict(),
+        }
+
+
+def screening_filter(
+    geom,
+    frequency,
+    proposed: ScreeningStation,
+    table: ProtectionTable,
+    radius_km: float,
+    channels=None,
+):
+    """
+    SQL filter for rows within radius_km of the proposed site (ST_DWithin
+    on geography) on a frequency that interacts with its channel (or with
+    any of `channels`); rows without a frequency are kept. None when no
+    channel interacts.
+    """
+    related = [table.related(proposed.kind, channel) for channel in (channels or [proposed.channel])]
+    ranges = frequency_ranges(
+        np.concatenate([kinds for kinds, _ in related]), np.concatenate([chans for _, chans in related])
+    )
+    if not ranges:
+        return None
+    site = cast(func.ST_SetSRID(func.ST_MakePoint(proposed.lon, proposed.lat), 4674), Geography)
+    spectral = or_(
+        frequency.is_(None),
+        *(frequency.between(lo - 1e-6, hi + 1e-6) for lo, hi in ranges),
+    )
+    return and_(func.ST_DWithin(cast(geom, Geography), site, radius_km * 1000.0), spectral)
+
+
+def candidate_stations(
+    proposed: ScreeningStation,
+    table: ProtectionTable,
+    radius_km: float = SCREEN_RADIUS_KM,
+) -> list[AnatelStation]:
+    """
+    anatel_stations rows passing screening_filter (GiST index on
+    geom::geography, btree on frequencia_mhz).
+    """
+    condition = screening_filter(AnatelStation.geom, AnatelStation.frequencia_mhz, proposed, table, radius_km)
+    if condition is None:
+        return []
+    return AnatelStation.query.filter(condition).all()
+
+
+def caused_margins(
+    interferer: StationArrays,
+    contours: tuple[np.ndarray, ...],
+    pr_db: np.ndarray,
+    erp_offset_db: np.ndarray,
+    index=None,
+    heff_model: HeffModel | None = None,
+) -> np.ndarray:
+    """
+    D/U margins of one site against the contours of many victims (one row
+    each): every batch is a 1 x (PAIR_CHUNK * n radials) D/U matrix,
+    folded back per victim. interferer holds the site, row 0 unless index
+    gives one row per victim (the site on several channels).
+    """
+    lats, lons, wanted = contours
+    n_radials = lats.shape[1]
+    index = np.zeros(lats.shape[0], dtype=np.int64) if index is None else np.asarray(index, dtype=np.int64)
+    margins = np.empty(lats.shape, dtype=np.float64)
+    for start in range(0, lats.shape[0], PAIR_CHUNK):
+        chunk = slice(start, start + PAIR_CHUNK)
+        offset = np.repeat(erp_offset_db[chunk], n_radials)
+        rows = np.repeat(index[chunk], n_radials)[None, :]
+        matrix = du_matrix(
+            interferer.lat[0], interferer.lon[0], lats[chunk], lons[chunk], wanted[chunk].ravel(),
+            np.repeat(pr_db[chunk], n_radials), p1546_model(interferer, rows, offset, heff_model),
+        )
+        margins[chunk] = matrix.margin_db.reshape(-1, n_radials)
+    return margins
+
+
+def received_margins(
+    interferers: StationArrays,
+    index: np.ndarray,
+    contours: tuple[np.ndarray, ...],
+    pr_db: np.ndarray,
+    erp_offset_db: np.ndarray,
+) -> np.ndarray:
+    """
+    D/U margins of interferers[index] against one victim contour (the
+    first row of contours), PAIR_CHUNK rows per D/U matrix.
+    """
+    lats, lons, wanted = contours
+    margins = np.empty((index.size, lats.shape[1]), dtype=np.float64)
+    for start in range(0, index.size, PAIR_CHUNK):
+        chunk = slice(start, start + PAIR_CHUNK)
+        matrix = du_matrix(
+            interferers.lat[index[chunk]], interferers.lon[index[chunk]], lats[0], lons[0], wanted[0],
+            pr_db[chunk][:, None], p1546_model(interferers, index[chunk], erp_offset_db[chunk][:, None]),
+        )
+        margins[chunk] = matrix.margin_db
+    return margins
+
+
+def screen_station(
+    proposed: ScreeningStation,
+    candidates: list[ScreeningStation],
+    table: ProtectionTable | None = None,
+) -> ScreeningResult:
+    """
+    Screens a proposed station against candidate stations in both
+    directions. Pairs are pruned first by the channel table, then by reach
+    (the interferer's E(50,10) distance to the victim's protected field
+    minus the protection ratio, plus the victim's contour radius, must
+    exceed their separation); D/U is computed only for the survivors, in
+    vectorized batches over their protected-contour radials. Received
+    interference is also power-summed on the proposed contour.
+    """
+    table = table or load_protection_table()
+    if not candidates:
+        return ScreeningResult(0, 0, 0, [])
+
+    prop = StationArrays.from_stations([proposed])
+    cand = StationArrays.from_stations(candidates)
+    n = len(candidates)
+    separation_km = inverse_points(np.full(n, proposed.lat), np.full(n, proposed.lon), cand.lat, cand.lon)[0] / 1000.0
+
+    # (interferers, index, victims, index) per direction.
+    zeros = np.zeros(n, dtype=np.int64)
+    everyone = np.arange(n)
+    directions = {
+        "caused": (prop, zeros, cand, everyone),
+        "received": (cand, everyone, prop, zeros),
+    }
+
+    pairs: list[ScreeningPair] = []
+    related = 0
+    in_reach = 0
+    aggregate = None
+    aggregate_ids: list[str] = []
+    for direction, (interferers, ii, victims, vi) in directions.items():
+        relation, pr_db, erp_offset_db = table.lookup(
+            interferers.kind[ii], interferers.channel[ii], victims.kind[vi], victims.channel[vi]
+        )
+        keep = np.nonzero(relation != NO_RELATION)[0]
+        related += keep.size
+        if keep.size == 0:
+            continue
+
+        wanted = protected_field_dbuvm(victims.kind[vi[keep]], victims.channel[vi[keep]])
+        victim_radius = distance_for_field(
+            wanted,
+            victims.frequency_mhz[vi[keep]],
+            WANTED_TIME_PCT,
+            victims.heff_m[vi[keep]],
+            erp_kw=victims.erp_kw[vi[keep]],
+            max_distance_km=SCREEN_RADIUS_KM,
+        )
+        keep = keep[reaches_contour(
+            separation_km[keep] - victim_radius,
+            wanted - pr_db[keep],
+            interferers.frequency_mhz[ii[keep]],
+            interferers.heff_m[ii[keep]],
+            interferers.erp_kw[ii[keep]] * 10 ** (erp_offset_db[keep] / 10.0),
+        )]
+        in_reach += keep.size
+        if keep.size == 0:
+            continue
+
+        pr_keep = pr_db[keep].astype(np.float64)
+        offset_keep = erp_offset_db[keep].astype(np.float64)
+        if direction == "caused":
+            contours = contour_points(StationArrays.from_stations([candidates[k] for k in keep]))
+            margins = caused_margins(prop, contours, pr_keep, offset_keep)
+        else:
+            contours = contour_points(prop)
+            margins = received_margins(cand, keep, contours, pr_keep, offset_keep)
+            aggregate = aggregate_du(contours[2][0], margins)
+            aggregate_ids = [candidates[k].station_id for k in keep]
+        worst_radial = np.argmin(margins, axis=1)
+        worst = margins[np.arange(keep.size), worst_radial]
+        for k, margin, radial in zip(keep.tolist(), worst.tolist(), worst_radial.tolist()):
+            other = candidates[k]
+            pairs.append(ScreeningPair(
+                direction=direction,
+                station_id=other.station_id,
+                service=other.service,
+                channel=other.channel,
+                kind=KIND_NAMES[other.kind],
+                relation=RELATIONS[int(relation[k])],
+                pr_db=float(pr_db[k]),
+                distance_km=float(separation_km[k]),
+                worst_margin_db=margin,
+                worst_azimuth_deg=float(radial * CONTOUR_STEP_DEG),
+            ))
+
+    return ScreeningResult(
+        candidates=n, related=related, in_reach=in_reach, pairs=pairs, aggregate=aggregate, aggregate_ids=aggregate_ids
+    )
+
+
+def screen_study(study, radius_km: float = SCREEN_RADIUS_KM) -> ScreeningResult:
+    """
+    Screens a ViabilityStudy's proposed station against anatel_stations.
+    """
+    table = load_protection_table()
+    proposed = station_from_study(study)
+    rows = candidate_stations(proposed, table, radius_km)
+    candidates = [s for s in (station_from_anatel(row) for row in rows) if s is not None]
+    return screen_station(proposed, candidates, table)
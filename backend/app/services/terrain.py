@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import hashlib
+import math
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from functools import lru_cache
+
+import numpy as np
+from flask import current_app
+
+from app.math.terrain import EARTH_RADIUS, empty_tile_list, sample_points, sample_profiles, sample_radials
+from app.utils.geo import WGS84, destination_points
+
+# 3-arc-second (SRTM3) and 1-arc-second (SRTM1) tiles.
+HGT_SIZES = (1201, 3601)
+
+
+@dataclass(frozen=True)
+class HGTTile:
+    lat_min: int
+    lon_min: int
+    path: str
+    size: int
+    data: np.ndarray
+
+
+def hgt_filename(lat_min: int, lon_min: int) -> str:
+    ns = "N" if lat_min >= 0 else "S"
+    ew = "E" if lon_min >= 0 else "W"
+    return f"{ns}{abs(lat_min):02d}{ew}{abs(lon_min):03d}.hgt"
+
+
+def open_hgt_tile(path: str, lat_min: int, lon_min: int) -> HGTTile:
+    size = int(round(math.sqrt(os.path.getsize(path) / 2)))
+    if size not in HGT_SIZES:
+        raise ValueError(f"Unsupported HGT tile size for {path}")
+    mm = np.memmap(path, dtype=np.uint16, mode="r", shape=(size, size))
+    # Plain ndarray view over the map: numba rejects np.memmap subclasses and
+    # big-endian dtypes, the kernels byteswap on read instead.
+    data = np.ndarray(mm.shape, dtype=np.uint16, buffer=mm)
+    return HGTTile(lat_min=lat_min, lon_min=lon_min, path=path, size=size, data=data)
+
+
+def circle_bbox(lat: float, lon: float, radius_m: float) -> tuple[float, float, float, float]:
+    """
+    (lat_min, lat_max, lon_min, lon_max) enclosing a circle of radius_m.
+    """
+    d_lat = math.degrees(radius_m / EARTH_RADIUS) + 1e-6
+    lat_min = max(lat - d_lat, -90.0)
+    lat_max = min(lat + d_lat, 89.999999)
+    cos_lat = math.cos(math.radians(max(abs(lat_min), abs(lat_max))))
+    d_lon = min(d_lat / max(cos_lat, 1e-6), 180.0)
+    return lat_min, lat_max, lon - d_lon, lon + d_lon
+
+
+class TerrainService:
+    """
+    Samples SRTM .hgt tiles through memory maps, keeping at most
+    `max_open_tiles` maps open (least recently used are dropped first).
+    """
+
+    def __init__(self, dem_dir: str, max_open_tiles: int = 64):
+        self.dem_dir = dem_dir
+        self.max_open_tiles = max_open_tiles
+        self._tiles: OrderedDict[tuple[int, int], HGTTile | None] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def tile(self, lat_min: int, lon_min: int) -> HGTTile | None:
+        key = (lat_min, lon_min)
+        with self._lock:
+            if key in self._tiles:
+                self._tiles.move_to_end(key)
+                return self._tiles[key]
+
+        path = os.path.join(self.dem_dir, hgt_filename(lat_min, lon_min))
+        tile = open_hgt_tile(path, lat_min, lon_min) if os.path.exists(path) else None
+
+        with self._lock:
+            self._tiles[key] = tile
+            self._tiles.move_to_end(key)
+            while len(self._tiles) > self.max_open_tiles:
+                self._tiles.popitem(last=False)
+        return tile
+
+    def _tile_set(self, lat_min: float, lat_max: float, lon_min: float, lon_max: float):
+        lat0 = int(math.floor(lat_min))
+        lon0 = int(math.floor(lon_min))
+        n_lat = int(math.floor(lat_max)) - lat0 + 1
+        n_lon = int(math.floor(lon_max)) - lon0 + 1
+
+        tiles = empty_tile_list()
+        tile_index = np.full((n_lat, n_lon), -1, dtype=np.int32)
+        for i in range(n_lat):
+            for j in range(n_lon):
+                tile = self.tile(lat0 + i, lon0 + j)
+                if tile is not None:
+                    tile_index[i, j] = len(tiles)
+                    tiles.append(tile.data)
+        return tiles, tile_index, lat0, lon0
+
+    def sample(self, lats, lons) -> np.ndarray:
+        """
+        Bilinear elevations (m) for arrays of coordinates of any shape.
+        Missing tiles and voids are returned as 0 m.
+        """
+        lats = np.ascontiguousarray(lats, dtype=np.float64)
+        lons = np.ascontiguousarray(lons, dtype=np.float64)
+        if lats.shape != lons.shape:
+            raise ValueError("lats and lons must have the same shape")
+        if lats.size == 0:
+            return np.zeros(lats.shape, dtype=np.float64)
+
+        tiles, tile_index, lat0, lon0 = self._tile_set(
+            float(np.min(lats)), float(np.max(lats)), float(np.min(lons)), float(np.max(lons))
+        )
+        elev = sample_points(tiles, tile_index, lat0, lon0, lats.ravel(), lons.ravel())
+        return elev.reshape(lats.shape)
+
+    def radials(self, lat: float, lon: float, azimuths_deg, dist_m) -> np.ndarray:
+        """
+        Elevation matrix (n_azimuth, n_samples) for a fan of radials from
+        (lat, lon), sampled at the same distances (m) on every azimuth.
+        """
+        azimuths_deg = np.ascontiguousarray(azimuths_deg, dtype=np.float64)
+        dist_m = np.ascontiguousarray(dist_m, dtype=np.float64)
+        if azimuths_deg.size == 0 or dist_m.size == 0:
+            return np.zeros((azimuths_deg.size, dist_m.size), dtype=np.float64)
+
+        lat_min, lat_max, lon_min, lon_max = circle_bbox(lat, lon, float(np.max(dist_m)))
+        tiles, tile_index, lat0, lon0 = self._tile_set(lat_min, lat_max, lon_min, lon_max)
+        return sample_radials(tiles, tile_index, lat0, lon0, lat, lon, azimuths_deg, dist_m)
+
+    def profiles(self, lat: float, lon: float, azimuths_deg, dist_total_m, step_m: float = 100.0):
+        """
+        Terrain profiles from (lat, lon) to many points given by azimuth and
+        distance (m), each sampled every ~step_m. Returns (elev, n_valid):
+        elev is (n_profiles, max samples) padded with 0 past n_valid[r],
+        the layout expected by calc_deygout_loss_batch.
+        """
+        azimuths_deg = np.ascontiguousarray(azimuths_deg, dtype=np.float64).ravel()
+        dist_total_m = np.ascontiguousarray(dist_total_m, dtype=np.float64).ravel()
+        if azimuths_deg.shape != dist_total_m.shape:
+            raise ValueError("azimuths_deg and dist_total_m must have the same shape")
+        if step_m <= 0:
+            raise ValueError("step_m must be positive")
+
+        n_valid = np.maximum(np.ceil(dist_total_m / step_m).astype(np.int64) + 1, 2)
+        if azimuths_deg.size == 0:
+            return np.zeros((0, 2), dtype=np.float64), n_valid
+
+        lat_min, lat_max, lon_min, lon_max = circle_bbox(lat, lon, float(np.max(dist_total_m)))
+        tiles, tile_index, lat0, lon0 = self._tile_set(lat_min, lat_max, lon_min, lon_max)
+        elev = sample_profiles(
+            tiles, tile_index, lat0, lon0, lat, lon, azimuths_deg, dist_total_m, n_valid, int(n_valid.max())
+        )
+        return elev, n_valid
+
+    def dem_version(self, lat: float, lon: float, radius_m: float) -> str:
+        """
+        Fingerprint of the tiles (name, size, mtime) under a circle, used to
+        key results derived from the DEM.
+        """
+        lat_min, lat_max, lon_min, lon_max = circle_bbox(lat, lon, radius_m)
+        digest = hashlib.sha1()
+        for lat_tile in range(int(math.floor(lat_min)), int(math.floor(lat_max)) + 1):
+            for lon_tile in range(int(math.floor(lon_min)), int(math.floor(lon_max)) + 1):
+                tile = self.tile(lat_tile, lon_tile)
+                if tile is None:
+                    continue
+                stat = os.stat(tile.path)
+                digest.update(f"{os.path.basename(tile.path)}:{stat.st_size}:{int(stat.st_mtime)};".encode())
+        return digest.hexdigest()[:16]
+
+    def elevation(self, lat: float, lon: float) -> float:
+        return float(self.sample(np.array([lat]), np.array([lon]))[0])
+
+    def profile(
+        self,
+        lat1: float,
+        lon1: float,
+        lat2: float,
+        lon2: float,
+        resolution_m: float = 30.0,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Terrain profile along the geodesic from point 1 to point 2.
+        Returns (distance from point 1 in m, elevation AMSL in m).
+        """
+        inverse = WGS84.Inverse(lat1, lon1, lat2, lon2)
+        dist_total = inverse["s12"]
+        n_points = max(int(dist_total / resolution_m), 2)
+        dist_m = np.linspace(0.0, dist_total, n_points)
+        lats, lons = destination_points(lat1, lon1, inverse["azi1"], dist_m / 1000.0)
+
+        return dist_m, self.sample(lats, lons)
+
+
+@lru_cache(maxsize=None)
+def _terrain_service(dem_dir: str, max_open_tiles: int) -> TerrainService:
+    return TerrainService(dem_dir, max_open_tiles)
+
+
+def get_terrain_service() -> TerrainService:
+    """
+    Process-wide terrain service configured from the Flask app.
+    """
+    return _terrain_service(
+        current_app.config["DEM_DIR"],
+        int(current_app.config["DEM_TILE_CACHE_SIZE"]),
+    )
@@ -1,41 +1,51 @@
 
 import json
+from celery import chord
+from sqlalchemy import func, select
 from app.extensions import celery_app, db
 from app.models.v4 import Job, V4Station, Network
 from app.math.deygout import calc_deygout_loss
+from app.services.coverage import (
+    CoverageGrid,
+    CoverageParams,
+    aoi_from_params,
+    aoi_max_distance_m,
+    compute_and_store_block,
+    coverage_layer,
+)
+from app.services.composite import (
+    COMPOSITE_LAYERS,
+    StationCoverage,
+    composite_digest,
+    composite_layer,
+    compute_and_store_composite_block,
+    delete_composite_blocks,
+    overlapping_sources,
+    stale_composite_blocks,
+)
+from app.services.channel_search import search_site
+from app.services.haat import get_terrain_averages
+from app.services.links import LINK_PROFILE_STEP_M, evaluate_links, link_batch_path, write_link_batch
+from app.services.pathloss import cached_radial_field, get_path_loss_field
+from app.services.raster_contours import SIMPLIFY_TOLERANCE_PX, extract_contours, store_contours
+from app.services.screening import SCREEN_RADIUS_KM
+from app.services.terrain import get_terrain_service
+from app.utils.geo import destination_points
 import numpy as np
 
-# Mock implementation of profile extraction for now
-# In production this would read from indexed rasters
+def _geom_lat_lon(geom) -> tuple[float, float]:
+    lat, lon = db.session.execute(select(func.ST_Y(geom), func.ST_X(geom))).one()
+    return float(lat), float(lon)
+
 def extract_profile_from_rasters(tx_geom, rx_geom, resolution_m=30):
-    # Retrieve coordinates
-    # For MVP we return a dummy flat earth profile with some obstacles
-    lat1, lon1 = tx_geom.y, tx_geom.x
-    lat2, rx_lon = rx_geom.y, rx_geom.x
-    
-    # Calculate distance (Vincenty or Haversine)
-    # Simplified haversine for MVP
-    R = 6371000
-    phi1, phi2 = np.radians(lat1), np.radians(lat2)
-    dphi = np.radians(lat2 - lat1)
-    dlambda = np.radians(rx_lon - lon1)
-    a = np.sin(dphi/2)**2 + np.cos(phi1)*np.cos(phi2)*np.sin(dlambda/2)**2
-    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1-a))
-    dist_total = R * c
-    
-    n_points = int(dist_total / resolution_m)
-    dist_m = np.linspace(0, dist_total, n_points)
-    
-    # Dummy elevation: 100m flat + a hill in the middle
-    elev_m = np.full(n_points, 100.0)
-    
-    # Add a hill at 50% distance
-    mid = n_points // 2
-    width = n_points // 10
-    hill = np.exp(-0.5 * ((np.arange(n_points) - mid) / width)**2) * 200 # 200m hill
-    elev_m += hill
-    
-    return dist_m, elev_m
+    """
+    Terrain profile between two station geometries, sampled from the
+    memory-mapped SRTM tiles under DEM_DIR.
+    Returns (dist_m, elev_m).
+    """
+    lat1, lon1 = _geom_lat_lon(tx_geom)
+    lat2, lon2 = _geom_lat_lon(rx_geom)
+    return get_terrain_service().profile(lat1, lon1, lat2, lon2, resolution_m=resolution_m)
 
 @celery_app.task(bind=True)
 def calculate_link_profile(self, job_id, tx_id, rx_id):
@@ -88,6 +98,108 @@ def calculate_link_profile(self, job_id, tx_id, rx_id):
         db.session.commit()
         raise e
 
+def _receiver_columns(receivers, rx_network_id, rx_h_m):
+    """
+    (ids, lats, lons, heights) of inline receivers ({"id", "lat", "lon",
+    "h_m"}) plus every station of rx_network_id.
+    """
+    ids, lats, lons, heights = [], [], [], []
+    for i, rx in enumerate(receivers or []):
+        ids.append(str(rx.get("id", i)))
+        lats.append(float(rx["lat"]))
+        lons.append(float(rx["lon"]))
+        heights.append(float(rx.get("h_m") or rx_h_m))
+    if rx_network_id:
+        rows = db.session.execute(
+            select(V4Station.id, func.ST_Y(V4Station.geom), func.ST_X(V4Station.geom), V4Station.htx)
+            .filter(V4Station.network_id == rx_network_id)
+        ).all()
+        for station_id, lat, lon, htx in rows:
+            ids.append(str(station_id))
+            lats.append(float(lat))
+            lons.append(float(lon))
+            heights.append(float(htx or rx_h_m))
+    return ids, lats, lons, heights
+
+@celery_app.task(bind=True)
+def calculate_link_batch(self, job_id, tx_id, receivers=None, rx_network_id=None, rx_h_m=10.0, model="p1546",
+                         step_m=LINK_PROFILE_STEP_M, **options):
+    """
+    Point-to-multipoint links from one station to thousands of receivers.
+    The per-receiver columns (loss, field, clearance, worst Fresnel ratio)
+    go to FILE_STORAGE_DIR/links/<job_id>.npz; Job.result_ref only keeps
+    the file path and a summary.
+    """
+    job = Job.query.get(job_id)
+    if not job:
+        return {"error": "Job not found"}
+
+    job.status = "running"
+    db.session.commit()
+
+    try:
+        tx = V4Station.query.get(tx_id)
+        if not tx:
+            raise ValueError("Station not found")
+        ids, lats, lons, heights = _receiver_columns(receivers, rx_network_id, rx_h_m)
+        if not ids:
+            raise ValueError("At least one receiver is required")
+
+        params = _coverage_params(tx, model, "pixel", dict(options, rx_h_m=float(rx_h_m)))
+        batch = evaluate_links(params, lats, lons, heights, rx_id=ids, step_m=float(step_m))
+        relative_path = link_batch_path(job.id)
+        write_link_batch(relative_path, batch)
+
+        result = {
+            "file": relative_path,
+            "format": "npz",
+            "columns": batch.columns,
+            "model": model,
+            **batch.summary(),
+        }
+        job.result_ref = result
+        job.status = "done"
+        job.progress = 100
+        db.session.commit()
+        return result
+
+    except Exception as e:
+        job.status = "error"
+        job.error = str(e)
+        db.session.commit()
+        raise e
+
+@celery_app.task(bind=True)
+def calculate_channel_search(self, job_id, lat, lon, service, erp_kw, h_agl_m, channels=None, pattern_h=None,
+                             radius_km=SCREEN_RADIUS_KM):
+    """
+    Ranks the channels of the service's band at a site by compatibility
+    with the existing stations (see channel_search.search_site).
+    """
+    job = Job.query.get(job_id)
+    if not job:
+        return {"error": "Job not found"}
+
+    job.status = "running"
+    db.session.commit()
+
+    try:
+        result = search_site(
+            float(lat), float(lon), service, float(erp_kw), float(h_agl_m),
+            channels=channels, pattern_h=pattern_h, radius_km=float(radius_km),
+        ).to_dict()
+        job.result_ref = result
+        job.status = "done"
+        job.progress = 100
+        db.session.commit()
+        return result
+
+    except Exception as e:
+        job.status = "error"
+        job.error = str(e)
+        db.session.commit()
+        raise e
+
 @celery_app.task(bind=True)
 def calculate_coverage(self, job_id, tx_id, radius_km=50.0, step_km=1.0):
     """
@@ -116,59 +228,31 @@ def calculate_coverage(self, job_id, tx_id, radius_km=50.0, step_km=1.0):
         erp_mw = 10**( (tx.erp_dbm or 60.0) / 10.0 )
         erp_kw = erp_mw / 1_000_000.0
         
-        tx_h_agl = tx.htx or 30.0
-        # tx_ground = ... need DEM ...
-        # For MVP we assume flat earth or fetch from DEM if possible.
-        # We need a proper way to get DEM.
-        # For now, let's use a placeholder for terrain height fetching.
-        
         # We'll compute 36 radials (every 10 deg)
-        points = []
-        
-        lat0 = tx.geom.y
-        lon0 = tx.geom.x
-        
-        # We need projected coordinates for distance/azimuth usually, but for low precision we use spherical.
-        # Py1546 needs heff. 
-        # heff = h_agl + h_ground - avg_terrain(3-15km).
-        # We'll assume heff = h_agl for now to avoid complexity of DEM fetching in this task file without raster access.
-        # TODO: Inject RasterService or similar.
-        
-        heff = tx_h_agl # Simplification
+        azimuths = np.arange(0, 360, 10)
+        dists = np.arange(1, int(radius_km) + 1, int(step_km or 1), dtype=np.float64)
+
+        # heff = h_agl + h_ground - avg_terrain(3-15km), cached per site and DEM version.
+        # The 1 kW field on the 1 km fan is cached on disk per site geometry;
+        # the station ERP is an offset on top of it.
+        params = _coverage_params(tx, "p1546", "radial", {})
+        lat0, lon0 = params.tx_lat, params.tx_lon
+        fan = get_path_loss_field(params, 10.0, 1000.0, int(radius_km) + 1)
+        es = fan.field(10.0 * np.log10(erp_kw * 1000.0))[:, dists.astype(np.int64)]
+
+        p_lat, p_lon = destination_points(lat0, lon0, azimuths[:, None], dists[None, :])
         
-        from app.math.p1546 import calc_p1546_point
-         
-        for az in range(0, 360, 10):
-            # Compute points along radial
-            for dist in range(1, int(radius_km)+1, int(step_km or 1)):
-                 # Calculate lat/lon of point
-                 # Simple flat earth approximation for small distances
-                 # lat = lat0 + (dist/111) * cos(az)
-                 # lon = lon0 + (dist/(111*cos(lat))) * sin(az)
-                 
-                 rad = np.radians(az)
-                 d_deg = dist / 111.0 # Rough degrees
-                 
-                 p_lat = lat0 + d_deg * np.cos(rad)
-                 p_lon = lon0 + d_deg * np.sin(rad) / np.cos(np.radians(lat0))
-                 
-                 es, loss = calc_p1546_point(
-                     freq_mhz=freq,
-                     time_pct=50,
-                     tx_h_eff=heff,
-                     rx_h=10.0, # Standard mobile height
-                     distance_km=float(dist),
-                     env_type='Rural', # Default
-                     tx_erp_kw=erp_kw
-                 )
-                 
-                 points.append({
-                     "lat": p_lat,
-                     "lon": p_lon,
-                     "val": round(es, 1),
-                     "dist": dist,
-                     "az": az
-                 })
+        points = [
+            {
+                "lat": float(p_lat[i, j]),
+                "lon": float(p_lon[i, j]),
+                "val": round(float(es[i, j]), 1),
+                "dist": int(dists[j]),
+                "az": int(azimuths[i]),
+            }
+            for i in range(azimuths.size)
+            for j in range(dists.size)
+        ]
                  
         result = {
             "points": points,
@@ -189,3 +273,304 @@ def calculate_coverage(self, job_id, tx_id, radius_km=50.0, step_km=1.0):
         db.session.commit()
         raise e
 
+
+def _station_erp_kw(tx) -> float:
+    # erp_dbm -> mW -> kW (60 dBm = 1 kW)
+    return 10 ** ((tx.erp_dbm or 60.0) / 10.0) / 1_000_000.0
+
+def _coverage_params(tx, model, mode, options) -> CoverageParams:
+    lat0, lon0 = _geom_lat_lon(tx.geom)
+    averages = get_terrain_averages(lat0, lon0, step_deg=1.0)
+    return CoverageParams(
+        tx_lat=lat0,
+        tx_lon=lon0,
+        freq_mhz=tx.freq_mhz or 100.0,
+        erp_kw=_station_erp_kw(tx),
+        tx_h_agl=tx.htx or 30.0,
+        model=model,
+        mode=mode,
+        heff_step_deg=averages.step_deg,
+        ground_alt_m=averages.ground_alt_m,
+        avg_terrain_m=tuple(round(float(v), 2) for v in averages.avg_terrain_m),
+        dem_version=averages.dem_version,
+        **options,
+    )
+
+@celery_app.task
+def calculate_coverage_block(station_id, params, aoi, resolution_m, x, y):
+    """
+    Computes and stores one 256x256 coverage block; schedulable on its own.
+    """
+    stored = compute_and_store_block(
+        station_id,
+        CoverageParams.from_dict(params),
+        CoverageGrid(resolution_m),
+        aoi_from_params(aoi),
+        x,
+        y,
+    )
+    db.session.commit()
+    return {"x": x, "y": y, "stored": stored}
+
+@celery_app.task
+def finalize_coverage_raster(block_results, job_id, result):
+    job = Job.query.get(job_id)
+    result = dict(result)
+    result["blocks"] = [[b["x"], b["y"]] for b in block_results if b["stored"]]
+    if job:
+        job.result_ref = result
+        job.status = "done"
+        job.progress = 100
+        db.session.commit()
+    return result
+
+@celery_app.task
+def fail_coverage_raster(request, exc, traceback, job_id):
+    """
+    Errback of the block chords: a failed block task means finalize never
+    runs, so the job is marked as failed here.
+    """
+    job = Job.query.get(job_id)
+    if job:
+        job.status = "error"
+        job.error = str(exc)
+        db.session.commit()
+
+@celery_app.task(bind=True)
+def calculate_coverage_raster(self, job_id, tx_id, aoi, resolution_m=100.0, model="p1546", mode="pixel",
+                              **options):
+    """
+    Coverage raster over an AOI (GeoJSON Polygon/MultiPolygon, circle or
+    bbox, see aoi_from_params) on the global block grid. Every 256x256
+    block is a calculate_coverage_block task writing a float32 payload to
+    grid.field_tiles; the job completes when all blocks are done.
+    mode="radial" computes one dense radial fan here and resamples it onto
+    every block in this task instead (fast previews); mode="adaptive"
+    refines each block only around options["levels_dbuvm"].
+    options are passed to CoverageParams (rx_h_m, time_pct, k_factor...).
+    """
+    job = Job.query.get(job_id)
+    if not job:
+        return {"error": "Job not found"}
+
+    job.status = "running"
+    db.session.commit()
+
+    try:
+        tx = V4Station.query.get(tx_id)
+        if not tx:
+            raise ValueError("Station not found")
+
+        area = aoi_from_params(aoi)
+        grid = CoverageGrid(float(resolution_m))
+        params = _coverage_params(tx, model, mode, options)
+        # Persist the terrain averages before the blocks run.
+        db.session.commit()
+
+        blocks = grid.blocks(*area.bbox)
+        result = {
+            "station_id": str(tx.id),
+            "layer": coverage_layer(params, area),
+            "z": grid.z,
+            "resolution_m": grid.resolution_m,
+            "pixel_deg": grid.pixel_deg,
+            "block_size": grid.block_size,
+            "model": params.model,
+            "mode": params.mode,
+            "nodata": None,
+        }
+
+        if params.mode == "radial":
+            radial = cached_radial_field(params, grid, aoi_max_distance_m(params, area))
+            stored = []
+            for i, (x, y) in enumerate(blocks):
+                if compute_and_store_block(tx.id, params, grid, area, x, y, radial=radial):
+                    stored.append([x, y])
+                job.progress = int(100 * (i + 1) / len(blocks))
+                db.session.commit()
+            result["blocks"] = stored
+            job.result_ref = result
+            job.status = "done"
+            job.progress = 100
+            db.session.commit()
+            return result
+
+        header = [
+            calculate_coverage_block.s(str(tx.id), params.to_dict(), aoi, grid.resolution_m, x, y)
+            for x, y in blocks
+        ]
+        chord(header)(
+            finalize_coverage_raster.s(str(job_id), result).on_error(fail_coverage_raster.s(str(job_id)))
+        )
+        return result
+
+    except Exception as e:
+        job.status = "error"
+        job.error = str(e)
+        db.session.commit()
+        raise e
+
+
+@celery_app.task
+def calculate_composite_block(network_id, sources, digest, resolution_m, x, y, threshold_dbuvm):
+    """
+    Merges the station blocks overlapping one composite block (computing
+    the missing ones) into the max/best/count layers.
+    """
+    status = compute_and_store_composite_block(
+        network_id,
+        [StationCoverage.from_dict(s) for s in sources],
+        CoverageGrid(resolution_m),
+        digest,
+        x,
+        y,
+        threshold_dbuvm,
+    )
+    db.session.commit()
+    return {"x": x, "y": y, "stored": status != "empty", "status": status}
+
+@celery_app.task(bind=True)
+def calculate_network_coverage(self, job_id, network_id, resolution_m=100.0, model="p1546", mode="pixel",
+                               threshold_dbuvm=54.0, radius_km=None, **options):
+    """
+    Composite coverage of every station of a network: max field, best
+    server and server count (stations >= threshold_dbuvm) layers, one
+    calculate_composite_block task per block. Each station keeps its own
+    cached blocks over a circle of radius_km (default: its d_max, else
+    50 km), so only composite blocks whose set of station layers changed
+    are merged again; composite tiles no station reaches any more are
+    dropped. In mode="radial" each station's fan comes from the path-loss
+    cache, filled here before the blocks run.
+    """
+    job = Job.query.get(job_id)
+    if not job:
+        return {"error": "Job not found"}
+
+    job.status = "running"
+    db.session.commit()
+
+    try:
+        network = Network.query.get(network_id)
+        if not network:
+            raise ValueError("Network not found")
+
+        grid = CoverageGrid(float(resolution_m))
+        sources = []
+        for tx in sorted(network.stations, key=lambda s: str(s.id)):
+            params = _coverage_params(tx, model, mode, options)
+            radius = float(radius_km or tx.d_max or 50.0)
+            aoi = {"center": [params.tx_lat, params.tx_lon], "radius_km": radius}
+            sources.append(StationCoverage(str(tx.id), params, aoi))
+        if not sources:
+            raise ValueError("Network has no stations")
+        # Persist the terrain averages before the blocks run.
+        db.session.commit()
+
+        blocks = set()
+        for source in sources:
+            blocks.update(grid.blocks(*source.aoi.bbox))
+            # Fill the path-loss cache once instead of in every block task.
+            source.radial_field(grid)
+        digest = composite_digest(model, grid.resolution_m, float(threshold_dbuvm), dict(options, mode=mode))
+        # Blocks no current station reaches keep no composite tiles.
+        removed = delete_composite_blocks(
+            network.id, digest, grid.z, stale_composite_blocks(network.id, digest, grid.z, blocks)
+        )
+        db.session.commit()
+        result = {
+            "network_id": str(network.id),
+            "layers": {kind: composite_layer(kind, digest) for kind in COMPOSITE_LAYERS},
+            "z": grid.z,
+            "resolution_m": grid.resolution_m,
+            "pixel_deg": grid.pixel_deg,
+            "block_size": grid.block_size,
+            "model": model,
+            "mode": mode,
+            "threshold_dbuvm": float(threshold_dbuvm),
+            "stations": [s.station_id for s in sources],
+            "removed_tiles": removed,
+        }
+
+        header = []
+        for x, y in sorted(blocks):
+            # Each block task only receives the stations overlapping it.
+            block_sources = [s.to_dict() for s in overlapping_sources(sources, grid, x, y)]
+            header.append(calculate_composite_block.s(
+                str(network.id), block_sources, digest, grid.resolution_m, x, y, float(threshold_dbuvm)
+            ))
+        chord(header)(
+            finalize_coverage_raster.s(str(job_id), result).on_error(fail_coverage_raster.s(str(job_id)))
+        )
+        return result
+
+    except Exception as e:
+        job.status = "error"
+        job.error = str(e)
+        db.session.commit()
+        raise e
+
+def _latest_coverage_result(station_id) -> dict | None:
+    job = (
+        Job.query.filter(
+            Job.type == "coverage_raster",
+            Job.status == "done",
+            Job.result_ref["station_id"].astext == str(station_id),
+        )
+        .order_by(Job.created_at.desc())
+        .first()
+    )
+    return job.result_ref if job else None
+
+@celery_app.task(bind=True)
+def regenerate_network_contours(self, job_id, network_id, levels, tolerance_px=SIMPLIFY_TOLERANCE_PX,
+                                station_ids=None):
+    """
+    Traces core.contours MultiPolygons at every level from the latest
+    finished coverage raster of each network station (or of station_ids),
+    replacing the station's previous contours of the same model and levels.
+    """
+    job = Job.query.get(job_id)
+    if not job:
+        return {"error": "Job not found"}
+
+    job.status = "running"
+    db.session.commit()
+
+    try:
+        network = Network.query.get(network_id)
+        if not network:
+            raise ValueError("Network not found")
+        if not levels:
+            raise ValueError("At least one contour level is required")
+
+        stations = network.stations
+        if station_ids:
+            wanted = {str(s) for s in station_ids}
+            stations = [tx for tx in stations if str(tx.id) in wanted]
+
+        done = {}
+        skipped = []
+        for i, tx in enumerate(stations):
+            coverage = _latest_coverage_result(tx.id)
+            if not coverage:
+                skipped.append(str(tx.id))
+                continue
+            grid = CoverageGrid(float(coverage["resolution_m"]), int(coverage["block_size"]))
+            contours = extract_contours(tx.id, coverage["layer"], grid, levels, tolerance_px=tolerance_px)
+            rows = store_contours(network.id, tx.id, coverage["model"], contours)
+            done[str(tx.id)] = [str(row.id) for row in rows]
+            job.progress = int(100 * (i + 1) / len(stations))
+            db.session.commit()
+
+        result = {"contours": done, "skipped": skipped, "levels": [float(v) for v in levels]}
+        job.result_ref = result
+        job.status = "done"
+        job.progress = 100
+        db.session.commit()
+        return result
+
+    except Exception as e:
+        job.status = "error"
+        job.error = str(e)
+        db.session.commit()
+        raise e
@@ -1,33 +1,71 @@
 from __future__ import annotations
 
-from app.extensions import celery_app
-from app.models import Contour, ProjectRevision
-from app.services.contour import compute_contour
+import numpy as np
+
+from app.extensions import celery_app, db
+from app.models import Contour, ProjectRevision, ViabilityStudy
+from app.services.contour import compute_contours
 from app.services.export import export_kml, export_mosaico_txt, export_shapefile
-from app.services.interference import run_interference_case
+from app.services.interactions import sync_anatel_index, sync_v4_index
+from app.services.interference import run_interference_cases
 from app.services.opea import run_opea_assessment
 from app.services.rni import run_rni_assessment
+from app.services.screening import SCREEN_RADIUS_KM, screen_study
 
 
 @celery_app.task
-def run_contour(revision_id: str, threshold_dbuvm: float, step_deg: int = 5, step_km: float = 0.1):
+def run_contour(revision_id: str, threshold_dbuvm, step_deg: int = 5, step_km: float = 0.1, kinds=None,
+                **options):
+    """
+    threshold_dbuvm may be a list: one contour per level, computed together.
+    options go to compute_contours (method, pattern, time_pct, location_pct).
+    """
     revision = ProjectRevision.query.get(revision_id)
     if not revision:
         raise ValueError("Revision not found")
-    result = compute_contour(revision, threshold_dbuvm, step_deg=step_deg, step_km=step_km)
-    return {"contour_id": str(result.contour.id)}
+    thresholds = threshold_dbuvm if isinstance(threshold_dbuvm, (list, tuple)) else [threshold_dbuvm]
+    results = compute_contours(revision, thresholds, step_deg=step_deg, step_km=step_km, kinds=kinds, **options)
+    return {
+        "contour_id": str(results[0].contour.id),
+        "contours": [
+            {"threshold_dbuvm": result.contour.threshold_dbuvm, "contour_id": str(result.contour.id)}
+            for result in results
+        ],
+    }
 
 
 @celery_app.task
-def run_interference(revision_id: str):
+def run_interference(revision_id: str, aggregate: bool = False):
+    """
+    One entry per case; with aggregate, a dict {"cases": [...],
+    "aggregate": {...}} adding the power-summed margin at every test point
+    and the strongest cases at the worst one.
+    """
     revision = ProjectRevision.query.get(revision_id)
     if not revision:
         raise ValueError("Revision not found")
-    results = []
-    for case in revision.interference_cases:
-        result = run_interference_case(revision, case)
-        results.append({"case_id": str(result.case.id), "passed": result.passed})
-    return results
+    run = run_interference_cases(revision, list(revision.interference_cases), aggregate=aggregate)
+    results = [{"case_id": str(result.case.id), "passed": result.passed} for result in run.results]
+    if not aggregate:
+        return results
+    if run.aggregate is None:
+        return {"cases": results, "aggregate": None}
+
+    worst = run.aggregate.worst_index
+    point = run.points[worst]
+    return {
+        "cases": results,
+        "aggregate": {
+            "passed": run.aggregate.passed,
+            "worst_margin_db": float(run.aggregate.margin_db[worst]),
+            "worst_point": {"lat": point.lat, "lon": point.lon, "order_idx": point.order_idx},
+            "margin_db": np.round(run.aggregate.margin_db, 2).tolist(),
+            "top_offenders": [
+                {"case_id": str(run.results[row].case.id), "weighted_dbuvm": weighted, "share": share}
+                for row, weighted, share in run.aggregate.offenders(worst)
+            ],
+        },
+    }
 
 
 @celery_app.task
@@ -53,6 +91,38 @@ def run_opea(revision_id: str, aerodrome_ref: str | None = None, aerodrome_lat:
     return {"opea_id": str(result.assessment.id), "result": result.assessment.result}
 
 
+@celery_app.task
+def run_screening(study_id: str, radius_km: float = SCREEN_RADIUS_KM):
+    """
+    Screens a viability study against anatel_stations; the result is kept
+    under resultado_json["screening"].
+    """
+    study = ViabilityStudy.query.get(study_id)
+    if not study:
+        raise ValueError("Study not found")
+    result = screen_study(study, radius_km=radius_km).to_dict()
+    study.resultado_json = {**(study.resultado_json or {}), "screening": result}
+    db.session.commit()
+    return result
+
+
+@celery_app.task
+def reindex_interactions(source: str = "all", station_ids=None):
+    """
+    Re-screens stations whose parameters changed since the interaction
+    index last saw them: source "anatel", "v4" (optionally only
+    station_ids) or "all".
+    """
+    if source not in ("all", "anatel", "v4"):
+        raise ValueError("source must be all, anatel or v4")
+    results = {}
+    if source in ("all", "anatel"):
+        results["anatel"] = sync_anatel_index().to_dict()
+    if source in ("all", "v4"):
+        results["v4"] = sync_v4_index(station_ids).to_dict()
+    return results
+
+
 @celery_app.task
 def export_revision_kml(contour_id: str, export_dir: str):
     contour = Contour.query.get(contour_id)
@@ -3,8 +3,11 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Iterable
 
+import numpy as np
 from geographiclib.geodesic import Geodesic
 
+from app.math.geodesy import direct_points, inverse_points
+
 
 @dataclass(frozen=True)
 class GeoPoint:
@@ -31,6 +34,46 @@ def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     return result["s12"] / 1000.0
 
 
+def destination_points(lat, lon, azimuth_deg, distance_km) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Array form of destination_point: all arguments broadcast together.
+    Returns (lats, lons) arrays of the broadcast shape.
+    """
+    lat, lon, azimuth_deg, distance_km = np.broadcast_arrays(
+        np.asarray(lat, dtype=np.float64),
+        np.asarray(lon, dtype=np.float64),
+        np.asarray(azimuth_deg, dtype=np.float64),
+        np.asarray(distance_km, dtype=np.float64),
+    )
+    shape = lat.shape
+    lat2, lon2 = direct_points(
+        np.ascontiguousarray(lat).ravel(),
+        np.ascontiguousarray(lon).ravel(),
+        np.ascontiguousarray(azimuth_deg).ravel(),
+        np.ascontiguousarray(distance_km).ravel() * 1000.0,
+    )
+    return lat2.reshape(shape), lon2.reshape(shape)
+
+
+def distances_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """
+    Array form of distance_km: all arguments broadcast together.
+    """
+    lat1, lon1, lat2, lon2 = np.broadcast_arrays(
+        np.asarray(lat1, dtype=np.float64),
+        np.asarray(lon1, dtype=np.float64),
+        np.asarray(lat2, dtype=np.float64),
+        np.asarray(lon2, dtype=np.float64),
+    )
+    shape = lat1.shape
+    lat1, lon1, lat2, lon2 = (np.ascontiguousarray(a).ravel() for a in (lat1, lon1, lat2, lon2))
+    dist_m, _ = inverse_points(lat1, lon1, lat2, lon2)
+    # Vincenty does not converge for nearly antipodal pairs.
+    for i in np.flatnonzero(np.isnan(dist_m)):
+        dist_m[i] = WGS84.Inverse(lat1[i], lon1[i], lat2[i], lon2[i])["s12"]
+    return (dist_m / 1000.0).reshape(shape)
+
+
 def build_polygon_wkt(points: Iterable[GeoPoint]) -> str:
     coords = [(p.lon, p.lat) for p in points]
     if not coords:
@@ -39,3 +82,18 @@ def build_polygon_wkt(points: Iterable[GeoPoint]) -> str:
         coords.append(coords[0])
     coord_str = ", ".join(f"{lon} {lat}" for lon, lat in coords)
     return f"POLYGON(({coord_str}))"
+
+
+def build_polygon_wkt_arrays(lats, lons) -> str:
+    """
+    build_polygon_wkt for coordinate arrays (e.g. from destination_points).
+    """
+    lats = np.asarray(lats, dtype=np.float64).ravel()
+    lons = np.asarray(lons, dtype=np.float64).ravel()
+    if lats.size == 0:
+        raise ValueError("points must not be empty")
+    if lats[0] != lats[-1] or lons[0] != lons[-1]:
+        lats = np.append(lats, lats[0])
+        lons = np.append(lons, lons[0])
+    coord_str = ", ".join(f"{lon} {lat}" for lon, lat in zip(lons.tolist(), lats.tolist()))
+    return f"POLYGON(({coord_str}))"
@@ -13,7 +13,7 @@ from sqlalchemy import func
 # 1-arc-second (SRTM1) = 3601x3601 samples
 # 3-arc-second (SRTM3) = 1201x1201 samples
 
-DEM_DIR = os.path.join(os.getcwd(), 'anatel', 'DEM')
+DEM_DIR = os.getenv('DEM_DIR', os.path.join(os.getcwd(), 'anatel', 'DEM'))
 
 def parse_hgt_filename(filename):
     """
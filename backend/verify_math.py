@@ -1,7 +1,15 @@
 
 import numpy as np
 import time
-from app.math.deygout import calc_deygout_loss
+from app.math.deygout import (
+    EARTH_RADIUS,
+    calc_deygout_loss,
+    calc_deygout_loss_batch,
+    calc_deygout_loss_radials,
+    deygout_iterative,
+    deygout_recursive,
+)
+from app.services.interference import aggregate_du
 
 def verify_deygout():
     print("Verifying Deygout...")
@@ -28,5 +36,115 @@ def verify_deygout():
     else:
         print("FAIL: Loss is 0 (should be >0 for blocked path).")
 
+def benchmark_deygout(n_points=7000, dist_total_m=200000.0, repeats=20):
+    print("Benchmarking Deygout (recursive vs iterative)...")
+    rng = np.random.default_rng(42)
+    dist_m = np.linspace(0, dist_total_m, n_points)
+    # Rough terrain: random walk plus a few ridges
+    elev_m = 400.0 + np.cumsum(rng.normal(0.0, 4.0, n_points))
+    for center in (0.2, 0.45, 0.7):
+        elev_m += 250.0 * np.exp(-0.5 * ((dist_m / dist_total_m - center) / 0.01) ** 2)
+
+    lam = 300.0 / 100.0
+    R_eff = 1.333 * EARTH_RADIUS
+    elev_curved = elev_m + dist_m * (dist_total_m - dist_m) / (2.0 * R_eff)
+    h_tx = elev_curved[0] + 30.0
+    h_rx = elev_curved[-1] + 10.0
+
+    # Warm up JIT
+    deygout_recursive(dist_m, elev_curved, 0, n_points - 1, lam, h_tx, h_rx)
+    deygout_iterative(dist_m, elev_curved, lam, h_tx, h_rx, 3)
+
+    def timed(fn):
+        start = time.perf_counter()
+        for _ in range(repeats):
+            value = fn()
+        return value, (time.perf_counter() - start) * 1000 / repeats
+
+    loss_rec, t_rec = timed(lambda: deygout_recursive(dist_m, elev_curved, 0, n_points - 1, lam, h_tx, h_rx))
+    loss_all, t_all = timed(lambda: deygout_iterative(dist_m, elev_curved, lam, h_tx, h_rx, n_points))
+    loss_3, t_3 = timed(lambda: deygout_iterative(dist_m, elev_curved, lam, h_tx, h_rx, 3))
+
+    print(f"Recursive (unbounded):  {loss_rec:.2f} dB  {t_rec:.3f} ms")
+    print(f"Iterative (unbounded):  {loss_all:.2f} dB  {t_all:.3f} ms")
+    print(f"Iterative (3 edges):    {loss_3:.2f} dB  {t_3:.3f} ms  ({t_rec / t_3:.1f}x faster)")
+
+    if abs(loss_rec - loss_all) < 1e-6 * max(1.0, abs(loss_rec)):
+        print("PASS: Iterative engine matches recursive Deygout.")
+    else:
+        print("FAIL: Iterative engine differs from recursive Deygout.")
+
+def verify_deygout_radials(n_radials=8, n_points=1001, step_m=100.0):
+    print("Verifying radial Deygout fan...")
+    rng = np.random.default_rng(7)
+    fan = 300.0 + np.cumsum(rng.normal(0.0, 3.0, (n_radials, n_points)), axis=1)
+    fan[0] = 0.0  # sea
+    dist_m = step_m * np.arange(n_points)
+
+    calc_deygout_loss_radials(fan[:1, :10], step_m, 10.0, 100.0, 30.0)
+    start = time.perf_counter()
+    loss = calc_deygout_loss_radials(fan, step_m, 10.0, 100.0, 30.0, max_edges=3)
+    elapsed = (time.perf_counter() - start) * 1000 / n_radials
+
+    worst = 0.0
+    for r in range(n_radials):
+        for j in range(2, n_points, 13):
+            ref = calc_deygout_loss(dist_m[:j + 1], fan[r, :j + 1], 100.0, 30.0, 10.0, 1.333, 3)
+            worst = max(worst, abs(loss[r, j] - ref))
+    print(f"Radial fan: {elapsed:.3f} ms/radial, max deviation {worst:.2e} dB")
+
+    if worst < 1e-6:
+        print("PASS: Radial fan matches per-receiver Deygout.")
+    else:
+        print("FAIL: Radial fan differs from per-receiver Deygout.")
+
+def verify_unbounded_edges(n_points=1001, step_m=50.0):
+    print("Verifying unbounded edge budget across entry points...")
+    dist_m = step_m * np.arange(n_points)
+    elev_m = np.full(n_points, 100.0)
+    elev_m[300] += 250.0
+    elev_m[700] += 180.0
+
+    single = calc_deygout_loss(dist_m, elev_m, 100.0, 30.0, 10.0, 1.333, -1)
+    batch = calc_deygout_loss_batch(elev_m[None, :], dist_m[-1], 10.0, 100.0, 30.0, max_edges=-1)[0]
+    radials = calc_deygout_loss_radials(elev_m[None, :], step_m, 10.0, 100.0, 30.0, max_edges=-1)[0, -1]
+    defaults = (
+        calc_deygout_loss(dist_m, elev_m, 100.0, 30.0, 10.0),
+        calc_deygout_loss_batch(elev_m[None, :], dist_m[-1], 10.0, 100.0, 30.0)[0],
+        calc_deygout_loss_radials(elev_m[None, :], step_m, 10.0, 100.0, 30.0)[0, -1],
+    )
+    print(f"Single: {single:.2f} dB, batch: {batch:.2f} dB, radials: {radials:.2f} dB")
+
+    if single > 0 and np.allclose([batch, radials, *defaults], single):
+        print("PASS: max_edges=-1 is unbounded everywhere.")
+    else:
+        print("FAIL: Entry points disagree on max_edges=-1.")
+
+def verify_aggregate_sources():
+    print("Verifying aggregate D/U source grouping...")
+    wanted = np.array([60.0, 54.0, 48.0])
+    margin = np.array([[6.0, 3.0, 1.0], [6.0, 3.0, 1.0], [9.0, 2.0, 4.0]])
+
+    distinct = aggregate_du(wanted, margin[:2])
+    same = aggregate_du(wanted, margin[:2], sources=[0, 0])
+    single = aggregate_du(wanted, margin[:1])
+    mixed = aggregate_du(wanted, margin, sources=[0, 0, 1])
+    pair = aggregate_du(wanted, margin[1:])
+    print(f"Two stations: {distinct.margin_db}, one station twice: {same.margin_db}")
+
+    if (
+        np.allclose(distinct.margin_db, single.margin_db - 10.0 * np.log10(2.0))
+        and np.allclose(same.margin_db, single.margin_db)
+        and np.allclose(mixed.margin_db, pair.margin_db)
+        and len(same.offenders(0)) == 1
+    ):
+        print("PASS: Cases of one emitter are not power-summed.")
+    else:
+        print("FAIL: Cases of one emitter are power-summed.")
+
 if __name__ == "__main__":
     verify_deygout()
+    benchmark_deygout()
+    verify_deygout_radials()
+    verify_unbounded_edges()
+    verify_aggregate_sources()
@@ -1,8 +1,20 @@
 import sys
 import os
+import time
 sys.path.append(os.getcwd())
+sys.path.append(os.path.join(os.getcwd(), "backend"))
 
-from backend.app.math.p1546 import calc_p1546_point
+import numpy as np
+
+from backend.app.math.p1546 import bt_loss, calc_p1546_point
+from app.math.p1546_native import (
+    NOMINAL_FREQS_MHZ,
+    NOMINAL_HEIGHTS_M,
+    NOMINAL_TIMES_PCT,
+    calc_p1546_native,
+    field_strength,
+    load_p1546_tables,
+)
 
 def test_p1546():
     print("Testing P.1546 Calculation...")
@@ -23,5 +35,60 @@ def test_p1546():
         import traceback
         traceback.print_exc()
 
+def verify_native_nodes():
+    print("Verifying native P.1546 at tabulated nodes...")
+    tables = load_p1546_tables()
+    d = tables.distances_km
+    worst = 0.0
+    for f_idx, freq in enumerate(NOMINAL_FREQS_MHZ):
+        for t_idx, time_pct in enumerate(NOMINAL_TIMES_PCT):
+            for h_idx, h1 in enumerate(NOMINAL_HEIGHTS_M):
+                # h2 = R = 10 m (rural) leaves only the R' term of the
+                # receiving height correction, removed here. Points within a few
+                # km of the free-space cap are skipped (the cap follows it).
+                dd = d[d >= 20.0]
+                r_prime = (1000.0 * dd * 10.0 - 15.0 * h1) / (1000.0 * dd - 15.0)
+                k_h2 = 3.2 + 6.2 * np.log10(freq)
+                es = field_strength(freq, time_pct, h1, dd) - k_h2 * np.log10(10.0 / r_prime)
+                ref = tables.field[f_idx, t_idx, 0, h_idx, d >= 20.0]
+                worst = max(worst, float(np.max(np.abs(es - ref))))
+    print(f"Max deviation from the tables: {worst:.3f} dB")
+    print("SUCCESS" if worst < 0.1 else "FAILED")
+
+
+def compare_native_py1546(n=200):
+    if bt_loss is None:
+        print("Py1546 not installed, skipping native/Py1546 comparison.")
+        return
+    print("Comparing native P.1546 with Py1546...")
+    rng = np.random.default_rng(1546)
+    freq = rng.uniform(88.0, 700.0, n)
+    time_pct = rng.choice([1.0, 10.0, 50.0], n)
+    heff = rng.uniform(20.0, 600.0, n)
+    dist = rng.uniform(1.0, 300.0, n)
+    native, _ = calc_p1546_native(freq, time_pct, heff, 10.0, dist)
+    ref = np.array([calc_p1546_point(*args, 10.0, dd)[0] for *args, dd in zip(freq, time_pct, heff, dist)])
+    diff = np.abs(native - ref)
+    print(f"Mean |dE| = {diff.mean():.3f} dB, max |dE| = {diff.max():.3f} dB")
+
+
+def benchmark_native(n=100_000):
+    rng = np.random.default_rng(0)
+    freq = rng.uniform(88.0, 700.0, n)
+    time_pct = rng.uniform(1.0, 50.0, n)
+    heff = rng.uniform(-50.0, 1500.0, n)
+    dist = rng.uniform(0.5, 800.0, n)
+    field_strength(freq[:10], time_pct[:10], heff[:10], dist[:10])
+
+    t0 = time.perf_counter()
+    es = field_strength(freq, time_pct, heff, dist)
+    elapsed = time.perf_counter() - t0
+    print(f"Native P.1546: {n} points in {elapsed:.3f} s ({1e6 * elapsed / n:.2f} us/point), "
+          f"{int(np.isnan(es).sum())} NaN")
+
+
 if __name__ == "__main__":
     test_p1546()
+    verify_native_nodes()
+    compare_native_py1546()
+    benchmark_native()
@@ -0,0 +1,55 @@
+"""add station interaction index
+
+Revision ID: a8d4c2e6f1b9
+Revises: f3c7a1d9b2e4
+Create Date: 2026-10-18 16:40:05.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a8d4c2e6f1b9'
+down_revision = 'f3c7a1d9b2e4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'station_index',
+        sa.Column('station_key', sa.Text(), nullable=False),
+        sa.Column('fingerprint', sa.Text(), nullable=False),
+        sa.Column('pair_count', sa.Integer(), nullable=False),
+        sa.Column('indexed_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('station_key'),
+        schema='anatel',
+    )
+    op.create_table(
+        'station_interactions',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('interferer_key', sa.Text(), nullable=False),
+        sa.Column('victim_key', sa.Text(), nullable=False),
+        sa.Column('relation', sa.Text(), nullable=False),
+        sa.Column('pr_db', sa.Float(), nullable=False),
+        sa.Column('distance_km', sa.Float(), nullable=False),
+        sa.Column('worst_margin_db', sa.Float(), nullable=False),
+        sa.Column('worst_azimuth_deg', sa.Float(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        schema='anatel',
+    )
+    op.create_index(
+        'idx_station_interactions_interferer', 'station_interactions', ['interferer_key'], unique=False, schema='anatel'
+    )
+    op.create_index(
+        'idx_station_interactions_victim', 'station_interactions', ['victim_key'], unique=False, schema='anatel'
+    )
+
+
+def downgrade():
+    op.drop_index('idx_station_interactions_victim', table_name='station_interactions', schema='anatel')
+    op.drop_index('idx_station_interactions_interferer', table_name='station_interactions', schema='anatel')
+    op.drop_table('station_interactions', schema='anatel')
+    op.drop_table('station_index', schema='anatel')
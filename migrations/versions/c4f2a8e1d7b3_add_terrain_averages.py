@@ -0,0 +1,37 @@
+"""add terrain averages
+
+Revision ID: c4f2a8e1d7b3
+Revises: 46acbbeef72f
+Create Date: 2026-10-18 09:12:40.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4f2a8e1d7b3'
+down_revision = '46acbbeef72f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('terrain_averages',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('lat', sa.Float(), nullable=False),
+    sa.Column('lon', sa.Float(), nullable=False),
+    sa.Column('dem_version', sa.Text(), nullable=False),
+    sa.Column('step_deg', sa.Float(), nullable=False),
+    sa.Column('ground_alt_m', sa.Float(), nullable=False),
+    sa.Column('avg_terrain_m', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('lat', 'lon', 'dem_version', 'step_deg', name='uq_terrain_averages_key'),
+    schema='gis'
+    )
+
+
+def downgrade():
+    op.drop_table('terrain_averages', schema='gis')
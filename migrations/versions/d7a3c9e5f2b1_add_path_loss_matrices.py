@@ -0,0 +1,44 @@
+"""add path loss matrices
+
+Revision ID: d7a3c9e5f2b1
+Revises: c4f2a8e1d7b3
+Create Date: 2026-10-18 11:40:05.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7a3c9e5f2b1'
+down_revision = 'c4f2a8e1d7b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('path_loss_matrices',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('key', sa.Text(), nullable=False),
+    sa.Column('model', sa.Text(), nullable=False),
+    sa.Column('lat', sa.Float(), nullable=False),
+    sa.Column('lon', sa.Float(), nullable=False),
+    sa.Column('h_agl', sa.Float(), nullable=False),
+    sa.Column('freq_mhz', sa.Float(), nullable=False),
+    sa.Column('dem_version', sa.Text(), nullable=False),
+    sa.Column('step_deg', sa.Float(), nullable=False),
+    sa.Column('step_m', sa.Float(), nullable=False),
+    sa.Column('n_az', sa.Integer(), nullable=False),
+    sa.Column('n_distances', sa.Integer(), nullable=False),
+    sa.Column('file_path', sa.Text(), nullable=False),
+    sa.Column('params', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('key'),
+    schema='gis'
+    )
+
+
+def downgrade():
+    op.drop_table('path_loss_matrices', schema='gis')
@@ -0,0 +1,27 @@
+"""add revision run state
+
+Revision ID: e5b8d2f4a6c3
+Revises: d7a3c9e5f2b1
+Create Date: 2026-10-18 12:25:31.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5b8d2f4a6c3'
+down_revision = 'd7a3c9e5f2b1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('project_revisions', schema='core') as batch_op:
+        batch_op.add_column(sa.Column('run_state', postgresql.JSONB(astext_type=sa.Text()), server_default='{}', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('project_revisions', schema='core') as batch_op:
+        batch_op.drop_column('run_state')
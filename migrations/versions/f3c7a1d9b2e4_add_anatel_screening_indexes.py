@@ -0,0 +1,39 @@
+"""add anatel screening indexes
+
+Revision ID: f3c7a1d9b2e4
+Revises: e5b8d2f4a6c3
+Create Date: 2026-10-18 14:02:17.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c7a1d9b2e4'
+down_revision = 'e5b8d2f4a6c3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(
+        'idx_anatel_stations_geog',
+        'anatel_stations',
+        [sa.text('(geom::geography)')],
+        unique=False,
+        schema='anatel',
+        postgresql_using='gist',
+    )
+    op.create_index(
+        'idx_anatel_stations_frequencia',
+        'anatel_stations',
+        ['frequencia_mhz'],
+        unique=False,
+        schema='anatel',
+    )
+
+
+def downgrade():
+    op.drop_index('idx_anatel_stations_frequencia', table_name='anatel_stations', schema='anatel')
+    op.drop_index('idx_anatel_stations_geog', table_name='anatel_stations', schema='anatel')